@@ -0,0 +1,70 @@
+"""
+Run one oee command through oee_tracker.cli:main (the `oee` console script's entry
+point) and write its timings as JSON.
+
+Started by cli_latency.py in a fresh interpreter for every invocation:
+    python benchmarks/cli_probe.py RESULT_PATH machine list
+
+Only the standard library is imported before oee_tracker.cli, so the import time
+covers everything the command loads (Typer, SQLAlchemy, the driver, ...).
+"""
+
+import time
+
+started_at = time.time()
+
+import json
+import sys
+
+
+def main():
+    result_path, args = sys.argv[1], sys.argv[2:]
+    timings = {"started_at": started_at, "connect_ms": 0.0, "query_ms": 0.0, "statements": 0, "exit_code": 0}
+
+    begin = time.perf_counter()
+    import oee_tracker.cli as cli
+    timings["import_ms"] = (time.perf_counter() - begin) * 1000
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from sqlalchemy.pool import Pool
+
+    pending = []
+
+    # From the driver's connect() to the end of the pool's connect listeners (PRAGMAs etc.);
+    # registered last, so it runs after the ones from oee_tracker.db
+    @event.listens_for(Engine, "do_connect")
+    def connect_started(dialect, connection_record, cargs, cparams):
+        pending.append(time.perf_counter())
+
+    @event.listens_for(Pool, "connect")
+    def connect_finished(dbapi_connection, connection_record):
+        if pending:
+            timings["connect_ms"] += (time.perf_counter() - pending.pop()) * 1000
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def query_started(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault("probe_start", []).append(time.perf_counter())
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def query_finished(connection, cursor, statement, parameters, context, executemany):
+        timings["query_ms"] += (time.perf_counter() - connection.info["probe_start"].pop()) * 1000
+        timings["statements"] += 1
+
+    sys.argv = ["oee", *args]
+    begin = time.perf_counter()
+    try:
+        cli.main()
+    except SystemExit as e:
+        timings["exit_code"] = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    finally:
+        timings["command_ms"] = (time.perf_counter() - begin) * 1000
+        timings["finished_at"] = time.time()
+        with open(result_path, "w", encoding="utf-8") as f:
+            json.dump(timings, f)
+
+    sys.exit(timings["exit_code"])
+
+
+if __name__ == "__main__":
+    main()
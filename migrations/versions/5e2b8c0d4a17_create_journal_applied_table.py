@@ -0,0 +1,33 @@
+"""create journal applied table
+
+Revision ID: 5e2b8c0d4a17
+Revises: c4f1a7d2e9b3
+Create Date: 2026-10-19 11:03:27.904116
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2b8c0d4a17'
+down_revision: Union[str, Sequence[str], None] = 'c4f1a7d2e9b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "journal_applied",
+        sa.Column("entry_id", sa.String, primary_key=True),
+        sa.Column("op", sa.String, nullable=False),
+        sa.Column("applied_at", sa.TIMESTAMP, nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("journal_applied")
@@ -0,0 +1,86 @@
+"""add run and downtime windows
+
+Revision ID: 7a3d9e1f5b20
+Revises: 5e2b8c0d4a17
+Create Date: 2026-10-19 14:21:08.512390
+
+PostgreSQL only: generated tsrange columns over the run and downtime times, GiST
+indexes for overlap queries, and an exclusion constraint that keeps planned runs
+on the same machine from overlapping. On other databases this is a no-op.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import TSRANGE
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a3d9e1f5b20'
+down_revision: Union[str, Sequence[str], None] = '5e2b8c0d4a17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _window(start: str, end: str) -> str:
+    """Half-open range over two columns; NULL while not started or if end is before start."""
+    return (
+        f"CASE WHEN {start} IS NULL OR {end} < {start} THEN NULL "
+        f"ELSE tsrange({start}, {end}, '[)') END"
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    connection = op.get_bind()
+    if connection.dialect.name != "postgresql":
+        return
+
+    overlapping = connection.execute(sa.text(
+        "SELECT a.id, b.id, a.machine_id FROM production_runs a "
+        "JOIN production_runs b ON b.machine_id = a.machine_id AND b.id > a.id "
+        "AND b.planned_start_time < a.planned_end_time AND a.planned_start_time < b.planned_end_time "
+        "ORDER BY a.id, b.id LIMIT 10"
+    )).all()
+    if overlapping:
+        pairs = ", ".join(f"{a} and {b} (machine {machine})" for a, b, machine in overlapping)
+        raise RuntimeError(f"Overlapping planned runs must be rescheduled first: {pairs}")
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+
+    op.add_column("production_runs", sa.Column(
+        "planned_window", TSRANGE,
+        sa.Computed(_window("planned_start_time", "planned_end_time"), persisted=True),
+    ))
+    op.add_column("production_runs", sa.Column(
+        "actual_window", TSRANGE,
+        sa.Computed(_window("actual_start_time", "actual_end_time"), persisted=True),
+    ))
+    op.add_column("downtime_events", sa.Column(
+        "event_window", TSRANGE,
+        sa.Computed(_window("start_time", "end_time"), persisted=True),
+    ))
+
+    op.create_index(
+        "ix_production_runs_actual_window", "production_runs", ["actual_window"], postgresql_using="gist"
+    )
+    op.create_index(
+        "ix_downtime_events_event_window", "downtime_events", ["event_window"], postgresql_using="gist"
+    )
+    op.execute(
+        "ALTER TABLE production_runs ADD CONSTRAINT production_runs_no_overlap "
+        "EXCLUDE USING gist (machine_id WITH =, planned_window WITH &&)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.execute("ALTER TABLE production_runs DROP CONSTRAINT production_runs_no_overlap")
+    op.drop_index("ix_downtime_events_event_window", table_name="downtime_events")
+    op.drop_index("ix_production_runs_actual_window", table_name="production_runs")
+    op.drop_column("downtime_events", "event_window")
+    op.drop_column("production_runs", "actual_window")
+    op.drop_column("production_runs", "planned_window")
@@ -0,0 +1,105 @@
+"""add updated_at tracking
+
+Revision ID: 9c6e2f4a8b13
+Revises: 7a3d9e1f5b20
+Create Date: 2026-10-19 16:02:51.330478
+
+Adds updated_at to the run, downtime and dimension tables, set by a trigger on
+every insert and update so no client can forget it, and the export_watermarks
+table used by `oee export changes`. Existing rows are stamped with the migration
+time, so the first incremental export after upgrading still sends everything.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c6e2f4a8b13'
+down_revision: Union[str, Sequence[str], None] = '7a3d9e1f5b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRACKED_TABLES = (
+    "machines",
+    "shifts",
+    "operators",
+    "reason_codes",
+    "production_runs",
+    "downtime_events",
+)
+
+ARCHIVE_TABLES = ("production_runs_archive", "downtime_events_archive")
+
+# Same text format SQLAlchemy stores SQLite DateTime values in
+SQLITE_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime') || '000'"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    postgresql = op.get_bind().dialect.name == "postgresql"
+    now = "CAST(clock_timestamp() AS TIMESTAMP)" if postgresql else SQLITE_NOW
+
+    for table in TRACKED_TABLES:
+        op.add_column(table, sa.Column("updated_at", sa.TIMESTAMP))
+        op.execute(f"UPDATE {table} SET updated_at = {now}")
+        op.create_index(f"ix_{table}_updated_at", table, ["updated_at"])
+
+    # Archived rows keep the updated_at they had when they were moved
+    for table in ARCHIVE_TABLES:
+        op.add_column(table, sa.Column("updated_at", sa.TIMESTAMP))
+
+    if postgresql:
+        # clock_timestamp(), not now(): a long transaction must not stamp rows with
+        # its start time, or they could fall behind a watermark already exported
+        op.execute(
+            "CREATE FUNCTION set_updated_at() RETURNS trigger AS $$ "
+            "BEGIN NEW.updated_at := CAST(clock_timestamp() AS TIMESTAMP); RETURN NEW; END "
+            "$$ LANGUAGE plpgsql"
+        )
+        for table in TRACKED_TABLES:
+            op.execute(
+                f"CREATE TRIGGER {table}_updated_at BEFORE INSERT OR UPDATE ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION set_updated_at()"
+            )
+    else:
+        # SQLite cannot change NEW, so stamp the row after the fact. The update
+        # trigger skips updates that set updated_at, which includes its own stamping
+        # UPDATE and the insert trigger's
+        for table in TRACKED_TABLES:
+            for event, when in (("INSERT", ""), ("UPDATE", "WHEN NEW.updated_at IS OLD.updated_at ")):
+                op.execute(
+                    f"CREATE TRIGGER {table}_updated_at_{event.lower()} AFTER {event} ON {table} {when}"
+                    f"BEGIN UPDATE {table} SET updated_at = {SQLITE_NOW} WHERE rowid = NEW.rowid; END"
+                )
+
+    op.create_table(
+        "export_watermarks",
+        sa.Column("name", sa.String, primary_key=True),
+        sa.Column("watermark", sa.TIMESTAMP, nullable=False),
+        sa.Column("exported_at", sa.TIMESTAMP, nullable=False),
+        sa.Column("rows", sa.Integer, nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    postgresql = op.get_bind().dialect.name == "postgresql"
+
+    op.drop_table("export_watermarks")
+
+    for table in TRACKED_TABLES:
+        if postgresql:
+            op.execute(f"DROP TRIGGER {table}_updated_at ON {table}")
+        else:
+            op.execute(f"DROP TRIGGER {table}_updated_at_insert")
+            op.execute(f"DROP TRIGGER {table}_updated_at_update")
+    if postgresql:
+        op.execute("DROP FUNCTION set_updated_at()")
+
+    for table in ARCHIVE_TABLES:
+        op.drop_column(table, "updated_at")
+    for table in TRACKED_TABLES:
+        op.drop_index(f"ix_{table}_updated_at", table_name=table)
+        op.drop_column(table, "updated_at")
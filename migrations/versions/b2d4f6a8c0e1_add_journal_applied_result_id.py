@@ -0,0 +1,28 @@
+"""add journal applied result id
+
+Revision ID: b2d4f6a8c0e1
+Revises: 9c6e2f4a8b13
+Create Date: 2026-10-19 18:24:06.215873
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d4f6a8c0e1'
+down_revision: Union[str, Sequence[str], None] = '9c6e2f4a8b13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("journal_applied", sa.Column("result_id", sa.Integer))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("journal_applied", "result_id")
@@ -0,0 +1,56 @@
+"""create archive tables
+
+Revision ID: c4f1a7d2e9b3
+Revises: b08e271247b6
+Create Date: 2026-10-19 09:12:44.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f1a7d2e9b3'
+down_revision: Union[str, Sequence[str], None] = 'b08e271247b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "production_runs_archive",
+        sa.Column("id", sa.Integer, primary_key=True, autoincrement=False),
+        sa.Column("machine_id", sa.Integer, sa.ForeignKey("machines.id", ondelete="CASCADE")),
+        sa.Column("shift_id", sa.Integer, sa.ForeignKey("shifts.id", ondelete="CASCADE")),
+        sa.Column("operator_id", sa.Integer, sa.ForeignKey("operators.id", ondelete="CASCADE")),
+        sa.Column("planned_start_time", sa.TIMESTAMP, nullable=False),
+        sa.Column("planned_end_time", sa.TIMESTAMP, nullable=False),
+        sa.Column("actual_start_time", sa.TIMESTAMP),
+        sa.Column("actual_end_time", sa.TIMESTAMP),
+        sa.Column("good_parts_count", sa.Integer),
+        sa.Column("rejected_parts_count", sa.Integer)
+    )
+    op.create_index(
+        "ix_production_runs_archive_actual_start_time", "production_runs_archive", ["actual_start_time"]
+    )
+
+    op.create_table(
+        "downtime_events_archive",
+        sa.Column("id", sa.Integer, primary_key=True, autoincrement=False),
+        sa.Column("production_run_id", sa.Integer, sa.ForeignKey("production_runs_archive.id", ondelete="CASCADE")),
+        sa.Column("reason_code", sa.String, sa.ForeignKey("reason_codes.code", ondelete="CASCADE")),
+        sa.Column("start_time", sa.TIMESTAMP),
+        sa.Column("end_time", sa.TIMESTAMP),
+    )
+    op.create_index(
+        "ix_downtime_events_archive_production_run_id", "downtime_events_archive", ["production_run_id"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("downtime_events_archive")
+    op.drop_table("production_runs_archive")
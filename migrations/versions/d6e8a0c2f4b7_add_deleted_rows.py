@@ -0,0 +1,86 @@
+"""add deleted rows
+
+Revision ID: d6e8a0c2f4b7
+Revises: b2d4f6a8c0e1
+Create Date: 2026-10-19 19:12:40.508213
+
+Adds the deleted_rows table and a trigger on each table `oee export changes`
+exports that records the key of every deleted row, including rows removed by
+ON DELETE CASCADE, so the export can send deletes as well as inserts and updates.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd6e8a0c2f4b7'
+down_revision: Union[str, Sequence[str], None] = 'b2d4f6a8c0e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Tracked table and its primary key column
+TRACKED_TABLES = {
+    "machines": "id",
+    "shifts": "id",
+    "operators": "id",
+    "reason_codes": "code",
+    "production_runs": "id",
+    "downtime_events": "id",
+}
+
+# Same text format SQLAlchemy stores SQLite DateTime values in
+SQLITE_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime') || '000'"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    postgresql = op.get_bind().dialect.name == "postgresql"
+
+    op.create_table(
+        "deleted_rows",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("table_name", sa.String, nullable=False),
+        sa.Column("row_key", sa.String, nullable=False),
+        sa.Column("deleted_at", sa.TIMESTAMP, nullable=False),
+    )
+    op.create_index("ix_deleted_rows_deleted_at", "deleted_rows", ["deleted_at"])
+
+    if postgresql:
+        # Same clock as set_updated_at(), so deletes and updates share one watermark
+        op.execute(
+            "CREATE FUNCTION record_deleted_row() RETURNS trigger AS $$ "
+            "BEGIN INSERT INTO deleted_rows (table_name, row_key, deleted_at) "
+            "VALUES (TG_TABLE_NAME, to_jsonb(OLD) ->> TG_ARGV[0], CAST(clock_timestamp() AS TIMESTAMP)); "
+            "RETURN OLD; END "
+            "$$ LANGUAGE plpgsql"
+        )
+        for table, key in TRACKED_TABLES.items():
+            op.execute(
+                f"CREATE TRIGGER {table}_deleted AFTER DELETE ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION record_deleted_row('{key}')"
+            )
+    else:
+        for table, key in TRACKED_TABLES.items():
+            op.execute(
+                f"CREATE TRIGGER {table}_deleted AFTER DELETE ON {table} "
+                f"BEGIN INSERT INTO deleted_rows (table_name, row_key, deleted_at) "
+                f"VALUES ('{table}', OLD.{key}, {SQLITE_NOW}); END"
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    postgresql = op.get_bind().dialect.name == "postgresql"
+
+    for table in TRACKED_TABLES:
+        if postgresql:
+            op.execute(f"DROP TRIGGER {table}_deleted ON {table}")
+        else:
+            op.execute(f"DROP TRIGGER {table}_deleted")
+    if postgresql:
+        op.execute("DROP FUNCTION record_deleted_row()")
+
+    op.drop_index("ix_deleted_rows_deleted_at", table_name="deleted_rows")
+    op.drop_table("deleted_rows")
@@ -0,0 +1,68 @@
+"""add export watermark table name
+
+Revision ID: e3f5a7b9d1c4
+Revises: d6e8a0c2f4b7
+Create Date: 2026-10-19 20:05:17.843120
+
+Keeps one watermark per export name and table, so `oee export changes --tables`
+only moves the watermark of the tables it sent. Each existing watermark is copied
+to every table.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3f5a7b9d1c4'
+down_revision: Union[str, Sequence[str], None] = 'd6e8a0c2f4b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+EXPORTED_TABLES = (
+    "machines",
+    "shifts",
+    "operators",
+    "reason_codes",
+    "production_runs",
+    "downtime_events",
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.rename_table("export_watermarks", "export_watermarks_old")
+    op.create_table(
+        "export_watermarks",
+        sa.Column("name", sa.String, primary_key=True),
+        sa.Column("table_name", sa.String, primary_key=True),
+        sa.Column("watermark", sa.TIMESTAMP, nullable=False),
+        sa.Column("exported_at", sa.TIMESTAMP, nullable=False),
+        sa.Column("rows", sa.Integer, nullable=False),
+    )
+    # The old row count covered all tables; per-table counts are unknown
+    for table in EXPORTED_TABLES:
+        op.execute(
+            f"INSERT INTO export_watermarks (name, table_name, watermark, exported_at, rows) "
+            f"SELECT name, '{table}', watermark, exported_at, 0 FROM export_watermarks_old"
+        )
+    op.drop_table("export_watermarks_old")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.rename_table("export_watermarks", "export_watermarks_new")
+    op.create_table(
+        "export_watermarks",
+        sa.Column("name", sa.String, primary_key=True),
+        sa.Column("watermark", sa.TIMESTAMP, nullable=False),
+        sa.Column("exported_at", sa.TIMESTAMP, nullable=False),
+        sa.Column("rows", sa.Integer, nullable=False),
+    )
+    # The earliest table watermark, so no table skips changes it has not sent
+    op.execute(
+        "INSERT INTO export_watermarks (name, watermark, exported_at, rows) "
+        "SELECT name, MIN(watermark), MAX(exported_at), SUM(rows) FROM export_watermarks_new GROUP BY name"
+    )
+    op.drop_table("export_watermarks_new")
@@ -1,15 +1,35 @@
 # CLI Package
+import atexit
 import typer
-from oee_tracker.cli import machine, shift, operator, run, downtime, report
+from typing import Annotated
+
+from oee_tracker import tracing
+from oee_tracker.cli import machine, shift, operator, run, downtime, report, maintenance, sync, batch, debug, metrics, export
 
 app = typer.Typer(help="An awesome OEE CLI Tool.")
 
+
+@app.callback()
+def options(
+    trace: Annotated[str, typer.Option("--trace", help="Write crud call spans to this JSON-lines file")] = None,
+):
+    if trace and not tracing.is_enabled():
+        tracing.enable(tracing.JsonLinesSink(trace))
+        atexit.register(tracing.disable)
+
+
 app.add_typer(machine.app, name="machine")
 app.add_typer(shift.app, name="shift")
 app.add_typer(operator.app, name="operator")
 app.add_typer(run.app, name="run")
 app.add_typer(downtime.app, name="downtime")
 app.add_typer(report.app, name="report")
+app.add_typer(maintenance.app, name="maintenance")
+app.add_typer(debug.app, name="debug")
+app.add_typer(metrics.app, name="metrics")
+app.add_typer(export.app, name="export")
+app.command("sync")(sync.sync)
+app.command("batch")(batch.batch)
 
 def main():
     app()
\ No newline at end of file
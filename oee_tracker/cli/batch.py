@@ -0,0 +1,113 @@
+# cli/batch.py
+import shlex
+import sys
+import time
+import typer
+from typing import Annotated
+
+import oee_tracker.db as db
+
+# Commands that cannot run inside a batch
+NOT_IN_BATCH = ("batch", "sync")
+
+
+def read_commands(source: str) -> list[tuple[int, str]]:
+    """Read (line number, command) pairs from a file or '-' for stdin, skipping blanks and # comments."""
+    try:
+        lines = sys.stdin.readlines() if source == "-" else open(source, encoding="utf-8").readlines()
+    except OSError as e:
+        print(f"Error: Cannot read {source}: {e.strerror}")
+        raise typer.Exit(code=1)
+
+    commands = []
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            commands.append((number, line))
+    return commands
+
+
+def run_command(command, args: list[str], prog_name: str = "oee") -> int:
+    """Run one CLI command in this process. Returns its exit code."""
+    try:
+        command.main(args, prog_name=prog_name)
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 1
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
+
+
+def batch(
+    source: Annotated[str, typer.Argument(help="File with one oee command per line (without 'oee'), or - for stdin")],
+    atomic: Annotated[bool, typer.Option("--atomic", help="Run all commands in one transaction; roll back everything if one fails")] = False,
+    keep_going: Annotated[bool, typer.Option("--keep-going", help="Continue after a failed command (not with --atomic)")] = False,
+):
+    """Run many commands in one process and one database connection."""
+
+    if atomic and keep_going:
+        print("Error: --keep-going cannot be used with --atomic")
+        raise typer.Exit(code=1)
+
+    commands = read_commands(source)
+
+    parsed = []
+    for number, line in commands:
+        try:
+            args = shlex.split(line)
+        except ValueError as e:
+            print(f"Error: Line {number}: {e}")
+            raise typer.Exit(code=1)
+        if args[0] == "oee":
+            args = args[1:]
+        if not args or args[0] in NOT_IN_BATCH:
+            print(f"Error: Line {number}: '{line}' cannot run in a batch")
+            raise typer.Exit(code=1)
+        parsed.append((number, line, args))
+
+    # Imported here: the root app imports this module
+    from oee_tracker.cli import app
+    command = typer.main.get_command(app)
+
+    timings = []
+    failed = None
+    batch_start = time.perf_counter()
+
+    try:
+        with db.shared_connection(atomic=atomic):
+            for number, line, args in parsed:
+                print(f"> {line}")
+                start = time.perf_counter()
+                exit_code = run_command(command, args)
+                timings.append((number, line, exit_code, time.perf_counter() - start))
+
+                if exit_code != 0:
+                    failed = number
+                    if atomic:
+                        # Leaving the block with an exception rolls back the transaction
+                        raise RuntimeError(f"line {number} failed")
+                    if not keep_going:
+                        break
+    except RuntimeError:
+        pass
+
+    total = time.perf_counter() - batch_start
+
+    print(f"\nBatch Summary{' (atomic)' if atomic else ''}")
+    print(f"{'Line':<6} {'Status':<8} {'ms':>9}  {'Command'}")
+    print("─" * 70)
+    for number, line, exit_code, elapsed in timings:
+        status = "ok" if exit_code == 0 else f"exit {exit_code}"
+        print(f"{number:<6} {status:<8} {elapsed * 1000:>9.1f}  {line}")
+    print("─" * 70)
+
+    succeeded = sum(1 for timing in timings if timing[2] == 0)
+    print(f"{succeeded}/{len(parsed)} commands succeeded in {total * 1000:.1f} ms")
+
+    if failed is not None:
+        if atomic:
+            print(f"Line {failed} failed: all changes rolled back")
+        elif len(timings) < len(parsed):
+            print(f"Stopped at line {failed}; remaining commands were not run")
+        raise typer.Exit(code=1)
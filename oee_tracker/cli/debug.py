@@ -0,0 +1,194 @@
+# cli/debug.py
+import io
+import json
+import typer
+from contextlib import redirect_stdout
+from typing import Annotated
+
+import oee_tracker.db as db
+from oee_tracker.cli import report
+from oee_tracker.cli.batch import run_command
+from oee_tracker.cli.output import plain_value
+from oee_tracker import tracing
+from oee_tracker.explain import capture_statements, explain_statement, summarize, ESTIMATE_MISS_RATIO
+from oee_tracker.models import Base
+from sqlalchemy.exc import SQLAlchemyError
+
+app = typer.Typer(help="Diagnostics for slow commands.")
+
+
+def format_ms(value: float | None) -> str:
+    """Format milliseconds with one decimal."""
+    if value is None:
+        return "-"
+    return f"{value:.1f}"
+
+
+def shorten(text: str, width: int) -> str:
+    """Cut text to width characters."""
+    return text if len(text) <= width else text[:width - 3] + "..."
+
+
+@app.command(context_settings={"allow_extra_args": True, "ignore_unknown_options": True})
+def explain(
+    command: Annotated[list[str], typer.Argument(help="Report subcommand and its options, e.g. downtime --start 2025-01-01")],
+    top: Annotated[int, typer.Option("--top", help="Number of slowest plan nodes to show")] = 5,
+    show_output: Annotated[bool, typer.Option("--show-output", help="Also print the report's own output")] = False,
+    save: Annotated[str, typer.Option("--save", help="Write the statements and full plans to this JSON file")] = None,
+):
+    """Run a report, then EXPLAIN ANALYZE every query it ran and show scans, estimate misses and slow nodes."""
+
+    report_command = typer.main.get_command(report.app)
+    output = io.StringIO()
+
+    # The report's own queries must run normally to produce its results,
+    # so they are captured here and explained afterwards
+    with capture_statements() as statements:
+        if show_output:
+            exit_code = run_command(report_command, command, prog_name="oee report")
+        else:
+            with redirect_stdout(output):
+                exit_code = run_command(report_command, command, prog_name="oee report")
+
+    if exit_code != 0:
+        print(output.getvalue(), end="")
+        print(f"Error: 'oee report {' '.join(command)}' exited with code {exit_code}")
+        raise typer.Exit(code=1)
+
+    if not statements:
+        print("No queries captured.")
+        return
+
+    session = db.get_reporting_session()
+
+    try:
+        plans = []
+        for index, statement in enumerate(statements, start=1):
+            try:
+                with session.connection().begin_nested():
+                    plans.append(explain_statement(session.connection(), statement))
+            except (SQLAlchemyError, ValueError) as e:
+                print(f"Warning: Cannot explain statement {index}: {e}")
+                plans.append(None)
+        session.rollback()
+    finally:
+        session.close()
+
+    summary = summarize(statements, plans, set(Base.metadata.tables), top)
+
+    if save:
+        with open(save, "w", encoding="utf-8") as f:
+            json.dump(
+                [{**statement, "plan": plan} for statement, plan in zip(statements, plans)],
+                f, indent=2, default=plain_value,
+            )
+
+    analyzed = statements[0]["dialect"] == "postgresql"
+
+    print(f"Query Plans for 'oee report {' '.join(command)}'")
+    print()
+    print(f"{'#':<4} {'Run ms':>8} {'Exec ms':>8} {'Plan ms':>8} {'Hit':>8} {'Read':>8}  {'Statement'}")
+    print("─" * 100)
+    for row in summary["statements"]:
+        hit = row.get("shared_hit_blocks")
+        read = row.get("shared_read_blocks")
+        print(
+            f"{row['statement']:<4} {format_ms(row['duration_ms']):>8} {format_ms(row.get('execution_ms')):>8} "
+            f"{format_ms(row.get('planning_ms')):>8} {hit if hit is not None else '-':>8} {read if read is not None else '-':>8}  "
+            f"{shorten(row['sql'], 50)}"
+        )
+
+    print()
+    print(f"Sequential Scans ({len(summary['seq_scans'])})")
+    if summary["seq_scans"]:
+        print(f"{'#':<4} {'Table':<26} {'Rows':>10} {'Filtered':>10}  {'Filter'}")
+        print("─" * 100)
+        for scan in summary["seq_scans"]:
+            rows = scan["rows"] if scan["rows"] is not None else "-"
+            removed = scan["removed_by_filter"] if scan["removed_by_filter"] is not None else "-"
+            print(f"{scan['statement']:<4} {scan['relation']:<26} {rows:>10} {removed:>10}  {shorten(scan['filter'] or '', 50)}")
+
+    if not analyzed:
+        print()
+        print("Query Plans")
+        print("─" * 100)
+        for index, plan in enumerate(plans, start=1):
+            if plan is None:
+                continue
+            depth = {0: 0}
+            for node in plan["Nodes"]:
+                depth[node["id"]] = depth.get(node["parent"], 0) + 1
+                print(f"{index:<4} {'  ' * (depth[node['id']] - 1)}{node['detail']}")
+        print()
+        print("Row estimates and node timings need EXPLAIN ANALYZE (PostgreSQL only).")
+        return
+
+    print()
+    print(f"Row Estimate Misses, {ESTIMATE_MISS_RATIO}x or more ({len(summary['estimate_misses'])})")
+    if summary["estimate_misses"]:
+        print(f"{'#':<4} {'Node':<50} {'Estimated':>10} {'Actual':>10} {'Off by':>8}")
+        print("─" * 86)
+        for miss in summary["estimate_misses"][:top]:
+            print(f"{miss['statement']:<4} {shorten(miss['node'], 50):<50} {miss['plan_rows']:>10} {miss['actual_rows']:>10} {miss['ratio']:>7.0f}x")
+
+    print()
+    print(f"Slowest Nodes (own time)")
+    print(f"{'#':<4} {'Node':<50} {'Own ms':>10} {'Total ms':>10}")
+    print("─" * 78)
+    for node in summary["slowest"]:
+        print(f"{node['statement']:<4} {shorten(node['node'], 50):<50} {format_ms(node['self_ms']):>10} {format_ms(node['total_ms']):>10}")
+
+
+@app.command()
+def trace(
+    path: Annotated[str, typer.Argument(help="Trace file written with 'oee --trace PATH ...'")],
+    tree: Annotated[bool, typer.Option("--tree", help="Also print the span tree of each trace")] = False,
+    limit: Annotated[int, typer.Option("--limit", help="Most spans to print per tree")] = 200,
+):
+    """Summarize a crud trace: calls, time and SQL per function."""
+
+    try:
+        spans = tracing.read_spans(path)
+    except OSError as e:
+        print(f"Error: Cannot read {path}: {e.strerror}")
+        raise typer.Exit(code=1)
+
+    if not spans:
+        print("No spans in trace.")
+        return
+
+    traces = sorted({span["trace"] for span in spans})
+    print(f"{len(spans)} span(s) in {len(traces)} trace(s)")
+    print()
+    print(f"{'Function':<40} {'Calls':>7} {'Total ms':>10} {'Own ms':>10} {'SQL':>6} {'SQL ms':>10} {'Depth':>6}")
+    print("─" * 95)
+    for function in tracing.summarize_spans(spans):
+        print(
+            f"{shorten(function['name'], 40):<40} {function['calls']:>7} {format_ms(function['total_ms']):>10} "
+            f"{format_ms(function['self_ms']):>10} {function['sql_count']:>6} {format_ms(function['sql_ms']):>10} "
+            f"{function['max_depth']:>6}"
+        )
+
+    if not tree:
+        return
+
+    children = {}
+    for span in spans:
+        children.setdefault((span["trace"], span["parent"]), []).append(span)
+
+    for trace_id in traces:
+        print()
+        printed = 0
+        # Depth-first from the root, children in start order
+        stack = sorted(children.get((trace_id, None), []), key=lambda span: span["start"], reverse=True)
+        while stack and printed < limit:
+            span = stack.pop()
+            error = f" [{span['error']}]" if span["error"] else ""
+            print(
+                f"{'  ' * span['depth']}{span['name']}({shorten(span['args'], 60)}) "
+                f"{format_ms(span['duration_ms'])} ms, {span['sql_count']} SQL{error}"
+            )
+            printed += 1
+            stack.extend(sorted(children.get((trace_id, span["span"]), []), key=lambda span: span["start"], reverse=True))
+        if stack:
+            print(f"  ... more spans (raise --limit)")
@@ -4,6 +4,9 @@ from typing import Annotated
 
 import oee_tracker.crud as crud
 import oee_tracker.db as db
+from oee_tracker.cli.output import FormatOption, check_format, write_rows
+import oee_tracker.journal as journal
+from oee_tracker.cli.sync import save_to_journal, write_or_journal
 
 app = typer.Typer(help="Manage downtime events.")
 
@@ -18,7 +21,13 @@ def create(
     session = db.get_session()
 
     try:
-        event = crud.create_downtime_event(session, run_id, reason_code)
+        event, journaled = write_or_journal(
+            session, "downtime_create", lambda: crud.create_downtime_event(session, run_id, reason_code),
+            run_id=run_id, reason_code=reason_code,
+        )
+        if journaled:
+            print(f"  Local id: {journal.local_id(journaled)} (use it with 'oee downtime stop')")
+            return
 
         if event is None:
             raise typer.Exit(code=1)
@@ -34,12 +43,20 @@ def create(
 @app.command()
 def list(
     run_id: Annotated[int, typer.Option(help="Filter by production run ID")] = None,
+    output_format: FormatOption = "text",
 ):
     """List downtime events."""
 
-    session = db.get_session()
+    check_format(output_format)
+
+    session = db.get_reporting_session()
 
     try:
+        if output_format != "text":
+            # All events (or one run's), streamed from the database
+            write_rows(crud.iter_downtime_events(session, run_id), output_format)
+            return
+
         if run_id:
             events = crud.get_downtime_events_by_run(session, run_id)
         else:
@@ -65,7 +82,7 @@ def list(
 def get(event_id: int):
     """Get downtime event by id."""
 
-    session = db.get_session()
+    session = db.get_reporting_session()
 
     try:
         event = crud.get_downtime_event(session, event_id)
@@ -87,12 +104,18 @@ def get(event_id: int):
 
 
 @app.command()
-def active():
+def active(output_format: FormatOption = "text"):
     """List active (ongoing) downtime events."""
 
-    session = db.get_session()
+    check_format(output_format)
+
+    session = db.get_reporting_session()
 
     try:
+        if output_format != "text":
+            write_rows(crud.iter_downtime_events(session, active_only=True), output_format)
+            return
+
         events = crud.get_active_downtime_events(session)
 
         if not events:
@@ -108,18 +131,46 @@ def active():
 
 
 @app.command()
-def stop(event_id: int):
+def stop(
+    event_id: Annotated[str, typer.Argument(help="Downtime event ID, or the local id (J...) of one created offline")],
+):
     """Stop a downtime event (ends now)."""
     session = db.get_session()
 
     try:
-        event = crud.stop_downtime(session, event_id)
+        if journal.is_local_id(event_id):
+            created = journal.find_local(event_id)
+            if created is not None:
+                # Not replayed yet: queue the stop behind its create, even if online now
+                save_to_journal("downtime_stop", why=f"{event_id} is not synced yet", event_ref=created["id"])
+                return
+
+            if not db.is_reachable(session):
+                save_to_journal("downtime_stop", event_ref=event_id[len(journal.LOCAL_ID_PREFIX):])
+                return
+
+            resolved = crud.resolve_local_event_id(session, event_id)
+            if resolved is None:
+                raise typer.Exit(code=1)
+            fields = {"event_id": resolved}
+        else:
+            try:
+                fields = {"event_id": int(event_id)}
+            except ValueError:
+                print(f"Error: Invalid downtime event id '{event_id}'")
+                raise typer.Exit(code=1)
+
+        event, journaled = write_or_journal(
+            session, "downtime_stop", lambda: crud.stop_downtime(session, fields["event_id"]), **fields
+        )
+        if journaled:
+            return
 
         if event is None:
-            print(f"Error: Downtime event {event_id} not found")
+            # crud printed why (not found or already stopped)
             raise typer.Exit(code=1)
 
-        print(f"Downtime event {event_id} stopped")
+        print(f"Downtime event {fields['event_id']} stopped")
 
     finally:
         session.close()
@@ -0,0 +1,119 @@
+# cli/export.py
+import sys
+import typer
+from datetime import datetime
+from typing import Annotated
+
+from sqlalchemy.exc import SQLAlchemyError
+
+import oee_tracker.crud as crud
+import oee_tracker.db as db
+from oee_tracker.cli.output import write_rows
+
+app = typer.Typer(help="Export data for other systems.")
+
+EXPORT_FORMATS = ("jsonl", "json", "csv")
+
+
+@app.command()
+def changes(
+    since: Annotated[str, typer.Option("--since", help="Export changes after this time (YYYY-MM-DD HH:MM:SS); default: the recorded watermark")] = None,
+    name: Annotated[str, typer.Option("--name", help="Export name; each name keeps its own watermark per table")] = "default",
+    tables: Annotated[str, typer.Option("--tables", help="Comma-separated tables to export (default: all)")] = None,
+    full: Annotated[bool, typer.Option("--full", help="Export every row, ignoring the recorded watermark")] = False,
+    lag: Annotated[float, typer.Option("--lag", help="Leave out changes from the last this many seconds, which may still be committing")] = 60,
+    record: Annotated[bool, typer.Option("--record/--no-record", help="Record the new watermark after a complete export")] = True,
+    batch_size: Annotated[int, typer.Option("--batch-size", help="Rows fetched per round trip")] = 1000,
+    output_format: Annotated[str, typer.Option("--format", help="Output format: jsonl, json or csv")] = "jsonl",
+):
+    """Stream rows inserted, updated or deleted since the last export, then record the new watermark."""
+
+    if output_format not in EXPORT_FORMATS:
+        print(f"Error: Invalid format '{output_format}'. Use {', '.join(EXPORT_FORMATS)}", file=sys.stderr)
+        raise typer.Exit(code=1)
+
+    table_names = [table.strip() for table in tables.split(",")] if tables else list(crud.CHANGE_TABLES)
+    unknown = [table for table in table_names if table not in crud.CHANGE_TABLES]
+    if unknown:
+        print(f"Error: Unknown table(s) {', '.join(unknown)}. Use {', '.join(crud.CHANGE_TABLES)}", file=sys.stderr)
+        raise typer.Exit(code=1)
+
+    if output_format == "csv" and len(table_names) > 1:
+        print("Error: CSV holds one table; pick it with --tables", file=sys.stderr)
+        raise typer.Exit(code=1)
+
+    if since and full:
+        print("Error: Use either --since or --full", file=sys.stderr)
+        raise typer.Exit(code=1)
+
+    since_time = None
+    if since:
+        try:
+            since_time = datetime.fromisoformat(since)
+        except ValueError:
+            print("Error: Invalid --since. Use YYYY-MM-DD HH:MM:SS", file=sys.stderr)
+            raise typer.Exit(code=1)
+
+    if batch_size < 1:
+        print("Error: --batch-size must be at least 1", file=sys.stderr)
+        raise typer.Exit(code=1)
+
+    # The primary, not the reporting replica: a lagging replica would move the
+    # watermark past changes it has not received yet
+    session = db.get_session()
+
+    try:
+        counts = {table: 0 for table in table_names}
+        deletes = {table: 0 for table in table_names}
+
+        try:
+            # Each table resumes from its own watermark, so exporting some tables
+            # never skips changes of the others
+            since_times = {table: since_time for table in table_names}
+            if since is None and not full:
+                for table in table_names:
+                    previous = crud.get_export_watermark(session, name, table)
+                    since_times[table] = previous.watermark if previous else None
+            until = crud.get_change_horizon(session, lag)
+
+            if all(start is not None and start >= until for start in since_times.values()):
+                print(f"Nothing to export: every watermark is within the last {lag:g}s", file=sys.stderr)
+                return
+
+            def changed_rows():
+                # Deletes first, children before parents, so a row deleted and then
+                # added again ends up present. A full export has nothing to delete
+                for table in reversed(table_names):
+                    if since_times[table] is None:
+                        continue
+                    for row in crud.iter_deleted_rows(session, table, since_times[table], until, batch_size):
+                        deletes[table] += 1
+                        yield {"table": table, "deleted": True, **row}
+                for table in table_names:
+                    for row in crud.iter_changed_rows(session, table, since_times[table], until, batch_size):
+                        counts[table] += 1
+                        yield {"table": table, "deleted": False, **row}
+
+            total = write_rows(changed_rows(), output_format)
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}", file=sys.stderr)
+            raise typer.Exit(code=1)
+
+        # Ends the read transaction before writing the watermark
+        session.rollback()
+
+        summary = ", ".join(
+            f"{table} {count}" + (f" (+{deletes[table]} deleted)" if deletes[table] else "")
+            + f" after {since_times[table] or 'the beginning'}"
+            for table, count in counts.items()
+        )
+        print(f"Exported {total} row(s) changed up to {until}: {summary}", file=sys.stderr)
+
+        if record:
+            rows = {table: counts[table] + deletes[table] for table in table_names}
+            if not crud.record_export_watermark(session, name, until, rows):
+                raise typer.Exit(code=1)
+            print(f"Watermark '{name}' is now {until} for {', '.join(table_names)}", file=sys.stderr)
+
+    finally:
+        session.close()
@@ -4,6 +4,7 @@ from typing import Annotated
 
 import oee_tracker.crud as crud
 import oee_tracker.db as db
+from oee_tracker.cli.output import FormatOption, check_format, write_rows
 
 app = typer.Typer(help="Manage machines.")
 
@@ -38,14 +39,26 @@ def create(
         session.close()
 
 @app.command()
-def list():
+def list(output_format: FormatOption = "text"):
     """List all machines."""
+
+    check_format(output_format)
     
-    session = db.get_session()
+    session = db.get_reporting_session()
 
     try:
         machines = crud.get_all_machines(session)
 
+        if output_format != "text":
+            write_rows(
+                (
+                    {"id": m.id, "name": m.name, "ideal_cycle_time": m.ideal_cycle_time, "location": m.location}
+                    for m in machines
+                ),
+                output_format,
+            )
+            return
+
         if machines is None:
             print("No machines found.")
             return
@@ -63,7 +76,7 @@ def list():
 def get(id: int):
     """Get machine by id"""
 
-    session = db.get_session()
+    session = db.get_reporting_session()
 
     try:
         machine = crud.get_machine(session, id)
@@ -0,0 +1,106 @@
+# cli/maintenance.py
+import typer
+from datetime import datetime
+from typing import Annotated
+
+import oee_tracker.crud as crud
+import oee_tracker.db as db
+from oee_tracker.cli.output import FormatOption, check_format, write_rows
+
+app = typer.Typer(help="Database maintenance tasks.")
+
+
+@app.command()
+def sweep(
+    downtime_max: Annotated[float, typer.Option("--downtime-max", help="Close downtime open longer than this (minutes)")] = 480,
+    run_margin: Annotated[float, typer.Option("--run-margin", help="Runs past planned end by this many minutes are overdue")] = 60,
+    close_runs: Annotated[bool, typer.Option("--close-runs", help="Stop overdue runs at their planned end (default: only report them)")] = False,
+    batch_size: Annotated[int, typer.Option("--batch-size", help="Rows updated per transaction")] = 500,
+    dry_run: Annotated[bool, typer.Option("--dry-run", help="Show what would change without updating")] = False,
+    output_format: FormatOption = "text",
+):
+    """Close stale downtime events and flag or close overdue production runs."""
+
+    check_format(output_format)
+
+    if batch_size < 1:
+        print("Error: --batch-size must be at least 1")
+        raise typer.Exit(code=1)
+
+    session = db.get_session()
+
+    try:
+        events = crud.sweep_stale_downtime(session, downtime_max, batch_size, dry_run)
+        if events is None:
+            raise typer.Exit(code=1)
+
+        runs = crud.sweep_overdue_runs(session, run_margin, close_runs, batch_size, dry_run)
+        if runs is None:
+            raise typer.Exit(code=1)
+
+        if output_format != "text":
+            changes = [{"type": "downtime", **event} for event in events]
+            changes += [{"type": "run", **run} for run in runs]
+            # Same columns on every row so CSV keeps both kinds
+            columns = {key: None for change in changes for key in change}
+            write_rows(({**columns, **change} for change in changes), output_format)
+            return
+
+        prefix = "Would close" if dry_run else "Closed"
+
+        print(f"\n{prefix} {len(events)} downtime event(s)")
+        if events:
+            print(f"{'ID':<6} {'Run':<6} {'Reason':<12} {'Start':<20} {'End':<20} {'Rule'}")
+            print("─" * 85)
+            for event in events:
+                start = event["start_time"].strftime("%Y-%m-%d %H:%M")
+                end = event["end_time"].strftime("%Y-%m-%d %H:%M")
+                print(f"{event['id']:<6} {event['production_run_id']:<6} {event['reason_code']:<12} {start:<20} {end:<20} {event['rule']}")
+
+        if close_runs:
+            print(f"\n{prefix} {len(runs)} overdue run(s)")
+        else:
+            print(f"\n{len(runs)} overdue run(s) still running (use --close-runs to stop them)")
+        if runs:
+            print(f"{'ID':<6} {'Machine':<8} {'Started':<20} {'Planned End':<20}")
+            print("─" * 56)
+            for run in runs:
+                started = run["actual_start_time"].strftime("%Y-%m-%d %H:%M")
+                planned_end = run["planned_end_time"].strftime("%Y-%m-%d %H:%M")
+                print(f"{run['id']:<6} {run['machine_id']:<8} {started:<20} {planned_end:<20}")
+
+    finally:
+        session.close()
+
+
+@app.command()
+def archive(
+    before: Annotated[str, typer.Option("--before", help="Archive runs that ended before this date (YYYY-MM-DD)")],
+    batch_size: Annotated[int, typer.Option("--batch-size", help="Runs moved per transaction")] = 1000,
+    dry_run: Annotated[bool, typer.Option("--dry-run", help="Count what would be archived without moving it")] = False,
+):
+    """Move completed runs and their downtime events into the archive tables."""
+
+    try:
+        before_date = datetime.strptime(before, "%Y-%m-%d")
+    except ValueError:
+        print("Error: Invalid date format. Use YYYY-MM-DD")
+        raise typer.Exit(code=1)
+
+    if batch_size < 1:
+        print("Error: --batch-size must be at least 1")
+        raise typer.Exit(code=1)
+
+    session = db.get_session()
+
+    try:
+        moved = crud.archive_production_runs(session, before_date, batch_size, dry_run)
+
+        if moved is None:
+            raise typer.Exit(code=1)
+
+        prefix = "Would archive" if dry_run else "Archived"
+        print(f"{prefix} {moved['runs']} run(s) and {moved['downtime_events']} downtime event(s) ended before {before}")
+
+    finally:
+        session.close()
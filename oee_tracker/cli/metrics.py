@@ -0,0 +1,86 @@
+# cli/metrics.py
+import threading
+import typer
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Annotated
+
+import oee_tracker.db as db
+from oee_tracker.metrics import MetricsState
+
+app = typer.Typer(help="Prometheus metrics exporter.")
+
+
+def refresh_state(state: MetricsState):
+    """Refresh the metrics state on a reporting session."""
+    session = db.get_reporting_session()
+
+    try:
+        state.refresh(session)
+    finally:
+        session.close()
+
+
+def make_handler(state: MetricsState):
+    """Request handler serving the state at /metrics."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = state.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Keep scrapes out of the output
+            pass
+
+    return MetricsHandler
+
+
+@app.command()
+def serve(
+    port: Annotated[int, typer.Option("--port", help="Port to listen on")] = 9464,
+    host: Annotated[str, typer.Option("--host", help="Address to listen on")] = "127.0.0.1",
+    refresh: Annotated[float, typer.Option("--refresh", help="Seconds between state refreshes")] = 30,
+    window: Annotated[float, typer.Option("--window", help="Hours of completed runs behind the OEE gauges")] = 24,
+    once: Annotated[bool, typer.Option("--once", help="Refresh once, print the metrics and exit")] = False,
+):
+    """Serve OEE and latency metrics at http://HOST:PORT/metrics."""
+
+    if refresh <= 0 or window <= 0:
+        print("Error: --refresh and --window must be positive")
+        raise typer.Exit(code=1)
+
+    state = MetricsState(timedelta(hours=window))
+    state.instrument_sql()
+    refresh_state(state)
+
+    if once:
+        print(state.render(), end="")
+        return
+
+    stop = threading.Event()
+
+    def refresh_loop():
+        while not stop.wait(refresh):
+            refresh_state(state)
+
+    refresher = threading.Thread(target=refresh_loop, name="metrics-refresh", daemon=True)
+    refresher.start()
+
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    print(f"Serving metrics at http://{host}:{port}/metrics (refresh every {refresh:g}s, Ctrl+C to stop)")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopped.")
+    finally:
+        stop.set()
+        server.server_close()
@@ -4,6 +4,7 @@ from typing import Annotated
 
 import oee_tracker.crud as crud
 import oee_tracker.db as db
+from oee_tracker.cli.output import FormatOption, check_format, write_rows
 
 app = typer.Typer(help="Manage operators.")
 
@@ -27,14 +28,20 @@ def create(name: str):
 
 
 @app.command()
-def list():
+def list(output_format: FormatOption = "text"):
     """List all operators."""
 
-    session = db.get_session()
+    check_format(output_format)
+
+    session = db.get_reporting_session()
 
     try:
         operators = crud.get_all_operators(session)
 
+        if output_format != "text":
+            write_rows(({"id": operator.id, "name": operator.name} for operator in operators), output_format)
+            return
+
         if not operators:
             print("No operators found.")
             return
@@ -50,7 +57,7 @@ def list():
 def get(operator_id: int):
     """Get operator by id."""
 
-    session = db.get_session()
+    session = db.get_reporting_session()
 
     try:
         operator = crud.get_operator(session, operator_id)
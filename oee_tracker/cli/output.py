@@ -0,0 +1,78 @@
+# cli/output.py
+import csv
+import json
+import sys
+import typer
+from typing import Annotated, Iterable
+from datetime import date, datetime
+from decimal import Decimal
+
+FORMATS = ("text", "json", "jsonl", "csv")
+
+FormatOption = Annotated[str, typer.Option("--format", help="Output format: text, json, jsonl or csv")]
+
+
+def check_format(output_format: str):
+    """Exit with an error for an unknown output format."""
+    if output_format not in FORMATS:
+        print(f"Error: Invalid format '{output_format}'. Use {', '.join(FORMATS)}")
+        raise typer.Exit(code=1)
+
+
+def plain_value(value):
+    """Convert a value to something JSON and CSV can write."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, tuple):
+        return ",".join(str(v) for v in value)
+    return value
+
+
+def plain_row(row) -> dict:
+    """Convert a dict or result row mapping to a plain dict."""
+    return {key: plain_value(value) for key, value in dict(row).items()}
+
+
+def write_rows(rows: Iterable, output_format: str) -> int:
+    """
+    Write rows (dicts or row mappings) as json, jsonl or csv, one at a time,
+    so a streamed result is never collected into a list. Returns the row count.
+    """
+    out = sys.stdout
+    count = 0
+
+    if output_format == "jsonl":
+        for row in rows:
+            out.write(json.dumps(plain_row(row)) + "\n")
+            count += 1
+
+    elif output_format == "json":
+        out.write("[")
+        for row in rows:
+            out.write(("," if count else "") + "\n  " + json.dumps(plain_row(row)))
+            count += 1
+        out.write("\n]\n" if count else "]\n")
+
+    elif output_format == "csv":
+        writer = None
+        for row in rows:
+            row = plain_row(row)
+            if writer is None:
+                # Columns come from the first row
+                writer = csv.DictWriter(out, fieldnames=list(row), extrasaction="ignore")
+                writer.writeheader()
+            writer.writerow(row)
+            count += 1
+
+    out.flush()
+    return count
+
+
+def write_row(row, output_format: str):
+    """Write a single result (e.g. one report) in the given format."""
+    if output_format == "json":
+        sys.stdout.write(json.dumps(plain_row(row), indent=2) + "\n")
+    else:
+        write_rows([row], output_format)
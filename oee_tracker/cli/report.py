@@ -1,13 +1,23 @@
 # cli/report.py
+import sys
 import typer
 from typing import Annotated
 from datetime import datetime
 
 import oee_tracker.crud as crud
 import oee_tracker.db as db
+from oee_tracker import dimensions
+from oee_tracker import timeline as timeline_engine
+from oee_tracker.cli.output import FormatOption, check_format, write_row, write_rows
+from oee_tracker.cli.run import parse_id_list
+from oee_tracker.sites import SiteResult, load_sites, query_sites, merge_oee_totals, merge_downtime_totals
 
 app = typer.Typer(help="OEE calculations and reports.")
 
+IncludeArchiveOption = Annotated[bool, typer.Option("--include-archive", help="Also read archived runs and downtime")]
+TimeoutOption = Annotated[float, typer.Option("--timeout", help="Cancel queries running longer than this many seconds")]
+SitesOption = Annotated[str, typer.Option("--sites", help="Report across the plant databases listed in this TOML file")]
+
 
 def parse_date(date_str: str | None) -> datetime | None:
     """Parse date string to datetime."""
@@ -25,15 +35,28 @@ def format_percent(value: float) -> str:
     return f"{value * 100:.1f}%"
 
 
+def format_minutes(minutes: float | None) -> str:
+    """Format minutes with one decimal."""
+    if minutes is None:
+        return "N/A"
+    return f"{minutes:.1f}"
+
+
 # ============================================================
 # OEE CALCULATIONS
 # ============================================================
 
 @app.command()
-def oee(run_id: int):
+def oee(
+    run_id: int,
+    timeout: TimeoutOption = None,
+    output_format: FormatOption = "text",
+):
     """Calculate OEE for a single production run."""
 
-    session = db.get_session()
+    check_format(output_format)
+
+    session = db.get_reporting_session(timeout)
 
     try:
         result = crud.calculate_oee(session, run_id)
@@ -43,6 +66,10 @@ def oee(run_id: int):
             print("  Run may not exist, be incomplete, or missing part counts.")
             raise typer.Exit(code=1)
 
+        if output_format != "text":
+            write_row({"run_id": run_id, **result}, output_format)
+            return
+
         print(f"OEE Report for Production Run {run_id}")
         print(f"  Availability: {format_percent(result['availability'])}")
         print(f"  Performance:  {format_percent(result['performance'])}")
@@ -59,24 +86,31 @@ def machine(
     machine_id: int,
     start: Annotated[str, typer.Option(help="Start date (YYYY-MM-DD)")] = None,
     end: Annotated[str, typer.Option(help="End date (YYYY-MM-DD)")] = None,
+    include_archive: IncludeArchiveOption = False,
+    timeout: TimeoutOption = None,
+    output_format: FormatOption = "text",
 ):
     """Calculate OEE for a machine over a date range."""
 
-    session = db.get_session()
+    check_format(output_format)
+
+    session = db.get_reporting_session(timeout)
 
     try:
         start_date = parse_date(start)
         end_date = parse_date(end)
 
-        result = crud.calculate_oee_by_machine(session, machine_id, start_date, end_date)
+        result = crud.calculate_oee_by_machine(session, machine_id, start_date, end_date, include_archive)
 
         if result is None:
             print(f"Error: No completed runs found for machine {machine_id}")
             raise typer.Exit(code=1)
 
-        # Get machine name
-        machine_obj = crud.get_machine(session, machine_id)
-        machine_name = machine_obj.name if machine_obj else f"Machine {machine_id}"
+        if output_format != "text":
+            write_row(result, output_format)
+            return
+
+        machine_name = dimensions.name(session, "machine", machine_id)
 
         print(f"OEE Report for {machine_name}")
         if start_date or end_date:
@@ -99,24 +133,31 @@ def shift(
     shift_id: int,
     start: Annotated[str, typer.Option(help="Start date (YYYY-MM-DD)")] = None,
     end: Annotated[str, typer.Option(help="End date (YYYY-MM-DD)")] = None,
+    include_archive: IncludeArchiveOption = False,
+    timeout: TimeoutOption = None,
+    output_format: FormatOption = "text",
 ):
     """Calculate OEE for a shift over a date range."""
 
-    session = db.get_session()
+    check_format(output_format)
+
+    session = db.get_reporting_session(timeout)
 
     try:
         start_date = parse_date(start)
         end_date = parse_date(end)
 
-        result = crud.calculate_oee_by_shift(session, shift_id, start_date, end_date)
+        result = crud.calculate_oee_by_shift(session, shift_id, start_date, end_date, include_archive)
 
         if result is None:
             print(f"Error: No completed runs found for shift {shift_id}")
             raise typer.Exit(code=1)
 
-        # Get shift name
-        shift_obj = crud.get_shift(session, shift_id)
-        shift_name = shift_obj.name if shift_obj else f"Shift {shift_id}"
+        if output_format != "text":
+            write_row(result, output_format)
+            return
+
+        shift_name = dimensions.name(session, "shift", shift_id)
 
         print(f"OEE Report for {shift_name}")
         if start_date or end_date:
@@ -134,6 +175,53 @@ def shift(
         session.close()
 
 
+@app.command()
+def operator(
+    operator_id: int,
+    start: Annotated[str, typer.Option(help="Start date (YYYY-MM-DD)")] = None,
+    end: Annotated[str, typer.Option(help="End date (YYYY-MM-DD)")] = None,
+    include_archive: IncludeArchiveOption = False,
+    timeout: TimeoutOption = None,
+    output_format: FormatOption = "text",
+):
+    """Calculate OEE for an operator over a date range."""
+
+    check_format(output_format)
+
+    session = db.get_reporting_session(timeout)
+
+    try:
+        start_date = parse_date(start)
+        end_date = parse_date(end)
+
+        result = crud.calculate_oee_by_operator(session, operator_id, start_date, end_date, include_archive)
+
+        if result is None:
+            print(f"Error: No completed runs found for operator {operator_id}")
+            raise typer.Exit(code=1)
+
+        if output_format != "text":
+            write_row(result, output_format)
+            return
+
+        operator_name = dimensions.name(session, "operator", operator_id)
+
+        print(f"OEE Report for {operator_name}")
+        if start_date or end_date:
+            date_range = f"{start or 'beginning'} to {end or 'now'}"
+            print(f"  Date Range: {date_range}")
+        print(f"  Runs: {result['runs_included']}/{result['runs_total']} included")
+        print()
+        print(f"  Avg Availability: {format_percent(result['avg_availability'])}")
+        print(f"  Avg Performance:  {format_percent(result['avg_performance'])}")
+        print(f"  Avg Quality:      {format_percent(result['avg_quality'])}")
+        print(f"  ─────────────────────────")
+        print(f"  Avg OEE:          {format_percent(result['avg_oee'])}")
+
+    finally:
+        session.close()
+
+
 # ============================================================
 # REPORTS
 # ============================================================
@@ -143,16 +231,30 @@ def downtime(
     limit: Annotated[int, typer.Option(help="Number of top reasons to show")] = 5,
     start: Annotated[str, typer.Option(help="Start date (YYYY-MM-DD)")] = None,
     end: Annotated[str, typer.Option(help="End date (YYYY-MM-DD)")] = None,
+    include_archive: IncludeArchiveOption = False,
+    timeout: TimeoutOption = None,
+    sites: SitesOption = None,
+    output_format: FormatOption = "text",
 ):
     """Show top downtime reasons by total duration."""
 
-    session = db.get_session()
+    check_format(output_format)
+
+    if sites:
+        downtime_across_sites(sites, limit, start, end, include_archive, timeout, output_format)
+        return
+
+    session = db.get_reporting_session(timeout)
 
     try:
         start_date = parse_date(start)
         end_date = parse_date(end)
 
-        results = crud.get_top_downtime_reasons(session, limit, start_date, end_date)
+        results = crud.get_top_downtime_reasons(session, limit, start_date, end_date, include_archive)
+
+        if output_format != "text":
+            write_rows(results, output_format)
+            return
 
         if not results:
             print("No downtime data found.")
@@ -182,16 +284,30 @@ def downtime(
 def machines(
     start: Annotated[str, typer.Option(help="Start date (YYYY-MM-DD)")] = None,
     end: Annotated[str, typer.Option(help="End date (YYYY-MM-DD)")] = None,
+    include_archive: IncludeArchiveOption = False,
+    timeout: TimeoutOption = None,
+    sites: SitesOption = None,
+    output_format: FormatOption = "text",
 ):
     """Rank all machines by OEE."""
 
-    session = db.get_session()
+    check_format(output_format)
+
+    if sites:
+        machines_across_sites(sites, start, end, include_archive, timeout, output_format)
+        return
+
+    session = db.get_reporting_session(timeout)
 
     try:
         start_date = parse_date(start)
         end_date = parse_date(end)
 
-        results = crud.get_machines_ranked_by_oee(session, start_date, end_date)
+        results = crud.get_machines_ranked_by_oee(session, start_date, end_date, include_archive)
+
+        if output_format != "text":
+            write_rows(results, output_format)
+            return
 
         if not results:
             print("No OEE data found for any machines.")
@@ -206,10 +322,7 @@ def machines(
         print("─" * 66)
 
         for i, m in enumerate(results, 1):
-            # Get machine name
-            machine_obj = crud.get_machine(session, m['machine_id'])
-            name = machine_obj.name if machine_obj else f"ID:{m['machine_id']}"
-
+            name = m['name']
             print(f"{i:<6}{name:<12}{format_percent(m['avg_oee']):<10}{format_percent(m['avg_availability']):<10}{format_percent(m['avg_performance']):<10}{format_percent(m['avg_quality']):<10}{m['runs_included']:<8}")
 
     finally:
@@ -220,16 +333,30 @@ def machines(
 def shifts(
     start: Annotated[str, typer.Option(help="Start date (YYYY-MM-DD)")] = None,
     end: Annotated[str, typer.Option(help="End date (YYYY-MM-DD)")] = None,
+    include_archive: IncludeArchiveOption = False,
+    timeout: TimeoutOption = None,
+    sites: SitesOption = None,
+    output_format: FormatOption = "text",
 ):
     """Compare all shifts by OEE."""
 
-    session = db.get_session()
+    check_format(output_format)
+
+    if sites:
+        shifts_across_sites(sites, start, end, include_archive, timeout, output_format)
+        return
+
+    session = db.get_reporting_session(timeout)
 
     try:
         start_date = parse_date(start)
         end_date = parse_date(end)
 
-        results = crud.compare_shifts(session, start_date, end_date)
+        results = crud.compare_shifts(session, start_date, end_date, include_archive)
+
+        if output_format != "text":
+            write_rows(results, output_format)
+            return
 
         if not results:
             print("No OEE data found for any shifts.")
@@ -244,11 +371,584 @@ def shifts(
         print("─" * 69)
 
         for i, s in enumerate(results, 1):
-            # Get shift name
-            shift_obj = crud.get_shift(session, s['shift_id'])
-            name = shift_obj.name if shift_obj else f"ID:{s['shift_id']}"
-
+            name = s['name']
             print(f"{i:<6}{name:<15}{format_percent(s['avg_oee']):<10}{format_percent(s['avg_availability']):<10}{format_percent(s['avg_performance']):<10}{format_percent(s['avg_quality']):<10}{s['runs_included']:<8}")
 
     finally:
         session.close()
+
+
+@app.command()
+def operators(
+    start: Annotated[str, typer.Option(help="Start date (YYYY-MM-DD)")] = None,
+    end: Annotated[str, typer.Option(help="End date (YYYY-MM-DD)")] = None,
+    limit: Annotated[int, typer.Option(help="Number of operators to show")] = None,
+    include_archive: IncludeArchiveOption = False,
+    timeout: TimeoutOption = None,
+    output_format: FormatOption = "text",
+):
+    """Rank all operators by OEE."""
+
+    check_format(output_format)
+
+    session = db.get_reporting_session(timeout)
+
+    try:
+        start_date = parse_date(start)
+        end_date = parse_date(end)
+
+        results = crud.get_operators_ranked_by_oee(session, start_date, end_date, include_archive)[:limit]
+
+        if output_format != "text":
+            write_rows(results, output_format)
+            return
+
+        if not results:
+            print("No OEE data found for any operators.")
+            return
+
+        print("Operators Ranked by OEE")
+        if start_date or end_date:
+            date_range = f"{start or 'beginning'} to {end or 'now'}"
+            print(f"Date Range: {date_range}")
+        print()
+        print(f"{'Rank':<6}{'Operator':<20}{'OEE':<10}{'Avail':<10}{'Perf':<10}{'Quality':<10}{'Runs':<8}")
+        print("─" * 74)
+
+        for i, o in enumerate(results, 1):
+            print(f"{i:<6}{o['name']:<20}{format_percent(o['avg_oee']):<10}{format_percent(o['avg_availability']):<10}{format_percent(o['avg_performance']):<10}{format_percent(o['avg_quality']):<10}{o['runs_included']:<8}")
+
+    finally:
+        session.close()
+
+
+@app.command("downtime-analysis")
+def downtime_analysis(
+    start: Annotated[str, typer.Option(help="Start date (YYYY-MM-DD)")] = None,
+    end: Annotated[str, typer.Option(help="End date (YYYY-MM-DD)")] = None,
+    limit: Annotated[int, typer.Option(help="Top reasons to show per machine")] = 3,
+    detail: Annotated[bool, typer.Option(help="Show every reason x machine x shift combination")] = False,
+    include_archive: IncludeArchiveOption = False,
+    timeout: TimeoutOption = None,
+    output_format: FormatOption = "text",
+):
+    """Break downtime down by reason, machine, shift and planned/unplanned."""
+
+    check_format(output_format)
+
+    session = db.get_reporting_session(timeout)
+
+    try:
+        start_date = parse_date(start)
+        end_date = parse_date(end)
+
+        results = crud.get_downtime_breakdown(session, start_date, end_date, include_archive)
+
+        if output_format != "text":
+            write_rows(results, output_format)
+            return
+
+        if not results:
+            print("No downtime data found.")
+            return
+
+        machine_names = dimensions.names(session, "machine")
+        shift_names = dimensions.names(session, "shift")
+
+        levels = {}
+        for row in results:
+            levels.setdefault(row["dimensions"], []).append(row)
+
+        def planned_split(key: str) -> dict:
+            """Planned/unplanned minutes keyed by (id, is_planned)."""
+            return {
+                (row[key], row["is_planned"]): row["total_duration_minutes"]
+                for row in levels.get((key, "is_planned"), [])
+            }
+
+        print("Downtime Analysis")
+        if start_date or end_date:
+            date_range = f"{start or 'beginning'} to {end or 'now'}"
+            print(f"Date Range: {date_range}")
+        print()
+
+        total = levels[()][0]
+        by_category = {row["is_planned"]: row["total_duration_minutes"] for row in levels.get(("is_planned",), [])}
+        print(f"Total: {total['event_count']} events, {format_minutes(total['total_duration_minutes'])} min")
+        print(f"  Planned:   {format_minutes(by_category.get(True, 0))} min")
+        print(f"  Unplanned: {format_minutes(by_category.get(False, 0))} min")
+        print()
+
+        print("By Reason")
+        print(f"{'Code':<12}{'Description':<30}{'Type':<11}{'Events':<8}{'Minutes':<10}{'Avg':<8}")
+        print("─" * 79)
+        for row in levels.get(("reason_code", "is_planned"), []):
+            kind = "Planned" if row["is_planned"] else "Unplanned"
+            print(f"{row['reason_code']:<12}{row['description']:<30}{kind:<11}{row['event_count']:<8}{format_minutes(row['total_duration_minutes']):<10}{format_minutes(row['avg_duration_minutes']):<8}")
+        print()
+
+        split = planned_split("machine_id")
+        print("By Machine")
+        print(f"{'Machine':<12}{'Events':<8}{'Minutes':<10}{'Planned':<10}{'Unplanned':<11}{'Avg':<8}")
+        print("─" * 59)
+        for row in levels.get(("machine_id",), []):
+            name = machine_names.get(row["machine_id"], f"ID:{row['machine_id']}")
+            planned = format_minutes(split.get((row["machine_id"], True), 0))
+            unplanned = format_minutes(split.get((row["machine_id"], False), 0))
+            print(f"{name:<12}{row['event_count']:<8}{format_minutes(row['total_duration_minutes']):<10}{planned:<10}{unplanned:<11}{format_minutes(row['avg_duration_minutes']):<8}")
+        print()
+
+        split = planned_split("shift_id")
+        print("By Shift")
+        print(f"{'Shift':<15}{'Events':<8}{'Minutes':<10}{'Planned':<10}{'Unplanned':<11}{'Avg':<8}")
+        print("─" * 62)
+        for row in levels.get(("shift_id",), []):
+            name = shift_names.get(row["shift_id"], f"ID:{row['shift_id']}")
+            planned = format_minutes(split.get((row["shift_id"], True), 0))
+            unplanned = format_minutes(split.get((row["shift_id"], False), 0))
+            print(f"{name:<15}{row['event_count']:<8}{format_minutes(row['total_duration_minutes']):<10}{planned:<10}{unplanned:<11}{format_minutes(row['avg_duration_minutes']):<8}")
+        print()
+
+        print(f"Top {limit} Reasons per Machine")
+        print(f"{'Machine':<12}{'Code':<12}{'Events':<8}{'Minutes':<10}{'Avg':<8}")
+        print("─" * 50)
+        shown = {}
+        machine_reasons = sorted(
+            levels.get(("reason_code", "machine_id", "is_planned"), []),
+            key=lambda row: (row["machine_id"], -(row["total_duration_minutes"] or 0)),
+        )
+        for row in machine_reasons:
+            if shown.get(row["machine_id"], 0) >= limit:
+                continue
+            shown[row["machine_id"]] = shown.get(row["machine_id"], 0) + 1
+            name = machine_names.get(row["machine_id"], f"ID:{row['machine_id']}")
+            print(f"{name:<12}{row['reason_code']:<12}{row['event_count']:<8}{format_minutes(row['total_duration_minutes']):<10}{format_minutes(row['avg_duration_minutes']):<8}")
+
+        if detail:
+            print()
+            print("Reason x Machine x Shift")
+            print(f"{'Machine':<12}{'Shift':<15}{'Code':<12}{'Events':<8}{'Minutes':<10}{'Avg':<8}")
+            print("─" * 65)
+            details = sorted(
+                levels.get(("reason_code", "machine_id", "shift_id", "is_planned"), []),
+                key=lambda row: (row["machine_id"], row["shift_id"], -(row["total_duration_minutes"] or 0)),
+            )
+            for row in details:
+                machine_name = machine_names.get(row["machine_id"], f"ID:{row['machine_id']}")
+                shift_name = shift_names.get(row["shift_id"], f"ID:{row['shift_id']}")
+                print(f"{machine_name:<12}{shift_name:<15}{row['reason_code']:<12}{row['event_count']:<8}{format_minutes(row['total_duration_minutes']):<10}{format_minutes(row['avg_duration_minutes']):<8}")
+
+    finally:
+        session.close()
+
+
+@app.command()
+def trend(
+    start: Annotated[str, typer.Option(help="Start date (YYYY-MM-DD)")],
+    end: Annotated[str, typer.Option(help="End date (YYYY-MM-DD)")],
+    bucket: Annotated[str, typer.Option(help="Bucket size: hour, shift, day or week")] = "day",
+    machine_id: Annotated[int, typer.Option("--machine", help="Filter by machine ID")] = None,
+    shift_id: Annotated[int, typer.Option("--shift", help="Filter by shift ID")] = None,
+    include_archive: IncludeArchiveOption = False,
+    timeout: TimeoutOption = None,
+    output_format: FormatOption = "text",
+):
+    """Show OEE per hour, shift, day or week over a date range."""
+
+    check_format(output_format)
+
+    if bucket not in crud.TREND_BUCKETS:
+        print(f"Error: Invalid bucket '{bucket}'. Use {', '.join(crud.TREND_BUCKETS)}")
+        raise typer.Exit(code=1)
+
+    session = db.get_reporting_session(timeout)
+
+    try:
+        start_date = parse_date(start)
+        end_date = parse_date(end)
+
+        results = crud.get_oee_trend(
+            session, bucket, start_date, end_date, machine_id, shift_id, include_archive
+        )
+
+        if output_format != "text":
+            write_rows(results, output_format)
+            return
+
+        if not results:
+            print("No OEE data found.")
+            return
+
+        shift_names = {}
+        if bucket == "shift":
+            shift_names = dimensions.names(session, "shift")
+
+        title = f"OEE Trend by {bucket.capitalize()}"
+        if machine_id is not None:
+            title += f" for {dimensions.name(session, 'machine', machine_id)}"
+        print(title)
+        print(f"Date Range: {start} to {end}")
+        print()
+
+        label_width = 18 if bucket == "hour" else 12
+        shift_header = f"{'Shift':<15}" if bucket == "shift" else ""
+        print(f"{'Bucket':<{label_width}}{shift_header}{'OEE':<10}{'Avail':<10}{'Perf':<10}{'Quality':<10}{'Runs':<8}")
+        print("─" * (label_width + len(shift_header) + 48))
+
+        for row in results:
+            if bucket == "hour":
+                label = row["bucket_start"].strftime("%Y-%m-%d %H:00")
+            else:
+                label = row["bucket_start"].strftime("%Y-%m-%d")
+
+            shift_column = ""
+            if bucket == "shift":
+                shift_name = shift_names.get(row["shift_id"], f"ID:{row['shift_id']}")
+                shift_column = f"{shift_name:<15}"
+
+            if row["avg_oee"] is None:
+                print(f"{label:<{label_width}}{shift_column}{'-':<10}{'-':<10}{'-':<10}{'-':<10}{row['runs_included']:<8}")
+            else:
+                print(f"{label:<{label_width}}{shift_column}{format_percent(row['avg_oee']):<10}{format_percent(row['avg_availability']):<10}{format_percent(row['avg_performance']):<10}{format_percent(row['avg_quality']):<10}{row['runs_included']:<8}")
+
+    finally:
+        session.close()
+
+
+@app.command()
+def distribution(
+    metric: Annotated[str, typer.Option(help="Metric: oee (per run) or downtime (event minutes)")] = "oee",
+    by: Annotated[str, typer.Option(help="Group by: machine, shift, operator (oee) or reason, machine, shift (downtime)")] = None,
+    start: Annotated[str, typer.Option(help="Start date (YYYY-MM-DD)")] = None,
+    end: Annotated[str, typer.Option(help="End date (YYYY-MM-DD)")] = None,
+    approx: Annotated[bool, typer.Option(help="Use a histogram sketch instead of exact percentiles")] = False,
+    include_archive: IncludeArchiveOption = False,
+    timeout: TimeoutOption = None,
+    output_format: FormatOption = "text",
+):
+    """Show p10/p50/p90 and standard deviation of OEE or downtime durations."""
+
+    check_format(output_format)
+
+    if metric == "oee":
+        groups = crud.OEE_DISTRIBUTION_GROUPS
+        by = by or "machine"
+    elif metric == "downtime":
+        groups = crud.DOWNTIME_DISTRIBUTION_GROUPS
+        by = by or "reason"
+    else:
+        print(f"Error: Invalid metric '{metric}'. Use oee or downtime")
+        raise typer.Exit(code=1)
+
+    if by not in groups:
+        print(f"Error: Invalid group '{by}' for {metric}. Use {', '.join(groups)}")
+        raise typer.Exit(code=1)
+
+    session = db.get_reporting_session(timeout)
+
+    try:
+        start_date = parse_date(start)
+        end_date = parse_date(end)
+
+        if metric == "oee":
+            results = crud.get_oee_distribution(session, by, start_date, end_date, approx, include_archive)
+            format_value = format_percent
+            title = "OEE Distribution"
+        else:
+            results = crud.get_downtime_distribution(session, by, start_date, end_date, approx, include_archive)
+            format_value = format_minutes
+            title = "Downtime Duration Distribution (minutes)"
+
+        if output_format != "text":
+            write_rows(results, output_format)
+            return
+
+        if not results:
+            print(f"No {metric} data found.")
+            return
+
+        print(f"{title} by {by.capitalize()}{' (approximate)' if approx else ''}")
+        if start_date or end_date:
+            date_range = f"{start or 'beginning'} to {end or 'now'}"
+            print(f"Date Range: {date_range}")
+        print()
+        print(f"{by.capitalize():<30}{'Count':<8}{'Mean':<10}{'StdDev':<10}{'P10':<10}{'P50':<10}{'P90':<10}")
+        print("─" * 88)
+
+        for row in results:
+            stddev = format_value(row["stddev"]) if row["stddev"] is not None else "N/A"
+            print(f"{str(row['name']):<30}{row['count']:<8}{format_value(row['mean']):<10}{stddev:<10}{format_value(row['p10']):<10}{format_value(row['p50']):<10}{format_value(row['p90']):<10}")
+
+    finally:
+        session.close()
+
+
+@app.command()
+def losses(
+    by: Annotated[str, typer.Option(help="Group by: machine, shift, operator or total")] = "machine",
+    start: Annotated[str, typer.Option(help="Start date (YYYY-MM-DD)")] = None,
+    end: Annotated[str, typer.Option(help="End date (YYYY-MM-DD)")] = None,
+    small_stop: Annotated[float, typer.Option(help="Unplanned stops shorter than this many minutes are small stops")] = crud.SMALL_STOP_MINUTES,
+    setup_codes: Annotated[str, typer.Option(help="Reason codes counted as setup/adjustment (e.g. SETUP,CHANGEOVER)")] = ",".join(crud.SETUP_REASON_CODES),
+    include_archive: IncludeArchiveOption = False,
+    timeout: TimeoutOption = None,
+    output_format: FormatOption = "text",
+):
+    """Show the Six Big Losses in minutes."""
+
+    check_format(output_format)
+
+    group_by = None if by == "total" else by
+    if group_by is not None and group_by not in crud.LOSS_GROUPS:
+        print(f"Error: Invalid group '{by}'. Use {', '.join(crud.LOSS_GROUPS)}, total")
+        raise typer.Exit(code=1)
+
+    setup_reason_codes = tuple(code.strip() for code in setup_codes.split(",") if code.strip())
+
+    session = db.get_reporting_session(timeout)
+
+    try:
+        start_date = parse_date(start)
+        end_date = parse_date(end)
+
+        results = crud.get_six_big_losses(
+            session, group_by, start_date, end_date, small_stop, setup_reason_codes, include_archive
+        )
+
+        if output_format != "text":
+            write_rows(results, output_format)
+            return
+
+        if not results:
+            print("No completed runs found.")
+            return
+
+        print("Six Big Losses (minutes)")
+        if start_date or end_date:
+            date_range = f"{start or 'beginning'} to {end or 'now'}"
+            print(f"Date Range: {date_range}")
+        print(f"Small stops: unplanned stops under {small_stop:g} min | Setup codes: {', '.join(setup_reason_codes)}")
+        print()
+
+        name_header = f"{by.capitalize():<15}" if group_by else ""
+        print(f"{name_header}{'Runs':<6}{'Breakdown':<11}{'Setup':<9}{'Small':<9}{'Speed':<9}{'Startup':<9}{'Rejects':<9}{'Productive':<11}{'Planned':<9}")
+        print("─" * (len(name_header) + 82))
+
+        for row in results:
+            name_column = f"{str(row['name']):<15}" if group_by else ""
+            startup = format_minutes(row["startup_rejects"]) if row["startup_rejects"] is not None else "n/a"
+            print(f"{name_column}{row['runs']:<6}{format_minutes(row['breakdowns']):<11}{format_minutes(row['setup_adjustment']):<9}{format_minutes(row['small_stops']):<9}{format_minutes(row['reduced_speed']):<9}{startup:<9}{format_minutes(row['production_rejects']):<9}{format_minutes(row['fully_productive_time']):<11}{format_minutes(row['planned_stops']):<9}")
+
+        print()
+        print("Planned: breaks and other planned stops (not a loss). Startup rejects are not tracked separately.")
+
+    finally:
+        session.close()
+
+
+@app.command()
+def timeline(
+    start: Annotated[str, typer.Option(help="Start date (YYYY-MM-DD)")],
+    end: Annotated[str, typer.Option(help="End date (YYYY-MM-DD), exclusive")],
+    machines: Annotated[str, typer.Option("--machines", help="Comma-separated machine IDs (default: all)")] = None,
+    width: Annotated[int, typer.Option(help="Characters per bar in text output")] = 60,
+    include_archive: IncludeArchiveOption = False,
+    timeout: TimeoutOption = None,
+    output_format: FormatOption = "text",
+):
+    """Show each machine's running, downtime and idle intervals over a date range."""
+
+    check_format(output_format)
+
+    machine_ids = parse_id_list(machines) if machines else None
+    start_date = parse_date(start)
+    end_date = parse_date(end)
+    if end_date <= start_date:
+        print("Error: --end must be after --start")
+        raise typer.Exit(code=1)
+    if width < 1:
+        print("Error: --width must be at least 1")
+        raise typer.Exit(code=1)
+
+    session = db.get_reporting_session(timeout)
+
+    try:
+        machine_names = dimensions.names(session, "machine")
+        if machine_ids is None:
+            machine_ids = sorted(machine_names)
+
+        spans = crud.iter_timeline_spans(session, start_date, end_date, machine_ids, include_archive)
+        timelines = timeline_engine.build_timelines(spans, machine_ids, start_date, end_date)
+
+        if output_format != "text":
+            write_rows((
+                {
+                    "machine_id": machine_id,
+                    "machine": machine_names.get(machine_id, f"ID:{machine_id}"),
+                    **interval,
+                    "minutes": (interval["end"] - interval["start"]).total_seconds() / 60,
+                }
+                for machine_id, intervals in timelines
+                for interval in intervals
+            ), output_format)
+            return
+
+        print("Machine Timeline")
+        print(f"Date Range: {start} to {end}")
+        print("  ".join(f"{symbol} {state}" for state, symbol in timeline_engine.BAR_SYMBOLS.items()))
+        print()
+        print(f"{'Machine':<15}{start:<{width - len(end)}}{end}  {'Run':<8}{'Planned':<9}{'Unplanned':<11}{'Idle':<8}")
+        print("─" * (width + 51))
+
+        for machine_id, intervals in timelines:
+            summary = timeline_engine.summarize(intervals)
+            total = sum(summary["minutes"].values())
+            shares = {state: minutes / total for state, minutes in summary["minutes"].items()}
+            bar = timeline_engine.render_bar(intervals, start_date, end_date, width)
+            name = machine_names.get(machine_id, f"ID:{machine_id}")
+            print(f"{name:<15}{bar}  {format_percent(shares['running']):<8}{format_percent(shares['planned']):<9}{format_percent(shares['unplanned']):<11}{format_percent(shares['idle']):<8}")
+
+            if summary["unplanned_reasons"]:
+                reasons = ", ".join(f"{code} {minutes:.0f}m" for code, minutes in summary["unplanned_reasons"].items())
+                print(f"{'':<15}Unplanned: {reasons}")
+
+    finally:
+        session.close()
+
+
+# ============================================================
+# MULTI-SITE REPORTS
+# ============================================================
+
+def query_all_sites(path: str, timeout: float | None, query) -> list[SiteResult]:
+    """Load the sites file and run query on every site. Exits if the file is unusable or no site answered."""
+    try:
+        site_list = load_sites(path, timeout)
+    except ValueError as e:
+        print(f"Error: {e}")
+        raise typer.Exit(code=1)
+
+    results = query_sites(site_list, query)
+
+    if all(result.rows is None for result in results):
+        print_site_status(results)
+        print("Error: No site answered")
+        raise typer.Exit(code=1)
+    return results
+
+
+def print_site_status(results: list[SiteResult], out=None):
+    """One line per site: how long it took, or why it is missing."""
+    for result in results:
+        seconds = f"{result.seconds:.1f}s" if result.seconds is not None else "-"
+        status = "OK" if result.rows is not None else f"MISSING: {result.error}"
+        print(f"  {result.site:<16}{seconds:>8}  {status}", file=out or sys.stdout)
+
+
+def print_sites_header(title: str, results: list[SiteResult], start: str | None, end: str | None, output_format: str):
+    """Title, date range and site status for text output. Other formats only get missing sites, on stderr."""
+    missing = [result for result in results if result.rows is None]
+
+    if output_format != "text":
+        if missing:
+            print("Warning: Partial result, missing sites:", file=sys.stderr)
+            print_site_status(missing, sys.stderr)
+        return
+
+    print(f"{title} ({len(results) - len(missing)} of {len(results)} sites)")
+    if start or end:
+        print(f"Date Range: {start or 'beginning'} to {end or 'now'}")
+    print("Sites:")
+    print_site_status(results)
+    print()
+
+
+def machines_across_sites(path: str, start: str | None, end: str | None, include_archive: bool,
+                          timeout: float | None, output_format: str):
+    """Rank the machines of all sites by OEE, with a total per site and for all sites."""
+    start_date = parse_date(start)
+    end_date = parse_date(end)
+
+    results = query_all_sites(path, timeout, lambda session: crud.get_oee_totals(
+        session, "machine_id", start_date, end_date, include_archive
+    ))
+    ranked = merge_oee_totals(results, by=("site", "name"))
+
+    print_sites_header("Machines Ranked by OEE", results, start, end, output_format)
+    if output_format != "text":
+        write_rows(ranked, output_format)
+        return
+
+    if not ranked:
+        print("No OEE data found for any machines.")
+        return
+
+    print(f"{'Rank':<6}{'Site':<16}{'Machine':<12}{'OEE':<10}{'Avail':<10}{'Perf':<10}{'Quality':<10}{'Runs':<8}")
+    print("─" * 82)
+
+    for i, m in enumerate(ranked, 1):
+        print(f"{i:<6}{m['site']:<16}{m['name']:<12}{format_percent(m['avg_oee']):<10}{format_percent(m['avg_availability']):<10}{format_percent(m['avg_performance']):<10}{format_percent(m['avg_quality']):<10}{m['runs_included']:<8}")
+
+    totals = merge_oee_totals(results, by=("site",))
+    totals += [{**total, "site": "All sites"} for total in merge_oee_totals(results, by=())]
+
+    print()
+    print(f"{'Site':<34}{'OEE':<10}{'Avail':<10}{'Perf':<10}{'Quality':<10}{'Runs':<8}")
+    print("─" * 82)
+
+    for t in totals:
+        print(f"{t['site']:<34}{format_percent(t['avg_oee']):<10}{format_percent(t['avg_availability']):<10}{format_percent(t['avg_performance']):<10}{format_percent(t['avg_quality']):<10}{t['runs_included']:<8}")
+
+
+def shifts_across_sites(path: str, start: str | None, end: str | None, include_archive: bool,
+                        timeout: float | None, output_format: str):
+    """Compare shifts by OEE, combining shifts of the same name across sites."""
+    start_date = parse_date(start)
+    end_date = parse_date(end)
+
+    results = query_all_sites(path, timeout, lambda session: crud.get_oee_totals(
+        session, "shift_id", start_date, end_date, include_archive
+    ))
+    compared = merge_oee_totals(results, by=("name",))
+
+    print_sites_header("Shifts Comparison by OEE", results, start, end, output_format)
+    if output_format != "text":
+        write_rows(compared, output_format)
+        return
+
+    if not compared:
+        print("No OEE data found for any shifts.")
+        return
+
+    print(f"{'Rank':<6}{'Shift':<15}{'OEE':<10}{'Avail':<10}{'Perf':<10}{'Quality':<10}{'Runs':<8}{'Sites':<6}")
+    print("─" * 75)
+
+    for i, s in enumerate(compared, 1):
+        print(f"{i:<6}{s['name']:<15}{format_percent(s['avg_oee']):<10}{format_percent(s['avg_availability']):<10}{format_percent(s['avg_performance']):<10}{format_percent(s['avg_quality']):<10}{s['runs_included']:<8}{s['sites']:<6}")
+
+
+def downtime_across_sites(path: str, limit: int, start: str | None, end: str | None, include_archive: bool,
+                          timeout: float | None, output_format: str):
+    """Top downtime reasons over all sites, taken after merging every site's reasons."""
+    start_date = parse_date(start)
+    end_date = parse_date(end)
+
+    results = query_all_sites(path, timeout, lambda session: crud.get_downtime_reason_totals(
+        session, start_date, end_date, include_archive
+    ))
+    reasons = merge_downtime_totals(results, limit)
+
+    print_sites_header(f"Top {len(reasons)} Downtime Reasons", results, start, end, output_format)
+    if output_format != "text":
+        write_rows(reasons, output_format)
+        return
+
+    if not reasons:
+        print("No downtime data found.")
+        return
+
+    print(f"{'Rank':<6}{'Code':<12}{'Description':<30}{'Minutes':<10}{'Events':<8}{'Sites':<6}")
+    print("─" * 72)
+
+    for i, reason in enumerate(reasons, 1):
+        print(f"{i:<6}{reason['reason_code']:<12}{reason['description']:<30}{format_minutes(reason['total_duration_minutes']):<10}{reason['events']:<8}{reason['sites']:<6}")
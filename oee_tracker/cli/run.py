@@ -1,10 +1,13 @@
 # cli/run.py
+import csv
 import typer
 from typing import Annotated
-from datetime import datetime
+from datetime import datetime, timedelta
 
 import oee_tracker.crud as crud
 import oee_tracker.db as db
+from oee_tracker.cli.output import FormatOption, check_format, write_rows
+from oee_tracker.cli.sync import write_or_journal
 
 app = typer.Typer(help="Manage production runs.")
 
@@ -49,27 +52,193 @@ def create(
         session.close()
 
 
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+
+def parse_id_list(value: str) -> list[int]:
+    """Parse comma separated ids (e.g. 1,2,5)."""
+    try:
+        return [int(part) for part in value.split(",") if part.strip()]
+    except ValueError:
+        print(f"Error: Invalid id list '{value}'. Use comma separated ids, e.g. 1,2,3")
+        raise typer.Exit(code=1)
+
+
+def load_schedule_csv(path: str, default_operator_id: int | None) -> list[dict]:
+    """
+    Load planned runs from a CSV file.
+    Columns: machine_id, shift_id, operator_id (optional), planned_start_time, planned_end_time
+    """
+    planned_runs = []
+    with open(path, newline="") as f:
+        for line_number, row in enumerate(csv.DictReader(f), 2):
+            try:
+                operator_id = row.get("operator_id") or default_operator_id
+                if operator_id is None:
+                    print(f"Error: Line {line_number}: no operator_id and no --operator given")
+                    raise typer.Exit(code=1)
+
+                planned_runs.append({
+                    "machine_id": int(row["machine_id"]),
+                    "shift_id": int(row["shift_id"]),
+                    "operator_id": int(operator_id),
+                    "planned_start_time": datetime.strptime(row["planned_start_time"], "%Y-%m-%d %H:%M:%S"),
+                    "planned_end_time": datetime.strptime(row["planned_end_time"], "%Y-%m-%d %H:%M:%S"),
+                })
+            except (KeyError, TypeError, ValueError):
+                print(f"Error: Line {line_number}: invalid row {row}")
+                raise typer.Exit(code=1)
+
+    return planned_runs
+
+
+def build_schedule_pattern(
+    shift_id: int,
+    shift_start: str,
+    shift_end: str,
+    start: str,
+    end: str,
+    days: str,
+    machine_ids: list[int],
+    operator_id: int,
+) -> list[dict]:
+    """Expand a shift pattern into one planned run per machine per matching day."""
+    try:
+        start_date = datetime.strptime(start, "%Y-%m-%d")
+        end_date = datetime.strptime(end, "%Y-%m-%d")
+        start_time = datetime.strptime(shift_start, "%H:%M").time()
+        end_time = datetime.strptime(shift_end, "%H:%M").time()
+    except ValueError:
+        print("Error: Invalid format. Use YYYY-MM-DD for dates and HH:MM for shift times")
+        raise typer.Exit(code=1)
+
+    weekdays = {day.strip().lower()[:3] for day in days.split(",")}
+    unknown = weekdays - set(WEEKDAYS)
+    if unknown:
+        print(f"Error: Unknown days {', '.join(sorted(unknown))}. Use {','.join(WEEKDAYS)}")
+        raise typer.Exit(code=1)
+
+    planned_runs = []
+    day = start_date
+    while day <= end_date:
+        if WEEKDAYS[day.weekday()] in weekdays:
+            planned_start_time = datetime.combine(day.date(), start_time)
+            planned_end_time = datetime.combine(day.date(), end_time)
+            # Shifts ending at or before their start time run past midnight
+            if planned_end_time <= planned_start_time:
+                planned_end_time += timedelta(days=1)
+
+            for machine_id in machine_ids:
+                planned_runs.append({
+                    "machine_id": machine_id,
+                    "shift_id": shift_id,
+                    "operator_id": operator_id,
+                    "planned_start_time": planned_start_time,
+                    "planned_end_time": planned_end_time,
+                })
+        day += timedelta(days=1)
+
+    return planned_runs
+
+
 @app.command()
-def list():
-    """List all production runs."""
+def schedule(
+    csv_file: Annotated[str, typer.Option("--csv", help="CSV of planned runs (machine_id, shift_id, operator_id, planned_start_time, planned_end_time)")] = None,
+    shift_id: Annotated[int, typer.Option("--shift", help="Shift ID for the pattern")] = None,
+    shift_start: Annotated[str, typer.Option(help="Shift start time (HH:MM)")] = None,
+    shift_end: Annotated[str, typer.Option(help="Shift end time (HH:MM)")] = None,
+    start: Annotated[str, typer.Option(help="First day (YYYY-MM-DD)")] = None,
+    end: Annotated[str, typer.Option(help="Last day (YYYY-MM-DD)")] = None,
+    days: Annotated[str, typer.Option(help="Days of the week (e.g. mon,tue,wed)")] = "mon,tue,wed,thu,fri",
+    machines: Annotated[str, typer.Option(help="Machine IDs (e.g. 1,2,3)")] = None,
+    operator_id: Annotated[int, typer.Option("--operator", help="Default operator ID")] = None,
+    skip_conflicts: Annotated[bool, typer.Option(help="Create non-conflicting runs and skip the rest")] = False,
+):
+    """Schedule many planned production runs in one transaction."""
+
+    if csv_file is not None:
+        try:
+            planned_runs = load_schedule_csv(csv_file, operator_id)
+        except OSError as e:
+            print(f"Error: Cannot read {csv_file}: {e}")
+            raise typer.Exit(code=1)
+    else:
+        if None in (shift_id, shift_start, shift_end, start, end, machines, operator_id):
+            print("Error: Give --csv, or --shift, --shift-start, --shift-end, --start, --end, --machines and --operator")
+            raise typer.Exit(code=1)
+
+        planned_runs = build_schedule_pattern(
+            shift_id,
+            shift_start,
+            shift_end,
+            start,
+            end,
+            days,
+            parse_id_list(machines),
+            operator_id,
+        )
+
+    if not planned_runs:
+        print("No production runs to schedule.")
+        return
 
     session = db.get_session()
 
     try:
-        runs = crud.get_all_production_runs(session)
+        result = crud.schedule_production_runs(session, planned_runs, skip_conflicts)
 
-        if not runs:
-            print("No production runs found.")
+        if result is None:
+            raise typer.Exit(code=1)
+
+        for conflict in result["conflicts"]:
+            run = planned_runs[conflict["index"]]
+            existing = f"run {conflict['existing_run_id']}" if conflict["existing_run_id"] else "another scheduled run"
+            print(f"Conflict: Machine {run['machine_id']} {run['planned_start_time']} - {run['planned_end_time']} overlaps {existing} ({conflict['planned_start_time']} - {conflict['planned_end_time']})")
+
+        if result["conflicts"] and not skip_conflicts:
+            print(f"Error: {len(result['conflicts'])} conflicting runs, nothing scheduled. Use --skip-conflicts to schedule the rest.")
+            raise typer.Exit(code=1)
+
+        print(f"Production runs scheduled: {len(result['created'])}")
+        if result["conflicts"]:
+            print(f"  Skipped (conflicts): {len(result['conflicts'])}")
+
+    finally:
+        session.close()
+
+
+def run_status(run) -> str:
+    """Pending, Running or Completed for a run object or row mapping."""
+    if run["actual_start_time"] and not run["actual_end_time"]:
+        return "Running"
+    elif run["actual_end_time"]:
+        return "Completed"
+    return "Pending"
+
+
+@app.command()
+def list(output_format: FormatOption = "text"):
+    """List all production runs."""
+
+    check_format(output_format)
+
+    session = db.get_reporting_session()
+
+    try:
+        # Streamed from the database, never collected into a list
+        runs = crud.iter_production_runs(session)
+
+        if output_format != "text":
+            write_rows(({**run, "status": run_status(run)} for run in runs), output_format)
             return
 
+        count = 0
         for run in runs:
-            status = "Pending"
-            if run.actual_start_time and not run.actual_end_time:
-                status = "Running"
-            elif run.actual_end_time:
-                status = "Completed"
+            print(f"{run['id']}: Machine {run['machine_id']} | Shift {run['shift_id']} | {run_status(run)}")
+            count += 1
 
-            print(f"{run.id}: Machine {run.machine_id} | Shift {run.shift_id} | {status}")
+        if count == 0:
+            print("No production runs found.")
 
     finally:
         session.close()
@@ -79,7 +248,7 @@ def list():
 def get(run_id: int):
     """Get production run by id."""
 
-    session = db.get_session()
+    session = db.get_reporting_session()
 
     try:
         run = crud.get_production_run(session, run_id)
@@ -109,12 +278,18 @@ def get(run_id: int):
 
 
 @app.command()
-def active():
+def active(output_format: FormatOption = "text"):
     """List active (running) production runs."""
 
-    session = db.get_session()
+    check_format(output_format)
+
+    session = db.get_reporting_session()
 
     try:
+        if output_format != "text":
+            write_rows(crud.iter_production_runs(session, active_only=True), output_format)
+            return
+
         runs = crud.get_active_production_runs(session)
 
         if not runs:
@@ -135,10 +310,14 @@ def start(run_id: int):
     session = db.get_session()
 
     try:
-        run = crud.start_run(session, run_id)
+        run, journaled = write_or_journal(
+            session, "run_start", lambda: crud.start_run(session, run_id), run_id=run_id
+        )
+        if journaled:
+            return
 
         if run is None:
-            print(f"Error: Production run {run_id} not found")
+            # crud printed why (not found or already started)
             raise typer.Exit(code=1)
 
         print(f"Production run {run_id} started")
@@ -157,10 +336,15 @@ def stop(
     session = db.get_session()
 
     try:
-        run = crud.stop_run(session, run_id, good_parts, rejected_parts)
+        run, journaled = write_or_journal(
+            session, "run_stop", lambda: crud.stop_run(session, run_id, good_parts, rejected_parts),
+            run_id=run_id, good_parts=good_parts, rejected_parts=rejected_parts,
+        )
+        if journaled:
+            return
 
         if run is None:
-            print(f"Error: Production run {run_id} not found")
+            # crud printed why (not found, not started or already stopped)
             raise typer.Exit(code=1)
 
         print(f"Production run {run_id} stopped")
@@ -4,6 +4,7 @@ from typing import Annotated
 
 import oee_tracker.crud as crud
 import oee_tracker.db as db
+from oee_tracker.cli.output import FormatOption, check_format, write_rows
 
 app = typer.Typer(help="Manage shifts.")
 
@@ -27,14 +28,20 @@ def create(name: str):
 
 
 @app.command()
-def list():
+def list(output_format: FormatOption = "text"):
     """List all shifts."""
 
-    session = db.get_session()
+    check_format(output_format)
+
+    session = db.get_reporting_session()
 
     try:
         shifts = crud.get_all_shifts(session)
 
+        if output_format != "text":
+            write_rows(({"id": shift.id, "name": shift.name} for shift in shifts), output_format)
+            return
+
         if not shifts:
             print("No shifts found.")
             return
@@ -50,7 +57,7 @@ def list():
 def get(shift_id: int):
     """Get shift by id."""
 
-    session = db.get_session()
+    session = db.get_reporting_session()
 
     try:
         shift = crud.get_shift(session, shift_id)
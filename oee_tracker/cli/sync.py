@@ -0,0 +1,105 @@
+# cli/sync.py
+import time
+import typer
+from datetime import datetime
+from typing import Annotated
+
+from sqlalchemy.exc import OperationalError
+
+import oee_tracker.crud as crud
+import oee_tracker.db as db
+import oee_tracker.journal as journal
+
+
+def save_to_journal(op: str, at: datetime | None = None, why: str = "Database unreachable", **fields) -> dict:
+    """Save a write to the offline journal and tell the user; `oee sync` replays it later."""
+    entry = journal.append(op, at, **fields)
+    print(f"{why}: saved to offline journal as {entry['id'][:8]} ({entry['at']})")
+    print("  Run 'oee sync' when the connection is back")
+    return entry
+
+
+def write_or_journal(session, op: str, write, **fields) -> tuple[object, dict | None]:
+    """
+    Run write() (a crud call) and return (its result, None). If the database is
+    unreachable, or the connection drops during the write, save the write to the
+    offline journal at the time it was asked for instead and return (None, entry).
+    """
+    requested_at = datetime.now()
+
+    if db.is_reachable(session):
+        try:
+            return write(), None
+        except OperationalError:
+            session.rollback()
+
+    return None, save_to_journal(op, requested_at, **fields)
+
+
+def sync_journal(batch_size: int) -> bool:
+    """Replay the journal once. Returns False if the database is unreachable."""
+    session = db.get_session()
+
+    try:
+        if not db.is_reachable(session):
+            print(f"Database unreachable: {len(journal.pending())} journal entries kept for the next sync")
+            return False
+
+        applied = skipped = rejected = 0
+
+        while entries := journal.claim():
+            remaining = []
+            failed = []
+
+            for start in range(0, len(entries), batch_size):
+                result = crud.apply_journal_entries(session, entries[start:start + batch_size])
+
+                if result is None:
+                    # Connection lost or batch not committed: keep the rest for next time
+                    remaining = entries[start:]
+                    break
+
+                for entry, description in result["applied"]:
+                    print(f"  {entry['id'][:8]} {description}")
+                for entry, error in result["failed"]:
+                    print(f"  {entry['id'][:8]} rejected: {error}")
+                    failed.append({**entry, "error": error})
+
+                applied += len(result["applied"])
+                skipped += len(result["skipped"])
+
+            journal.release(remaining, failed)
+            rejected += len(failed)
+
+            if remaining:
+                print(f"Sync interrupted, {len(remaining)} entries kept in the journal")
+                break
+
+        print(f"Synced: {applied} applied, {skipped} already applied, {rejected} rejected")
+        if rejected:
+            print(f"  Rejected entries saved to {journal.REJECTED_PATH}")
+        return True
+
+    finally:
+        session.close()
+
+
+def sync(
+    batch_size: Annotated[int, typer.Option("--batch-size", help="Journal entries per transaction")] = 100,
+    every: Annotated[float, typer.Option("--every", help="Keep running and sync every this many seconds")] = None,
+):
+    """Replay writes saved to the offline journal while the database was unreachable."""
+
+    if batch_size < 1:
+        print("Error: --batch-size must be at least 1")
+        raise typer.Exit(code=1)
+
+    while True:
+        synced = sync_journal(batch_size)
+
+        if every is None:
+            if not synced:
+                raise typer.Exit(code=1)
+            return
+
+        time.sleep(every)
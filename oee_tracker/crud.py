@@ -2,17 +2,51 @@
 CRUD operations and queries for OEE Tracker.
 """
 
-from datetime import datetime
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Iterator
 from sqlalchemy import (
     select,
+    insert,
+    update,
+    delete,
+    union_all,
+    literal,
+    literal_column,
+    values,
+    column,
+    and_,
+    or_,
+    tuple_,
+    true,
+    case,
+    cast,
     func,
+    Integer,
+    Float,
+    DateTime,
+    String,
+    null,
 )
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import (
     IntegrityError,
+    OperationalError,
     SQLAlchemyError,
 ) 
 
+from oee_tracker import dimensions
+from oee_tracker.sketch import HistogramSketch, stddev_from_sums, percentile_cont
+from oee_tracker.sqlcompat import (
+    is_postgresql,
+    seconds_between,
+    add_seconds,
+    date_trunc,
+    greatest,
+    least,
+    prefer_postgresql,
+    clock_now,
+)
 from oee_tracker.models import (
     Machine,
     Shift,
@@ -20,9 +54,74 @@ from oee_tracker.models import (
     ReasonCode,
     ProductionRun,
     DowntimeEvent,
+    ProductionRunArchive,
+    DowntimeEventArchive,
+    JournalApplied,
+    ExportWatermark,
+    DeletedRow,
 )
 
 
+class StateConflict(Exception):
+    """A start/stop that does not fit the current state of the run or downtime event."""
+
+
+def _add_interval(timestamp, interval: timedelta):
+    """SQL expression for a timestamp column plus a fixed interval."""
+    return add_seconds(timestamp, interval.total_seconds())
+
+
+# Generated tsrange columns with GiST indexes (PostgreSQL only, migration 7a3d9e1f5b20)
+RUN_WINDOW = literal_column("production_runs.actual_window")
+EVENT_WINDOW = literal_column("downtime_events.event_window")
+
+
+def _overlaps_window(start, end, window_start: datetime | None, window_end: datetime | None, range_column=None):
+    """
+    Condition for [start, end) overlapping [window_start, window_end). A NULL end is
+    still open; a None window bound is unbounded. On PostgreSQL, range_column (the
+    generated tsrange over the same columns) is tested with && so its GiST index applies.
+    """
+    conditions = [start != None]
+    if window_end is not None:
+        conditions.append(start < window_end)
+    if window_start is not None:
+        conditions.append(or_(end == None, end > window_start))
+    portable = and_(*conditions)
+
+    if range_column is None:
+        return portable
+
+    window = func.tsrange(literal(window_start, DateTime), literal(window_end, DateTime), literal_column("'[)'"))
+    return prefer_postgresql(range_column.op("&&")(window), portable)
+
+
+def _clipped_seconds(start, end, window_start: datetime | None, window_end: datetime | None):
+    """
+    SQL expression for the seconds of [start, end) inside the window: 0 if outside,
+    NULL while end is NULL (PostgreSQL's greatest/least would skip the NULL).
+    """
+    clipped_start, clipped_end = start, end
+    if window_start is not None:
+        clipped_start = greatest(start, literal(window_start, DateTime))
+    if window_end is not None:
+        clipped_end = least(end, literal(window_end, DateTime))
+    return case((end == None, None), else_=greatest(seconds_between(clipped_start, clipped_end), 0.0))
+
+
+def _missing_dimension(session: Session, **keys) -> str | None:
+    """
+    Check ids against the dimension cache, e.g. machine=1, reason_code="BRK".
+    Returns an error message for the first one that does not exist, else None.
+    If the cache cannot be loaded the check is skipped: the write itself then fails
+    with the OperationalError callers journal on, or on a foreign key.
+    """
+    for kind, key in keys.items():
+        if dimensions.exists(session, kind, key) is False:
+            return f"{kind.replace('_', ' ').capitalize()} {key} not found"
+    return None
+
+
 # ============================================================
 # MACHINES
 # ============================================================
@@ -38,6 +137,7 @@ def create_machine(
     try:
         session.add(machine)
         session.commit()
+        dimensions.invalidate()
         return machine
     except IntegrityError:
         session.rollback()
@@ -86,6 +186,7 @@ def update_machine(
             if location is not None:
                 machine.location = location
             session.commit()
+            dimensions.invalidate()
 
         return machine
     except SQLAlchemyError as e:
@@ -100,6 +201,7 @@ def delete_machine(session: Session, machine_id: int, is_admin: bool = False) ->
         if machine:
             session.delete(machine)
             session.commit()
+            dimensions.invalidate()
             return True
         else:
             return False
@@ -119,6 +221,7 @@ def create_shift(session: Session, name: str) -> Shift | None:
     try:
         session.add(shift)
         session.commit()
+        dimensions.invalidate()
         return shift
     except IntegrityError:
         session.rollback()
@@ -157,6 +260,7 @@ def update_shift(session: Session, shift_id: int, name: str) -> Shift | None:
         if shift is not None:
             shift.name = name
             session.commit()
+            dimensions.invalidate()
         return shift
     except SQLAlchemyError as e:
         session.rollback()
@@ -171,6 +275,7 @@ def delete_shift(session: Session, shift_id: int, is_admin: bool = False) -> boo
         if shift is not None:
             session.delete(shift)
             session.commit()
+            dimensions.invalidate()
             return True
         else:
             return False
@@ -190,6 +295,7 @@ def create_operator(session: Session, name: str) -> Operator | None:
     try:
         session.add(operator)
         session.commit()
+        dimensions.invalidate()
         return operator
     except IntegrityError:
         session.rollback()
@@ -228,6 +334,7 @@ def update_operator(session: Session, operator_id: int, name: str) -> Operator |
         if operator is not None:
             operator.name = name
             session.commit()
+            dimensions.invalidate()
         return operator
     except SQLAlchemyError as e:
         session.rollback()
@@ -242,6 +349,7 @@ def delete_operator(session: Session, operator_id: int, is_admin: bool = False)
         if operator is not None:
             session.delete(operator)
             session.commit()
+            dimensions.invalidate()
             return True
         else:
             return False
@@ -266,6 +374,7 @@ def create_reason_code(
     try:
         session.add(reason_code)
         session.commit()
+        dimensions.invalidate()
         return reason_code
     except IntegrityError:
         session.rollback()
@@ -336,6 +445,7 @@ def update_reason_code(
             if is_planned is not None:
                 reason_code.is_planned = is_planned
             session.commit()
+            dimensions.invalidate()
         return reason_code
     except SQLAlchemyError as e:
         session.rollback()
@@ -350,6 +460,7 @@ def delete_reason_code(session: Session, code: str, is_admin: bool = False) -> b
         if reason_code is not None:
             session.delete(reason_code)
             session.commit()
+            dimensions.invalidate()
             return True
         else:
             return False
@@ -363,6 +474,11 @@ def delete_reason_code(session: Session, code: str, is_admin: bool = False) -> b
 # PRODUCTION RUNS
 # ============================================================
 
+def _is_run_overlap(e: IntegrityError) -> bool:
+    """True if e was raised by the production_runs_no_overlap constraint (PostgreSQL)."""
+    return "production_runs_no_overlap" in str(e.orig)
+
+
 def create_production_run(
     session: Session,
     machine_id: int,
@@ -372,6 +488,11 @@ def create_production_run(
     planned_end_time: datetime,
 ) -> ProductionRun | None:
     """Create a new production run (scheduled, not yet started)."""
+    missing = _missing_dimension(session, machine=machine_id, shift=shift_id, operator=operator_id)
+    if missing:
+        print(f"Error: {missing}")
+        return None
+
     production_run = ProductionRun(
         machine_id=machine_id,
         shift_id=shift_id,
@@ -383,9 +504,12 @@ def create_production_run(
         session.add(production_run)
         session.commit()
         return production_run
-    except IntegrityError:
+    except IntegrityError as e:
         session.rollback()
-        print("Error: Production Run already exists")
+        if _is_run_overlap(e):
+            print("Error: Production run overlaps another run planned on this machine")
+        else:
+            print("Error: Production Run already exists")
         return None
     except SQLAlchemyError as e:
         session.rollback()
@@ -412,24 +536,50 @@ def get_all_production_runs(session: Session) -> list[ProductionRun]:
         return []
 
 
+def iter_production_runs(
+    session: Session,
+    active_only: bool = False,
+    batch_size: int = 1000,
+) -> Iterator[dict]:
+    """
+    Stream production runs as row mappings, fetching batch_size rows at a time
+    (a server-side cursor on PostgreSQL), so large tables are never held in memory.
+    active_only limits to started but not ended runs.
+    """
+    try:
+        statement = (
+            select(ProductionRun.__table__)
+            .order_by(ProductionRun.id)
+            .execution_options(yield_per=batch_size)
+        )
+        if active_only:
+            statement = statement.where(
+                ProductionRun.actual_start_time != None,
+                ProductionRun.actual_end_time == None
+            )
+
+        yield from session.execute(statement).mappings()
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+
+
 def get_production_runs_by_machine(
     session: Session,
     machine_id: int,
     start_date: datetime | None = None,
     end_date: datetime | None = None,
 ) -> list[ProductionRun]:
-    """Get production runs for a machine, optionally filtered by date range."""
+    """
+    Get production runs for a machine, optionally limited to runs that were
+    running at any time in the date range (including runs that straddle it).
+    """
     try:
         statement = select(ProductionRun).where(ProductionRun.machine_id == machine_id)
 
-        if start_date is not None:
-            statement = statement.where(
-                ProductionRun.actual_start_time >= start_date
-            )
-        if end_date is not None:
-            statement = statement.where(
-                ProductionRun.actual_end_time <= end_date
-            )
+        if start_date is not None or end_date is not None:
+            statement = statement.where(_overlaps_window(
+                ProductionRun.actual_start_time, ProductionRun.actual_end_time, start_date, end_date, RUN_WINDOW
+            ))
             
         production_runs = session.scalars(statement)
         return list(production_runs)
@@ -445,18 +595,42 @@ def get_production_runs_by_shift(
     start_date: datetime | None = None,
     end_date: datetime | None = None,
 ) -> list[ProductionRun]:
-    """Get production runs for a shift, optionally filtered by date range."""
+    """
+    Get production runs for a shift, optionally limited to runs that were
+    running at any time in the date range (including runs that straddle it).
+    """
     try:
         statement = select(ProductionRun).where(ProductionRun.shift_id == shift_id)
 
-        if start_date is not None:
-            statement = statement.where(
-                ProductionRun.actual_start_time >= start_date
-            )
-        if end_date is not None:
-            statement = statement.where(
-                ProductionRun.actual_end_time <= end_date
-            )
+        if start_date is not None or end_date is not None:
+            statement = statement.where(_overlaps_window(
+                ProductionRun.actual_start_time, ProductionRun.actual_end_time, start_date, end_date, RUN_WINDOW
+            ))
+
+        production_runs = session.scalars(statement)
+        return list(production_runs)
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+        return []
+
+
+def get_production_runs_by_operator(
+    session: Session,
+    operator_id: int,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+) -> list[ProductionRun]:
+    """
+    Get production runs for an operator, optionally limited to runs that were
+    running at any time in the date range (including runs that straddle it).
+    """
+    try:
+        statement = select(ProductionRun).where(ProductionRun.operator_id == operator_id)
+
+        if start_date is not None or end_date is not None:
+            statement = statement.where(_overlaps_window(
+                ProductionRun.actual_start_time, ProductionRun.actual_end_time, start_date, end_date, RUN_WINDOW
+            ))
 
         production_runs = session.scalars(statement)
         return list(production_runs)
@@ -479,35 +653,122 @@ def get_active_production_runs(session: Session) -> list[ProductionRun]:
         return []
 
 
-def start_run(session: Session, run_id: int) -> ProductionRun | None:
-    """Start a production run. Sets actual_start_time to now. Returns None if not found."""
+def _run_state_error(session: Session, run_id: int) -> Exception:
+    """Why a guarded run update matched no row: LookupError or StateConflict."""
+    row = session.execute(
+        select(ProductionRun.actual_start_time, ProductionRun.actual_end_time)
+        .where(ProductionRun.id == run_id)
+    ).first()
+
+    if row is None:
+        return LookupError(f"Production run {run_id} not found")
+    if row.actual_end_time is not None:
+        return StateConflict(f"Production run {run_id} already stopped at {row.actual_end_time}")
+    if row.actual_start_time is not None:
+        return StateConflict(f"Production run {run_id} already started at {row.actual_start_time}")
+    return StateConflict(f"Production run {run_id} has not been started")
+
+
+def _start_run(session: Session, run_id: int, started_at: datetime | None) -> ProductionRun:
+    """
+    Set actual_start_time without committing, in one UPDATE guarded on the run not being
+    started yet, so concurrent starts cannot both succeed.
+    Raises LookupError if not found, StateConflict if already started.
+    """
+    production_run = session.scalars(
+        update(ProductionRun)
+        .where(ProductionRun.id == run_id, ProductionRun.actual_start_time == None)
+        .values(actual_start_time=started_at if started_at is not None else clock_now())
+        .returning(ProductionRun)
+    ).first()
+
+    if production_run is None:
+        raise _run_state_error(session, run_id)
+    return production_run
+
+
+def start_run(
+    session: Session,
+    run_id: int,
+    started_at: datetime | None = None,
+) -> ProductionRun | None:
+    """
+    Start a production run. Sets actual_start_time to started_at (default now).
+    Returns None if not found or already started. Raises OperationalError if the
+    connection fails, so the caller can journal the write.
+    """
     try:
-        production_run = session.get(ProductionRun, run_id)
-        if production_run:
-            production_run.actual_start_time = func.now()
-            session.commit()
+        production_run = _start_run(session, run_id, started_at)
+        session.commit()
         return production_run
+    except (LookupError, StateConflict) as e:
+        session.rollback()
+        print(f"Error: {e}")
+        return None
+    except OperationalError:
+        session.rollback()
+        raise
     except SQLAlchemyError as e:
         session.rollback()
         print(f"Database error: {e}")
         return None
 
 
+def _stop_run(
+    session: Session,
+    run_id: int,
+    good_parts_count: int,
+    rejected_parts_count: int,
+    stopped_at: datetime | None,
+) -> ProductionRun:
+    """
+    Set actual_end_time and part counts without committing, in one UPDATE guarded on
+    the run being started and not stopped, so a second stop cannot overwrite the first.
+    Raises LookupError if not found, StateConflict if not running.
+    """
+    production_run = session.scalars(
+        update(ProductionRun)
+        .where(
+            ProductionRun.id == run_id,
+            ProductionRun.actual_start_time != None,
+            ProductionRun.actual_end_time == None,
+        )
+        .values(
+            actual_end_time=stopped_at if stopped_at is not None else clock_now(),
+            good_parts_count=good_parts_count,
+            rejected_parts_count=rejected_parts_count,
+        )
+        .returning(ProductionRun)
+    ).first()
+
+    if production_run is None:
+        raise _run_state_error(session, run_id)
+    return production_run
+
+
 def stop_run(
     session: Session,
     run_id: int,
     good_parts_count: int,
     rejected_parts_count: int,
+    stopped_at: datetime | None = None,
 ) -> ProductionRun | None:
-    """Stop a production run. Sets actual_end_time to now and part counts. Returns None if not found."""
+    """
+    Stop a production run. Sets actual_end_time to stopped_at (default now) and part counts.
+    Returns None if not found, not started or already stopped. Raises OperationalError
+    if the connection fails, so the caller can journal the write.
+    """
     try:
-        production_run = session.get(ProductionRun, run_id)
-        if production_run:
-            production_run.actual_end_time = func.now()
-            production_run.good_parts_count = good_parts_count
-            production_run.rejected_parts_count = rejected_parts_count
-            session.commit()
+        production_run = _stop_run(session, run_id, good_parts_count, rejected_parts_count, stopped_at)
+        session.commit()
         return production_run
+    except (LookupError, StateConflict) as e:
+        session.rollback()
+        print(f"Error: {e}")
+        return None
+    except OperationalError:
+        session.rollback()
+        raise
     except SQLAlchemyError as e:
         session.rollback()
         print(f"Database error: {e}")
@@ -552,18 +813,162 @@ def delete_production_run(session: Session, run_id: int, is_admin: bool = False)
         return False
 
 
+def _find_schedule_conflicts(session: Session, planned_runs: list[dict]) -> list[dict]:
+    """
+    Existing production runs overlapping planned runs on the same machine, found by
+    joining the requested run windows against production_runs in a single query.
+    Returns dicts with index (position in planned_runs), machine_id, existing_run_id,
+    planned_start_time and planned_end_time. Database errors are raised.
+    """
+    if not planned_runs:
+        return []
+
+    requested = values(
+        column("idx", Integer),
+        column("machine_id", Integer),
+        column("planned_start_time", DateTime),
+        column("planned_end_time", DateTime),
+        name="requested",
+    ).data([
+        (i, run["machine_id"], run["planned_start_time"], run["planned_end_time"])
+        for i, run in enumerate(planned_runs)
+    ]).cte("requested")
+
+    statement = (
+        select(
+            requested.c.idx,
+            requested.c.machine_id,
+            ProductionRun.id.label("existing_run_id"),
+            ProductionRun.planned_start_time,
+            ProductionRun.planned_end_time,
+        )
+        .join(
+            ProductionRun,
+            and_(
+                ProductionRun.machine_id == requested.c.machine_id,
+                ProductionRun.planned_start_time < requested.c.planned_end_time,
+                ProductionRun.planned_end_time > requested.c.planned_start_time,
+            ),
+        )
+        .order_by(requested.c.idx)
+    )
+
+    conflicts = []
+    for row in session.execute(statement):
+        conflicts.append({
+            "index": row.idx,
+            "machine_id": row.machine_id,
+            "existing_run_id": row.existing_run_id,
+            "planned_start_time": row.planned_start_time,
+            "planned_end_time": row.planned_end_time,
+        })
+
+    return conflicts
+
+
+def schedule_production_runs(
+    session: Session,
+    planned_runs: list[dict],
+    skip_conflicts: bool = False,
+) -> dict | None:
+    """
+    Create many planned production runs in one transaction.
+    planned_runs is a list of dicts with machine_id, shift_id, operator_id,
+    planned_start_time, planned_end_time.
+    Runs overlapping an existing run (or each other) on the same machine are conflicts:
+    nothing is inserted unless skip_conflicts is set, in which case only the
+    conflicting runs are left out.
+    Returns dict with created (list of run ids) and conflicts, or None on error.
+    """
+    for i, run in enumerate(planned_runs):
+        missing = _missing_dimension(
+            session, machine=run["machine_id"], shift=run["shift_id"], operator=run["operator_id"]
+        )
+        if missing:
+            print(f"Error: Planned run {i + 1}: {missing}")
+            return None
+
+    conflicts = []
+
+    # Overlaps within the requested batch itself
+    by_machine = {}
+    for i, run in enumerate(planned_runs):
+        by_machine.setdefault(run["machine_id"], []).append(i)
+
+    for machine_id, indexes in by_machine.items():
+        indexes.sort(key=lambda i: planned_runs[i]["planned_start_time"])
+        latest = indexes[0]
+        for current in indexes[1:]:
+            if planned_runs[current]["planned_start_time"] < planned_runs[latest]["planned_end_time"]:
+                conflicts.append({
+                    "index": current,
+                    "machine_id": machine_id,
+                    "existing_run_id": None,
+                    "planned_start_time": planned_runs[latest]["planned_start_time"],
+                    "planned_end_time": planned_runs[latest]["planned_end_time"],
+                })
+            else:
+                latest = current
+
+    try:
+        conflicts.extend(_find_schedule_conflicts(session, planned_runs))
+        conflicts.sort(key=lambda c: c["index"])
+
+        if conflicts and not skip_conflicts:
+            session.rollback()
+            return {"created": [], "conflicts": conflicts}
+
+        conflicting = {c["index"] for c in conflicts}
+        rows = [
+            {
+                "machine_id": run["machine_id"],
+                "shift_id": run["shift_id"],
+                "operator_id": run["operator_id"],
+                "planned_start_time": run["planned_start_time"],
+                "planned_end_time": run["planned_end_time"],
+            }
+            for i, run in enumerate(planned_runs)
+            if i not in conflicting
+        ]
+
+        created = []
+        if rows:
+            # Executemany with RETURNING is sent as batched multi-row INSERTs
+            result = session.execute(
+                insert(ProductionRun).returning(ProductionRun.id, sort_by_parameter_order=True),
+                rows,
+            )
+            created = list(result.scalars())
+
+        session.commit()
+        return {"created": created, "conflicts": conflicts}
+
+    except IntegrityError as e:
+        session.rollback()
+        # A run added concurrently can still hit production_runs_no_overlap
+        if _is_run_overlap(e):
+            print("Error: Schedule overlaps another run planned on the same machine")
+        else:
+            print("Error: Invalid machine, shift or operator in schedule")
+        return None
+    except SQLAlchemyError as e:
+        session.rollback()
+        print(f"Database error: {e}")
+        return None
+
+
 # ============================================================
 # DOWNTIME EVENTS
 # ============================================================
 
-def create_downtime_event(
+def _create_downtime_event(
     session: Session,
     production_run_id: int,
     reason_code: str,
-    start_time: datetime | None = None,
-    end_time: datetime | None = None,
-) -> DowntimeEvent | None:
-    """Create a downtime event with explicit times."""
+    start_time: datetime | None,
+    end_time: datetime | None,
+) -> DowntimeEvent:
+    """Add a downtime event without committing. start_time defaults to now."""
     downtime_event = DowntimeEvent(
         production_run_id=production_run_id,
         reason_code=reason_code,
@@ -572,15 +977,38 @@ def create_downtime_event(
     if start_time is not None:
         downtime_event.start_time=start_time
     else:
-        downtime_event.start_time=func.now()
+        downtime_event.start_time=clock_now()
 
     if end_time is not None:
         downtime_event.end_time=end_time
 
+    session.add(downtime_event)
+    return downtime_event
+
+
+def create_downtime_event(
+    session: Session,
+    production_run_id: int,
+    reason_code: str,
+    start_time: datetime | None = None,
+    end_time: datetime | None = None,
+) -> DowntimeEvent | None:
+    """
+    Create a downtime event with explicit times. Raises OperationalError if the
+    connection fails, so the caller can journal the write.
+    """
+    missing = _missing_dimension(session, reason_code=reason_code)
+    if missing:
+        print(f"Error: {missing}")
+        return None
+
     try:
-        session.add(downtime_event)
+        downtime_event = _create_downtime_event(session, production_run_id, reason_code, start_time, end_time)
         session.commit()
         return downtime_event
+    except OperationalError:
+        session.rollback()
+        raise
     except SQLAlchemyError as e:
         session.rollback()
         print(f"Database error: {e}")
@@ -621,14 +1049,76 @@ def get_active_downtime_events(session: Session) -> list[DowntimeEvent]:
         print(f"Database error: {e}")
         return []      
 
-def stop_downtime(session: Session, event_id: int) -> DowntimeEvent | None:
-    """Stop a downtime event. Sets end_time to now. Returns None if not found."""
+def iter_downtime_events(
+    session: Session,
+    run_id: int | None = None,
+    active_only: bool = False,
+    batch_size: int = 1000,
+) -> Iterator[dict]:
+    """
+    Stream downtime events as row mappings, fetching batch_size rows at a time.
+    Optionally limited to one production run and/or to active (not ended) events.
+    """
     try:
-        downtime_event = session.get(DowntimeEvent, event_id)
-        if downtime_event:
-            downtime_event.end_time = func.now()
-            session.commit()
+        statement = (
+            select(DowntimeEvent.__table__)
+            .order_by(DowntimeEvent.id)
+            .execution_options(yield_per=batch_size)
+        )
+        if run_id is not None:
+            statement = statement.where(DowntimeEvent.production_run_id == run_id)
+        if active_only:
+            statement = statement.where(
+                DowntimeEvent.start_time != None,
+                DowntimeEvent.end_time == None
+            )
+
+        yield from session.execute(statement).mappings()
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+
+
+def _stop_downtime(session: Session, event_id: int, ended_at: datetime | None) -> DowntimeEvent:
+    """
+    Set end_time without committing, in one UPDATE guarded on the event being open.
+    Raises LookupError if not found, StateConflict if already stopped.
+    """
+    downtime_event = session.scalars(
+        update(DowntimeEvent)
+        .where(DowntimeEvent.id == event_id, DowntimeEvent.end_time == None)
+        .values(end_time=ended_at if ended_at is not None else clock_now())
+        .returning(DowntimeEvent)
+    ).first()
+
+    if downtime_event is None:
+        end_time = session.scalar(select(DowntimeEvent.end_time).where(DowntimeEvent.id == event_id))
+        if end_time is None:
+            raise LookupError(f"Downtime event {event_id} not found")
+        raise StateConflict(f"Downtime event {event_id} already stopped at {end_time}")
+    return downtime_event
+
+
+def stop_downtime(
+    session: Session,
+    event_id: int,
+    ended_at: datetime | None = None,
+) -> DowntimeEvent | None:
+    """
+    Stop a downtime event. Sets end_time to ended_at (default now). Returns None if not
+    found or already stopped. Raises OperationalError if the connection fails, so the
+    caller can journal the write.
+    """
+    try:
+        downtime_event = _stop_downtime(session, event_id, ended_at)
+        session.commit()
         return downtime_event
+    except (LookupError, StateConflict) as e:
+        session.rollback()
+        print(f"Error: {e}")
+        return None
+    except OperationalError:
+        session.rollback()
+        raise
     except SQLAlchemyError as e:
         session.rollback()
         print(f"Database error: {e}")
@@ -655,6 +1145,188 @@ def delete_downtime_event(session: Session, event_id: int, is_admin: bool = Fals
 # OEE CALCULATIONS
 # ============================================================
 
+SMALL_STOP_MINUTES = 5
+SETUP_REASON_CODES = ("SETUP",)
+
+
+def _archived_union(model, archive_model, name: str):
+    """UNION ALL of a hot table and its archive table, with the hot table's columns."""
+    names = [column.name for column in model.__table__.columns]
+    return union_all(
+        select(*[model.__table__.c[name] for name in names]),
+        select(*[archive_model.__table__.c[name] for name in names]),
+    ).subquery(name)
+
+
+def _production_runs(include_archive: bool = False):
+    """Production runs table for reports, unioned with the archive if include_archive."""
+    if include_archive:
+        return _archived_union(ProductionRun, ProductionRunArchive, "production_runs")
+    return ProductionRun.__table__
+
+
+def _downtime_events(include_archive: bool = False):
+    """Downtime events table for reports, unioned with the archive if include_archive."""
+    if include_archive:
+        return _archived_union(DowntimeEvent, DowntimeEventArchive, "downtime_events")
+    return DowntimeEvent.__table__
+
+
+def _run_metrics_subquery(
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    small_stop_minutes: float = SMALL_STOP_MINUTES,
+    setup_reason_codes: tuple[str, ...] = SETUP_REASON_CODES,
+    include_archive: bool = False,
+    ended_since: datetime | None = None,
+):
+    """
+    Per-run OEE inputs and results as one set-based subquery.
+    Downtime is summed per run with FILTER aggregates split by ReasonCode.is_planned,
+    so any number of runs costs a single statement.
+    Downtime is also split into loss categories: setup (setup_reason_codes),
+    other planned stops, small stops (unplanned, shorter than small_stop_minutes)
+    and breakdowns (the remaining unplanned downtime).
+    Runs that cannot be scored (incomplete, missing part counts, zero planned time
+    or ideal cycle time) have NULL availability/performance/quality/oee.
+    With a date range, every run overlapping it is included, clipped to the range:
+    downtime only counts inside it, and planned time and part counts are prorated
+    by the share of the run's actual time that falls inside it.
+    include_archive also reads archived runs and downtime.
+    ended_since only includes runs that ended at or after it, and only sums their
+    downtime, so the grouped downtime never covers the whole history.
+    """
+    runs = _production_runs(include_archive)
+    events = _downtime_events(include_archive)
+    window = start_date is not None or end_date is not None
+
+    full_duration = seconds_between(events.c.start_time, events.c.end_time)
+    duration = _clipped_seconds(events.c.start_time, events.c.end_time, start_date, end_date) if window else full_duration
+    is_setup = events.c.reason_code.in_(setup_reason_codes)
+    is_unplanned = and_(ReasonCode.is_planned.is_not(True), ~is_setup)
+    # Classified by the whole stop, not the part inside the range
+    is_small_stop = full_duration < small_stop_minutes * 60
+
+    event_conditions = [events.c.start_time != None, events.c.end_time != None]
+    if window:
+        event_conditions.append(_overlaps_window(
+            events.c.start_time, events.c.end_time, start_date, end_date,
+            None if include_archive else EVENT_WINDOW,
+        ))
+    if ended_since is not None:
+        event_conditions.append(events.c.production_run_id.in_(
+            select(runs.c.id).where(runs.c.actual_end_time >= ended_since)
+        ))
+
+    downtime = (
+        select(
+            events.c.production_run_id.label("run_id"),
+            func.sum(duration).filter(ReasonCode.is_planned == True).label("planned_downtime"),
+            func.sum(duration).filter(ReasonCode.is_planned.is_not(True)).label("unplanned_downtime"),
+            func.sum(duration).filter(is_setup).label("setup_downtime"),
+            func.sum(duration).filter(ReasonCode.is_planned == True, ~is_setup).label("planned_stop_downtime"),
+            func.sum(duration).filter(is_unplanned, is_small_stop).label("small_stop_downtime"),
+            func.sum(duration).filter(is_unplanned, ~is_small_stop).label("breakdown_downtime"),
+        )
+        .select_from(events)
+        .join(ReasonCode, ReasonCode.code == events.c.reason_code)
+        .where(*event_conditions)
+        .group_by(events.c.production_run_id)
+        .subquery("downtime")
+    )
+
+    planned_time = seconds_between(runs.c.planned_start_time, runs.c.planned_end_time)
+    actual_run_time = seconds_between(runs.c.actual_start_time, runs.c.actual_end_time)
+    good_parts = runs.c.good_parts_count
+    rejected_parts = runs.c.rejected_parts_count
+
+    if window:
+        clipped_run_time = _clipped_seconds(runs.c.actual_start_time, runs.c.actual_end_time, start_date, end_date)
+        # Share of the run inside the range (NULL for open or zero-length runs)
+        fraction = clipped_run_time / func.nullif(actual_run_time, 0, type_=Float)
+        planned_time = planned_time * fraction
+        good_parts = good_parts * fraction
+        rejected_parts = rejected_parts * fraction
+        actual_run_time = clipped_run_time
+
+    planned_downtime = func.coalesce(downtime.c.planned_downtime, 0)
+    unplanned_downtime = func.coalesce(downtime.c.unplanned_downtime, 0)
+
+    # Run Time excludes all downtime; Planned Production Time excludes planned downtime only
+    run_time = actual_run_time - planned_downtime - unplanned_downtime
+    planned_production_time = planned_time - planned_downtime
+    total_parts = good_parts + rejected_parts
+
+    availability = run_time / func.nullif(planned_production_time, 0, type_=Float)
+    performance = case(
+        (Machine.ideal_cycle_time > 0, Machine.ideal_cycle_time * total_parts / func.nullif(run_time, 0, type_=Float)),
+    )
+    quality = cast(good_parts, Float) / func.nullif(total_parts, 0, type_=Float)
+
+    statement = (
+        select(
+            runs.c.id.label("run_id"),
+            runs.c.machine_id,
+            runs.c.shift_id,
+            runs.c.operator_id,
+            runs.c.actual_start_time,
+            runs.c.actual_end_time,
+            planned_time.label("planned_time"),
+            planned_downtime.label("planned_downtime"),
+            unplanned_downtime.label("unplanned_downtime"),
+            func.coalesce(downtime.c.setup_downtime, 0).label("setup_downtime"),
+            func.coalesce(downtime.c.planned_stop_downtime, 0).label("planned_stop_downtime"),
+            func.coalesce(downtime.c.small_stop_downtime, 0).label("small_stop_downtime"),
+            func.coalesce(downtime.c.breakdown_downtime, 0).label("breakdown_downtime"),
+            run_time.label("run_time"),
+            good_parts.label("good_parts_count"),
+            rejected_parts.label("rejected_parts_count"),
+            total_parts.label("total_parts"),
+            Machine.ideal_cycle_time,
+            availability.label("availability"),
+            performance.label("performance"),
+            quality.label("quality"),
+            (availability * performance * quality).label("oee"),
+        )
+        .select_from(runs)
+        .join(Machine, runs.c.machine_id == Machine.id)
+        .outerjoin(downtime, downtime.c.run_id == runs.c.id)
+    )
+
+    if window:
+        statement = statement.where(_overlaps_window(
+            runs.c.actual_start_time, runs.c.actual_end_time, start_date, end_date,
+            None if include_archive else RUN_WINDOW,
+        ))
+    if ended_since is not None:
+        statement = statement.where(runs.c.actual_end_time >= ended_since)
+
+    return statement.subquery("run_metrics")
+
+
+def _oee_aggregates(metrics) -> list:
+    """Aggregate columns over run metrics. Only runs with an OEE count towards the averages."""
+    included = metrics.c.oee != None
+    return [
+        func.count().label("runs_total"),
+        func.count(metrics.c.oee).label("runs_included"),
+        func.avg(metrics.c.availability).filter(included).label("avg_availability"),
+        func.avg(metrics.c.performance).filter(included).label("avg_performance"),
+        func.avg(metrics.c.quality).filter(included).label("avg_quality"),
+        func.avg(metrics.c.oee).label("avg_oee"),
+    ]
+
+
+def _get_run_metrics(session: Session, run_id: int):
+    """Get the metrics row for one production run, or None if not found."""
+    metrics = _run_metrics_subquery()
+    try:
+        return session.execute(select(metrics).where(metrics.c.run_id == run_id)).first()
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+        return None
+
+
 def calculate_availability(
     session: Session,
     run_id: int,
@@ -662,36 +1334,16 @@ def calculate_availability(
     """
     Calculate availability for a production run.
     Availability = Run Time / Planned Production Time
+    Planned Production Time is the planned window less planned downtime
+    (reason codes with is_planned), so breaks and setups do not count against it.
     Returns None if run not found or incomplete.
     """
-    production_run = get_production_run(session, run_id)
-    
-    if production_run is None:
-        return None
-    
-    # Need actual times to calculate run time
-    if production_run.actual_start_time is None or production_run.actual_end_time is None:
-        return None
-    
-    # Calculate times
-    planned_time = (production_run.planned_end_time - production_run.planned_start_time).total_seconds()
-    actual_run_time = (production_run.actual_end_time - production_run.actual_start_time).total_seconds()
-    
-    # Subtract downtime
-    downtime_events = get_downtime_events_by_run(session, run_id)
-    total_downtime = 0
-    for event in downtime_events:
-        if event.start_time is not None and event.end_time is not None:
-            total_downtime += (event.end_time - event.start_time).total_seconds()
-    
-    run_time = actual_run_time - total_downtime
-    
-    if planned_time == 0:
+    metrics = _get_run_metrics(session, run_id)
+
+    if metrics is None:
         return None
-    
-    availablity = run_time / planned_time
 
-    return availablity
+    return metrics.availability
 
 
 def calculate_performance(
@@ -703,38 +1355,13 @@ def calculate_performance(
     Performance = (Ideal Cycle Time × Total Parts) / Run Time
     Returns None if run not found or incomplete.
     """
-    production_run = get_production_run(session, run_id)
-    
-    if production_run is None:
-        return None
-    
-    # Need actual times to calculate run time
-    if production_run.actual_start_time is None or production_run.actual_end_time is None:
-        return None
-    
-    if production_run.good_parts_count is None or production_run.rejected_parts_count is None:
-        return None
-    
-    total_parts = production_run.good_parts_count + production_run.rejected_parts_count
-
-    actual_run_time = (production_run.actual_end_time - production_run.actual_start_time).total_seconds()
-    downtime_events = get_downtime_events_by_run(session, run_id)
-    total_downtime = 0
-    for event in downtime_events:
-        if event.start_time is not None and event.end_time is not None:
-            total_downtime += (event.end_time - event.start_time).total_seconds()
-    
-    run_time = actual_run_time - total_downtime
+    metrics = _get_run_metrics(session, run_id)
 
-    ideal_cycle_time = production_run.machine.ideal_cycle_time
-
-    # Need a value greater than 0
-    if ideal_cycle_time is None or ideal_cycle_time <= 0:
+    if metrics is None:
         return None
-    
-    performance = (ideal_cycle_time * total_parts) / run_time
 
-    return performance
+    return metrics.performance
+
 
 def calculate_quality(
     session: Session,
@@ -745,22 +1372,12 @@ def calculate_quality(
     Quality = Good Parts / Total Parts
     Returns None if run not found or incomplete.
     """
-    production_run = get_production_run(session, run_id)
-    
-    if production_run is None:
-        return None
-    
-    if production_run.good_parts_count is None or production_run.rejected_parts_count is None:
-        return None
-    
-    total_parts = production_run.good_parts_count + production_run.rejected_parts_count
+    metrics = _get_run_metrics(session, run_id)
 
-    if total_parts == 0:
+    if metrics is None:
         return None
 
-    quality = production_run.good_parts_count / total_parts
-
-    return quality
+    return metrics.quality
 
 
 def calculate_oee(
@@ -772,166 +1389,193 @@ def calculate_oee(
     Returns dict with availability, performance, quality, and oee.
     Returns None if run not found or incomplete.
     """
-    availability = calculate_availability(session, run_id)
-
-    if availability is None:
-        return None
-    
-    performance = calculate_performance(session, run_id)
-
-    if performance is None:
-        return None
-    
-    quality = calculate_quality(session, run_id)
+    metrics = _get_run_metrics(session, run_id)
 
-    if quality is None:
+    if metrics is None or metrics.oee is None:
         return None
-    
-    oee = availability * performance * quality
 
     return {
-        "availability": availability,
-        "performance": performance,
-        "quality": quality,
-        "oee": oee
+        "availability": metrics.availability,
+        "performance": metrics.performance,
+        "quality": metrics.quality,
+        "oee": metrics.oee
     }
 
 
-def calculate_oee_by_machine(
+def _calculate_oee_by(
     session: Session,
-    machine_id: int,
-    start_date: datetime | None = None,
-    end_date: datetime | None = None,
+    key: str,
+    key_id: int,
+    start_date: datetime | None,
+    end_date: datetime | None,
+    include_archive: bool = False,
 ) -> dict | None:
-    """Calculate aggregate OEE for a machine over a date range."""
-    production_runs = get_production_runs_by_machine(session, machine_id, start_date, end_date)
-
-    if not production_runs:
+    """Aggregate OEE over the runs whose metrics column key (machine_id, shift_id, operator_id) is key_id."""
+    try:
+        metrics = _run_metrics_subquery(start_date, end_date, include_archive=include_archive)
+        statement = select(*_oee_aggregates(metrics)).where(metrics.c[key] == key_id)
+        result = session.execute(statement).one()
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
         return None
 
-    availabilities = []
-    performances = []
-    qualities = []
-    oees = []
-
-    for run in production_runs:
-        result = calculate_oee(session, run.id)
-        if result is not None:
-            availabilities.append(result["availability"])
-            performances.append(result["performance"])
-            qualities.append(result["quality"])
-            oees.append(result["oee"])
-
-    # Then average them
-    avg_availability = sum(availabilities) / len(availabilities) if availabilities else None
-    avg_performance = sum(performances) / len(performances) if performances else None
-    avg_quality = sum(qualities) / len(qualities) if qualities else None
-    avg_oee = sum(oees) / len(oees) if oees else None
-
-    if avg_availability is None or avg_performance is None or avg_quality is None or avg_oee is None:
+    if result.runs_included == 0:
         return None
-    
+
     return {
-        "machine_id": machine_id,
+        key: key_id,
         "start_date": start_date,
         "end_date": end_date,
-        "runs_included": len(availabilities),
-        "runs_total": len(production_runs),
-        "avg_availability": avg_availability,
-        "avg_performance": avg_performance,
-        "avg_quality": avg_quality,
-        "avg_oee": avg_oee
+        "runs_included": result.runs_included,
+        "runs_total": result.runs_total,
+        "avg_availability": result.avg_availability,
+        "avg_performance": result.avg_performance,
+        "avg_quality": result.avg_quality,
+        "avg_oee": result.avg_oee
     }
 
+
+def _rank_by_oee(
+    session: Session,
+    key: str,
+    model,
+    start_date: datetime | None,
+    end_date: datetime | None,
+    include_archive: bool = False,
+) -> list[dict]:
+    """
+    Aggregate OEE per machine, shift or operator in one GROUP BY over the run metrics.
+    key is the metrics column (machine_id, shift_id, operator_id) and model the
+    table it references, joined for the name. Sorted by avg_oee, best first.
+    """
+    metrics = _run_metrics_subquery(start_date, end_date, include_archive=include_archive)
+    group_column = metrics.c[key]
+    aggregates = _oee_aggregates(metrics)
+    avg_oee = aggregates[-1]
+
+    statement = (
+        select(group_column, model.name, *aggregates)
+        .select_from(metrics)
+        .join(model, model.id == group_column)
+        .group_by(group_column, model.name)
+        .having(func.count(metrics.c.oee) > 0)
+        .order_by(avg_oee.desc())
+    )
+
+    ranked = []
+
+    for row in session.execute(statement):
+        ranked.append({
+            key: row[0],
+            "name": row.name,
+            "start_date": start_date,
+            "end_date": end_date,
+            "runs_included": row.runs_included,
+            "runs_total": row.runs_total,
+            "avg_availability": row.avg_availability,
+            "avg_performance": row.avg_performance,
+            "avg_quality": row.avg_quality,
+            "avg_oee": row.avg_oee
+        })
+
+    return ranked
+
+
+def calculate_oee_by_machine(
+    session: Session,
+    machine_id: int,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    include_archive: bool = False,
+) -> dict | None:
+    """Calculate aggregate OEE for a machine over a date range."""
+    return _calculate_oee_by(session, "machine_id", machine_id, start_date, end_date, include_archive)
+
+
 def calculate_oee_by_shift(
     session: Session,
     shift_id: int,
     start_date: datetime | None = None,
     end_date: datetime | None = None,
+    include_archive: bool = False,
 ) -> dict | None:
     """Calculate aggregate OEE for a shift over a date range."""
-    production_runs = get_production_runs_by_shift(session, shift_id, start_date, end_date)
-
-    if not production_runs:
-        return None
-
-    availabilities = []
-    performances = []
-    qualities = []
-    oees = []
+    return _calculate_oee_by(session, "shift_id", shift_id, start_date, end_date, include_archive)
 
-    for run in production_runs:
-        result = calculate_oee(session, run.id)
-        if result is not None:
-            availabilities.append(result["availability"])
-            performances.append(result["performance"])
-            qualities.append(result["quality"])
-            oees.append(result["oee"])
 
-    # Then average them
-    avg_availability = sum(availabilities) / len(availabilities) if availabilities else None
-    avg_performance = sum(performances) / len(performances) if performances else None
-    avg_quality = sum(qualities) / len(qualities) if qualities else None
-    avg_oee = sum(oees) / len(oees) if oees else None
-
-    if avg_availability is None or avg_performance is None or avg_quality is None or avg_oee is None:
-        return None
-    
-    return {
-        "shift_id": shift_id,
-        "start_date": start_date,
-        "end_date": end_date,
-        "runs_included": len(availabilities),
-        "runs_total": len(production_runs),
-        "avg_availability": avg_availability,
-        "avg_performance": avg_performance,
-        "avg_quality": avg_quality,
-        "avg_oee": avg_oee
-    }
+def calculate_oee_by_operator(
+    session: Session,
+    operator_id: int,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    include_archive: bool = False,
+) -> dict | None:
+    """Calculate aggregate OEE for an operator over a date range."""
+    return _calculate_oee_by(session, "operator_id", operator_id, start_date, end_date, include_archive)
 
 
 # ============================================================
 # REPORTS
 # ============================================================
 
+def _downtime_reason_totals(
+    start_date: datetime | None,
+    end_date: datetime | None,
+    include_archive: bool = False,
+):
+    """
+    Statement for total downtime minutes and event count per reason code, largest first.
+    With a date range, events overlapping it count only with the minutes inside it.
+    """
+    events = _downtime_events(include_archive)
+    window = start_date is not None or end_date is not None
+    if window:
+        duration = _clipped_seconds(events.c.start_time, events.c.end_time, start_date, end_date)
+    else:
+        duration = seconds_between(events.c.start_time, events.c.end_time)
+    total_duration = func.sum(duration / 60).label("total_duration_minutes")
+
+    statement = (
+        select(
+            events.c.reason_code,
+            ReasonCode.description.label("description"),
+            ReasonCode.is_planned,
+            total_duration,
+            func.count().label("events"),
+        )
+        .select_from(events)
+        .join(ReasonCode, ReasonCode.code == events.c.reason_code)
+        .where(
+            events.c.start_time != None,
+            events.c.end_time != None
+        )
+        .group_by(events.c.reason_code, ReasonCode.description, ReasonCode.is_planned)
+        .order_by(total_duration.desc())
+    )
+
+    if window:
+        statement = statement.where(_overlaps_window(
+            events.c.start_time, events.c.end_time, start_date, end_date,
+            None if include_archive else EVENT_WINDOW,
+        ))
+
+    return statement
+
+
 def get_top_downtime_reasons(
     session: Session,
     limit: int = 3,
     start_date: datetime | None = None,
     end_date: datetime | None = None,
+    include_archive: bool = False,
 ) -> list[dict]:
     """
     Get top downtime reasons by total duration.
+    With a date range, events overlapping it count only with the minutes inside it.
     Returns list of dicts with reason_code, description, total_duration_minutes.
     """
     try:
-        # PostgreSQL: EXTRACT(EPOCH FROM ...) returns seconds, divide by 60 for minutes
-        total_duration = func.sum(
-            func.extract('epoch', DowntimeEvent.end_time - DowntimeEvent.start_time) / 60
-        ).label("total_duration_minutes")
-
-        statement = (
-            select(
-                DowntimeEvent.reason_code,
-                ReasonCode.description.label("description"),
-                total_duration
-            )
-            .join(ReasonCode)
-            .where(
-                DowntimeEvent.start_time != None,
-                DowntimeEvent.end_time != None
-            )
-            .group_by(DowntimeEvent.reason_code, ReasonCode.description)
-            .order_by(total_duration.desc())
-            .limit(limit)
-        )
-
-        if start_date != None:
-            statement = statement.where(DowntimeEvent.start_time >= start_date)
-
-        if end_date != None:
-            statement = statement.where(DowntimeEvent.end_time <= end_date)
-
+        statement = _downtime_reason_totals(start_date, end_date, include_archive).limit(limit)
         downtime_events = session.execute(statement)
 
         downtime_events_list = []
@@ -951,60 +1595,1342 @@ def get_top_downtime_reasons(
         print(f"Database error: {e}")
         return []
 
-def get_machines_ranked_by_oee(
+
+def get_downtime_reason_totals(
+    session: Session,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    include_archive: bool = False,
+) -> list[dict] | None:
+    """
+    Total downtime of every reason code, for merging with other databases.
+    Returns list of dicts with reason_code, description, is_planned,
+    total_duration_minutes and events, or None on a database error.
+    """
+    try:
+        statement = _downtime_reason_totals(start_date, end_date, include_archive)
+        return [dict(row) for row in session.execute(statement).mappings()]
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+        return None
+
+DOWNTIME_BREAKDOWN_DIMENSIONS = ("reason_code", "machine_id", "shift_id", "is_planned")
+
+# Grouping levels of get_downtime_breakdown, by dimension name
+DOWNTIME_BREAKDOWN_LEVELS = (
+    (),
+    ("is_planned",),
+    ("is_planned", "reason_code"),
+    ("machine_id",),
+    ("machine_id", "is_planned"),
+    ("machine_id", "is_planned", "reason_code"),
+    ("shift_id",),
+    ("shift_id", "is_planned"),
+    ("shift_id", "is_planned", "reason_code"),
+    ("machine_id", "shift_id", "is_planned", "reason_code"),
+)
+
+
+def get_downtime_breakdown(
     session: Session,
     start_date: datetime | None = None,
     end_date: datetime | None = None,
+    include_archive: bool = False,
 ) -> list[dict]:
     """
-    Get machines ranked by OEE.
-    Returns list of dicts with machine_id, name, oee.
+    Get downtime totals broken down by reason, machine, shift and planned/unplanned.
+    With a date range, events overlapping it count only with the minutes inside it.
+    All levels come from one GROUPING SETS query: overall, planned/unplanned, reason,
+    machine, shift, machine and shift by planned/unplanned and by reason, and the full
+    reason x machine x shift detail. Without GROUPING SETS (SQLite) the levels are
+    combined with UNION ALL.
+    Returns list of dicts with dimensions (tuple of grouped dimension names), reason_code,
+    description, machine_id, shift_id, is_planned, event_count, total_duration_minutes,
+    avg_duration_minutes. Dimensions not grouped at a level are None.
     """
     try:
-        machines = get_all_machines(session)
+        runs = _production_runs(include_archive)
+        events = _downtime_events(include_archive)
+        reason_code = events.c.reason_code
+        machine_id = runs.c.machine_id
+        shift_id = runs.c.shift_id
+        is_planned = ReasonCode.is_planned
+        description = ReasonCode.description
+
+        window = start_date is not None or end_date is not None
+        if window:
+            duration_minutes = _clipped_seconds(events.c.start_time, events.c.end_time, start_date, end_date) / 60
+        else:
+            duration_minutes = seconds_between(events.c.start_time, events.c.end_time) / 60
+
+        dimension_columns = {
+            "reason_code": reason_code,
+            "machine_id": machine_id,
+            "shift_id": shift_id,
+            "is_planned": is_planned,
+        }
+
+        def level_columns(level: tuple[str, ...]) -> list:
+            """Group by columns of a level; the description goes with reason_code."""
+            columns = [dimension_columns[name] for name in level]
+            if "reason_code" in level:
+                columns.append(description)
+            return columns
+
+        total_duration = func.sum(duration_minutes).label("total_duration_minutes")
+        aggregates = [
+            func.count(events.c.id).label("event_count"),
+            total_duration,
+            func.avg(duration_minutes).label("avg_duration_minutes"),
+        ]
+
+        base = (
+            select()
+            .select_from(events)
+            .join(ReasonCode, ReasonCode.code == events.c.reason_code)
+            .join(runs, events.c.production_run_id == runs.c.id)
+            .where(
+                events.c.start_time != None,
+                events.c.end_time != None
+            )
+        )
+
+        if window:
+            base = base.where(_overlaps_window(
+                events.c.start_time, events.c.end_time, start_date, end_date,
+                None if include_archive else EVENT_WINDOW,
+            ))
+
+        if is_postgresql(session):
+            # Bit set for each dimension aggregated away at this level
+            grouping_id = func.grouping(*dimension_columns.values()).label("grouping_id")
+
+            statement = (
+                base.add_columns(
+                    grouping_id,
+                    reason_code,
+                    description.label("description"),
+                    machine_id,
+                    shift_id,
+                    is_planned,
+                    *aggregates,
+                )
+                .group_by(func.grouping_sets(*[tuple_(*level_columns(level)) for level in DOWNTIME_BREAKDOWN_LEVELS]))
+                .order_by(grouping_id.desc(), total_duration.desc())
+            )
+        else:
+            # No GROUPING SETS (SQLite): one GROUP BY per level, combined with UNION ALL
+            levels = []
+            for level in DOWNTIME_BREAKDOWN_LEVELS:
+                level_grouping_id = sum(
+                    1 << bit
+                    for bit, name in enumerate(reversed(DOWNTIME_BREAKDOWN_DIMENSIONS))
+                    if name not in level
+                )
+                grouped = {
+                    name: column if name in level else literal(None, column.type)
+                    for name, column in dimension_columns.items()
+                }
+                levels.append(
+                    base.add_columns(
+                        literal(level_grouping_id).label("grouping_id"),
+                        grouped["reason_code"].label("reason_code"),
+                        (description if "reason_code" in level else literal(None, description.type)).label("description"),
+                        grouped["machine_id"].label("machine_id"),
+                        grouped["shift_id"].label("shift_id"),
+                        grouped["is_planned"].label("is_planned"),
+                        *aggregates,
+                    )
+                    .group_by(*level_columns(level))
+                )
+
+            combined = union_all(*levels).subquery("breakdown")
+            statement = select(combined).order_by(
+                combined.c.grouping_id.desc(), combined.c.total_duration_minutes.desc()
+            )
+
+        breakdown = []
+
+        for row in session.execute(statement):
+            dimensions = tuple(
+                name
+                for bit, name in enumerate(reversed(DOWNTIME_BREAKDOWN_DIMENSIONS))
+                if not row.grouping_id & (1 << bit)
+            )[::-1]
+
+            breakdown.append({
+                "dimensions": dimensions,
+                "reason_code": row.reason_code,
+                "description": row.description,
+                "machine_id": row.machine_id,
+                "shift_id": row.shift_id,
+                "is_planned": row.is_planned,
+                "event_count": row.event_count,
+                "total_duration_minutes": row.total_duration_minutes,
+                "avg_duration_minutes": row.avg_duration_minutes,
+            })
+
+        return breakdown
+
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+        return []
 
-        machines_oee_list = []
 
-        for machine in machines:
-            machine_oee = calculate_oee_by_machine(session, machine.id, start_date, end_date)
+TREND_BUCKETS = {
+    "hour": timedelta(hours=1),
+    "shift": timedelta(days=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+}
+
+
+def get_oee_trend(
+    session: Session,
+    bucket: str,
+    start_date: datetime,
+    end_date: datetime,
+    machine_id: int | None = None,
+    shift_id: int | None = None,
+    include_archive: bool = False,
+) -> list[dict]:
+    """
+    Get OEE per time bucket (hour, shift, day or week) over a date range.
+    Runs are bucketed by actual start time (start_date for runs started before it)
+    with date_trunc and joined onto a recursive series of buckets, so empty buckets
+    are included. The shift bucket is one row per day per shift.
+    Returns list of dicts with bucket_start, shift_id, runs_included, runs_total,
+    avg_availability, avg_performance, avg_quality, avg_oee (None for empty buckets).
+    """
+    if bucket not in TREND_BUCKETS:
+        print(f"Error: Invalid bucket '{bucket}'. Use {', '.join(TREND_BUCKETS)}")
+        return []
+
+    try:
+        unit = "day" if bucket == "shift" else bucket
+
+        # Recursive CTE rather than generate_series, which SQLite lacks
+        step = TREND_BUCKETS[bucket].total_seconds()
+        series = select(date_trunc(unit, literal(start_date, DateTime)).label("bucket_start")).cte(
+            "buckets", recursive=True
+        )
+        next_bucket = add_seconds(series.c.bucket_start, step)
+        series = series.union_all(
+            # Every bucket that starts before end_date; truncating end_date - 1µs instead
+            # rounds up to the next week on SQLite, which keeps only milliseconds
+            select(next_bucket).where(next_bucket < literal(end_date, DateTime))
+        )
+
+        metrics = _run_metrics_subquery(start_date, end_date, include_archive=include_archive)
+        # Runs straddling start_date go in the first bucket, not before the series
+        clipped_start = greatest(metrics.c.actual_start_time, literal(start_date, DateTime))
+        bucket_start = date_trunc(unit, clipped_start).label("bucket_start")
+        group_columns = [bucket_start]
+        if bucket == "shift":
+            group_columns.append(metrics.c.shift_id)
+
+        aggregated = select(*group_columns, *_oee_aggregates(metrics)).group_by(*group_columns)
+        if machine_id is not None:
+            aggregated = aggregated.where(metrics.c.machine_id == machine_id)
+        if shift_id is not None:
+            aggregated = aggregated.where(metrics.c.shift_id == shift_id)
+        aggregated = aggregated.subquery("aggregated")
+
+        on_clause = aggregated.c.bucket_start == series.c.bucket_start
+        aggregate_columns = [
+            aggregated.c.runs_total,
+            aggregated.c.runs_included,
+            aggregated.c.avg_availability,
+            aggregated.c.avg_performance,
+            aggregated.c.avg_quality,
+            aggregated.c.avg_oee,
+        ]
+
+        if bucket == "shift":
+            shifts = select(Shift.id)
+            if shift_id is not None:
+                shifts = shifts.where(Shift.id == shift_id)
+            shifts = shifts.subquery("shift_ids")
+            on_clause = and_(on_clause, aggregated.c.shift_id == shifts.c.id)
+            statement = (
+                select(series.c.bucket_start, shifts.c.id.label("shift_id"), *aggregate_columns)
+                .select_from(series.join(shifts, true()))
+                .outerjoin(aggregated, on_clause)
+                .order_by(series.c.bucket_start, shifts.c.id)
+            )
+        else:
+            statement = (
+                select(series.c.bucket_start, literal(shift_id, Integer).label("shift_id"), *aggregate_columns)
+                .select_from(series)
+                .outerjoin(aggregated, on_clause)
+                .order_by(series.c.bucket_start)
+            )
 
-            if machine_oee is not None:
-                machines_oee_list.append(machine_oee)
+        trend = []
 
-        machine_oee_sorted = sorted(machines_oee_list, key=lambda m: m["avg_oee"], reverse=True)
+        for row in session.execute(statement):
+            trend.append({
+                "bucket_start": row.bucket_start,
+                "shift_id": row.shift_id,
+                "runs_included": row.runs_included or 0,
+                "runs_total": row.runs_total or 0,
+                "avg_availability": row.avg_availability,
+                "avg_performance": row.avg_performance,
+                "avg_quality": row.avg_quality,
+                "avg_oee": row.avg_oee,
+            })
 
-        return machine_oee_sorted
+        return trend
 
     except SQLAlchemyError as e:
         print(f"Database error: {e}")
         return []
-    
+
+
+LOSS_GROUPS = {
+    "machine": ("machine_id", Machine),
+    "shift": ("shift_id", Shift),
+    "operator": ("operator_id", Operator),
+}
+
+
+def get_six_big_losses(
+    session: Session,
+    group_by: str | None = "machine",
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    small_stop_minutes: float = SMALL_STOP_MINUTES,
+    setup_reason_codes: tuple[str, ...] = SETUP_REASON_CODES,
+    include_archive: bool = False,
+) -> list[dict]:
+    """
+    Get the Six Big Losses in minutes per machine, shift or operator (group_by None for the total).
+    Availability: breakdowns (unplanned stops of at least small_stop_minutes) and
+    setup/adjustment (setup_reason_codes). Performance: small stops (shorter unplanned
+    stops) and reduced speed (run time not covered by ideal cycle time x total parts).
+    Quality: rejects at ideal cycle time. Rejects are not recorded by phase, so all
+    count as production rejects and startup_rejects is None.
+    Planned stops other than setups (breaks, planned maintenance) are reported
+    separately and are not a loss.
+    Computed in one statement over the run metrics, so one scan of runs and downtime.
+    Returns list of dicts with <group>_id, name, runs, planned_time, planned_stops,
+    breakdowns, setup_adjustment, small_stops, reduced_speed, startup_rejects,
+    production_rejects, fully_productive_time.
+    """
+    if group_by is not None and group_by not in LOSS_GROUPS:
+        print(f"Error: Invalid group '{group_by}'. Use {', '.join(LOSS_GROUPS)}")
+        return []
+
+    try:
+        metrics = _run_metrics_subquery(
+            start_date, end_date, small_stop_minutes, setup_reason_codes, include_archive
+        )
+
+        has_speed = and_(
+            metrics.c.total_parts != None,
+            metrics.c.run_time != None,
+            metrics.c.ideal_cycle_time > 0,
+        )
+        speed_gap = metrics.c.run_time - metrics.c.ideal_cycle_time * metrics.c.total_parts
+        reduced_speed = case((and_(has_speed, speed_gap > 0), speed_gap), else_=0)
+
+        losses = [
+            func.count().label("runs"),
+            (func.sum(metrics.c.planned_time) / 60).label("planned_time"),
+            (func.sum(metrics.c.planned_stop_downtime) / 60).label("planned_stops"),
+            (func.sum(metrics.c.breakdown_downtime) / 60).label("breakdowns"),
+            (func.sum(metrics.c.setup_downtime) / 60).label("setup_adjustment"),
+            (func.sum(metrics.c.small_stop_downtime) / 60).label("small_stops"),
+            (func.sum(reduced_speed) / 60).label("reduced_speed"),
+            (func.sum(metrics.c.ideal_cycle_time * func.coalesce(metrics.c.rejected_parts_count, 0)) / 60).label("production_rejects"),
+            (func.sum(metrics.c.ideal_cycle_time * func.coalesce(metrics.c.good_parts_count, 0)) / 60).label("fully_productive_time"),
+        ]
+
+        if group_by is None:
+            statement = select(*losses).select_from(metrics)
+            key = None
+        else:
+            key, model = LOSS_GROUPS[group_by]
+            group_column = metrics.c[key]
+            statement = (
+                select(group_column, model.name, *losses)
+                .select_from(metrics)
+                .join(model, model.id == group_column)
+                .group_by(group_column, model.name)
+                .order_by(model.name)
+            )
+
+        # Only completed runs have a run time to lose
+        statement = statement.where(metrics.c.actual_end_time != None)
+
+        results = []
+
+        for row in session.execute(statement):
+            if row.runs == 0:
+                continue
+            results.append({
+                **({key: row[0], "name": row.name} if key else {}),
+                "runs": row.runs,
+                "planned_time": row.planned_time,
+                "planned_stops": row.planned_stops,
+                "breakdowns": row.breakdowns,
+                "setup_adjustment": row.setup_adjustment,
+                "small_stops": row.small_stops,
+                "reduced_speed": row.reduced_speed,
+                "startup_rejects": None,
+                "production_rejects": row.production_rejects,
+                "fully_productive_time": row.fully_productive_time,
+            })
+
+        return results
+
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+        return []
+
+
+DISTRIBUTION_QUANTILES = (0.1, 0.5, 0.9)
+
+# name: (values column, dimension model, dimension key, label column)
+OEE_DISTRIBUTION_GROUPS = {
+    "machine": ("machine_id", Machine, Machine.id, Machine.name),
+    "shift": ("shift_id", Shift, Shift.id, Shift.name),
+    "operator": ("operator_id", Operator, Operator.id, Operator.name),
+}
+
+DOWNTIME_DISTRIBUTION_GROUPS = {
+    "reason": ("reason_code", ReasonCode, ReasonCode.code, ReasonCode.description),
+    "machine": ("machine_id", Machine, Machine.id, Machine.name),
+    "shift": ("shift_id", Shift, Shift.id, Shift.name),
+}
+
+
+def new_oee_sketch() -> HistogramSketch:
+    """Sketch layout for per-run OEE values (0.5 point bins)."""
+    return HistogramSketch(0.005)
+
+
+def new_duration_sketch() -> HistogramSketch:
+    """Sketch layout for downtime durations in minutes (log bins, 0.02 minutes wide near 0)."""
+    return HistogramSketch(0.02, log_scale=True, log_offset=1.0)
+
+
+def _get_distribution(
+    session: Session,
+    values_subquery,
+    group: tuple,
+    approx: bool,
+    new_sketch,
+) -> list[dict]:
+    """
+    Distribution of values_subquery.c.value per group.
+    Exact mode uses percentile_cont in the database (in Python on SQLite). Approximate mode groups rows
+    into sketch bins in the database and only reads one row per occupied bin.
+    """
+    key, model, model_key, label = group
+    value = values_subquery.c.value
+    group_column = values_subquery.c[key]
+
+    if approx:
+        bin_index = new_sketch().sql_bin_index(value).label("bin_index")
+        statement = (
+            select(
+                group_column,
+                label.label("name"),
+                bin_index,
+                func.count().label("count"),
+                func.sum(value).label("total"),
+                func.sum(value * value).label("total_squares"),
+            )
+            .select_from(values_subquery)
+            .join(model, model_key == group_column)
+            .group_by(group_column, label, bin_index)
+        )
+
+        sketches = {}
+        names = {}
+        for row in session.execute(statement):
+            names[row[0]] = row.name
+            sketches.setdefault(row[0], new_sketch()).add_bin(
+                row.bin_index, row.count, row.total, row.total_squares
+            )
+
+        distribution = []
+        for group_id, sketch in sketches.items():
+            distribution.append({
+                key: group_id,
+                "name": names[group_id],
+                "count": sketch.count,
+                "mean": sketch.mean(),
+                "stddev": sketch.stddev(),
+                **{f"p{round(q * 100)}": sketch.quantile(q) for q in DISTRIBUTION_QUANTILES},
+            })
+        return sorted(distribution, key=lambda d: str(d["name"]))
+
+    if not is_postgresql(session):
+        # No percentile_cont (SQLite): read the sorted values and compute in Python
+        statement = (
+            select(group_column, label.label("name"), value)
+            .select_from(values_subquery)
+            .join(model, model_key == group_column)
+            .order_by(label, group_column, value)
+        )
+
+        distribution = []
+        for group_id, rows in groupby(session.execute(statement), key=lambda row: row[0]):
+            rows = [*rows]
+            group_values = [row.value for row in rows]
+            total = sum(group_values)
+            distribution.append({
+                key: group_id,
+                "name": rows[0].name,
+                "count": len(group_values),
+                "mean": total / len(group_values),
+                "stddev": stddev_from_sums(len(group_values), total, sum(v * v for v in group_values)),
+                **{f"p{round(q * 100)}": percentile_cont(group_values, q) for q in DISTRIBUTION_QUANTILES},
+            })
+        return distribution
+
+    percentiles = [
+        func.percentile_cont(q).within_group(value).label(f"p{round(q * 100)}")
+        for q in DISTRIBUTION_QUANTILES
+    ]
+    statement = (
+        select(
+            group_column,
+            label.label("name"),
+            func.count(value).label("count"),
+            func.sum(value).label("total"),
+            func.sum(value * value).label("total_squares"),
+            *percentiles,
+        )
+        .select_from(values_subquery)
+        .join(model, model_key == group_column)
+        .group_by(group_column, label)
+        .order_by(label)
+    )
+
+    distribution = []
+    for row in session.execute(statement):
+        distribution.append({
+            key: row[0],
+            "name": row.name,
+            "count": row.count,
+            "mean": row.total / row.count,
+            "stddev": stddev_from_sums(row.count, row.total, row.total_squares),
+            **{f"p{round(q * 100)}": getattr(row, f"p{round(q * 100)}") for q in DISTRIBUTION_QUANTILES},
+        })
+    return distribution
+
+
+def get_oee_distribution(
+    session: Session,
+    group_by: str = "machine",
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    approx: bool = False,
+    include_archive: bool = False,
+) -> list[dict]:
+    """
+    Get the distribution of per-run OEE per machine, shift or operator.
+    Returns list of dicts with <group>_id, name, count, mean, stddev, p10, p50, p90.
+    approx uses a mergeable histogram sketch instead of exact percentile_cont.
+    """
+    if group_by not in OEE_DISTRIBUTION_GROUPS:
+        print(f"Error: Invalid group '{group_by}'. Use {', '.join(OEE_DISTRIBUTION_GROUPS)}")
+        return []
+
+    try:
+        metrics = _run_metrics_subquery(start_date, end_date, include_archive=include_archive)
+        values_subquery = (
+            select(
+                metrics.c.machine_id,
+                metrics.c.shift_id,
+                metrics.c.operator_id,
+                metrics.c.oee.label("value"),
+            )
+            .where(metrics.c.oee != None)
+            .subquery("oee_values")
+        )
+
+        return _get_distribution(
+            session, values_subquery, OEE_DISTRIBUTION_GROUPS[group_by], approx, new_oee_sketch
+        )
+
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+        return []
+
+
+def get_downtime_distribution(
+    session: Session,
+    group_by: str = "reason",
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    approx: bool = False,
+    include_archive: bool = False,
+) -> list[dict]:
+    """
+    Get the distribution of downtime event durations (minutes) per reason, machine or shift.
+    With a date range, events overlapping it count only with the minutes inside it.
+    Returns list of dicts with reason_code/machine_id/shift_id, name, count, mean, stddev, p10, p50, p90.
+    approx uses a mergeable histogram sketch instead of exact percentile_cont.
+    """
+    if group_by not in DOWNTIME_DISTRIBUTION_GROUPS:
+        print(f"Error: Invalid group '{group_by}'. Use {', '.join(DOWNTIME_DISTRIBUTION_GROUPS)}")
+        return []
+
+    try:
+        runs = _production_runs(include_archive)
+        events = _downtime_events(include_archive)
+        window = start_date is not None or end_date is not None
+        if window:
+            duration = _clipped_seconds(events.c.start_time, events.c.end_time, start_date, end_date)
+        else:
+            duration = seconds_between(events.c.start_time, events.c.end_time)
+
+        statement = (
+            select(
+                events.c.reason_code,
+                runs.c.machine_id,
+                runs.c.shift_id,
+                (duration / 60).label("value"),
+            )
+            .select_from(events)
+            .join(runs, events.c.production_run_id == runs.c.id)
+            .where(
+                events.c.start_time != None,
+                events.c.end_time != None
+            )
+        )
+
+        if window:
+            statement = statement.where(_overlaps_window(
+                events.c.start_time, events.c.end_time, start_date, end_date,
+                None if include_archive else EVENT_WINDOW,
+            ))
+
+        return _get_distribution(
+            session,
+            statement.subquery("downtime_values"),
+            DOWNTIME_DISTRIBUTION_GROUPS[group_by],
+            approx,
+            new_duration_sketch,
+        )
+
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+        return []
+
+
+def get_machines_ranked_by_oee(
+    session: Session,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    include_archive: bool = False,
+) -> list[dict]:
+    """
+    Get machines ranked by OEE.
+    Returns list of dicts with machine_id, name, oee.
+    """
+    try:
+        return _rank_by_oee(session, "machine_id", Machine, start_date, end_date, include_archive)
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+        return []
 
 
 def compare_shifts(
     session: Session,
     start_date: datetime | None = None,
     end_date: datetime | None = None,
+    include_archive: bool = False,
 ) -> list[dict]:
     """
     Compare shift performance.
     Returns list of dicts with shift_id, name, availability, performance, quality, oee.
     """
     try:
-        shifts = get_all_shifts(session)
+        return _rank_by_oee(session, "shift_id", Shift, start_date, end_date, include_archive)
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+        return []
+
+
+def get_operators_ranked_by_oee(
+    session: Session,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    include_archive: bool = False,
+) -> list[dict]:
+    """
+    Get operators ranked by OEE.
+    Returns list of dicts with operator_id, name, availability, performance, quality, oee.
+    """
+    try:
+        return _rank_by_oee(session, "operator_id", Operator, start_date, end_date, include_archive)
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+        return []
 
-        shifts_oee_list = []
 
-        for shift in shifts:
-            shift_oee = calculate_oee_by_shift(session, shift.id, start_date, end_date)
+OEE_TOTALS_MODELS = {"machine_id": Machine, "shift_id": Shift, "operator_id": Operator}
 
-            if shift_oee is not None:
-                shifts_oee_list.append(shift_oee)
 
-        shifts_oee_sorted = sorted(shifts_oee_list, key=lambda s: s["avg_oee"], reverse=True)
-        
-        return shifts_oee_sorted
-    
+def get_oee_totals(
+    session: Session,
+    key: str,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    include_archive: bool = False,
+) -> list[dict] | None:
+    """
+    Per machine, shift or operator (key: machine_id, shift_id or operator_id) sums and
+    counts of the run results, so results from several databases can be merged without
+    averaging averages. Returns list of dicts with key, name, runs_total, runs_included
+    and sum_availability, sum_performance, sum_quality, sum_oee over the runs with an
+    OEE, or None on a database error.
+    """
+    model = OEE_TOTALS_MODELS[key]
+    metrics = _run_metrics_subquery(start_date, end_date, include_archive=include_archive)
+    group_column = metrics.c[key]
+    included = metrics.c.oee != None
+
+    statement = (
+        select(
+            group_column,
+            model.name,
+            func.count().label("runs_total"),
+            func.count(metrics.c.oee).label("runs_included"),
+            func.sum(metrics.c.availability).filter(included).label("sum_availability"),
+            func.sum(metrics.c.performance).filter(included).label("sum_performance"),
+            func.sum(metrics.c.quality).filter(included).label("sum_quality"),
+            func.sum(metrics.c.oee).label("sum_oee"),
+        )
+        .select_from(metrics)
+        .join(model, model.id == group_column)
+        .group_by(group_column, model.name)
+    )
+
+    try:
+        return [dict(row) for row in session.execute(statement).mappings()]
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+        return None
+
+
+def iter_timeline_spans(
+    session: Session,
+    start_date: datetime,
+    end_date: datetime,
+    machine_ids: list[int] | None = None,
+    include_archive: bool = False,
+    batch_size: int = 5000,
+) -> Iterator[dict]:
+    """
+    Stream the actual run times and downtime events overlapping [start_date, end_date)
+    as spans with machine_id, state (running, planned or unplanned), reason_code,
+    start_time and end_time, in one query ordered by machine_id and start_time, the
+    order timeline.build_timelines reads them in. Open runs and events end now.
+    """
+    try:
+        runs = _production_runs(include_archive)
+        events = _downtime_events(include_archive)
+        now = clock_now()
+
+        run_spans = (
+            select(
+                runs.c.machine_id,
+                literal("running").label("state"),
+                null().label("reason_code"),
+                runs.c.actual_start_time.label("start_time"),
+                func.coalesce(runs.c.actual_end_time, now).label("end_time"),
+            )
+            .where(_overlaps_window(
+                runs.c.actual_start_time, runs.c.actual_end_time, start_date, end_date,
+                None if include_archive else RUN_WINDOW,
+            ))
+        )
+        event_spans = (
+            select(
+                runs.c.machine_id,
+                case((ReasonCode.is_planned, "planned"), else_="unplanned").label("state"),
+                events.c.reason_code,
+                events.c.start_time,
+                func.coalesce(events.c.end_time, now).label("end_time"),
+            )
+            .select_from(events)
+            .join(runs, runs.c.id == events.c.production_run_id)
+            .join(ReasonCode, ReasonCode.code == events.c.reason_code)
+            .where(_overlaps_window(
+                events.c.start_time, events.c.end_time, start_date, end_date,
+                None if include_archive else EVENT_WINDOW,
+            ))
+        )
+        if machine_ids:
+            run_spans = run_spans.where(runs.c.machine_id.in_(machine_ids))
+            event_spans = event_spans.where(runs.c.machine_id.in_(machine_ids))
+
+        spans = union_all(run_spans, event_spans).subquery("spans")
+        statement = (
+            select(spans)
+            .where(spans.c.end_time > spans.c.start_time)
+            .order_by(spans.c.machine_id, spans.c.start_time)
+            .execution_options(yield_per=batch_size)
+        )
+
+        yield from session.execute(statement).mappings()
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+
+
+def get_database_time(session: Session) -> datetime | None:
+    """The database clock (local time, like stored timestamps), or None on error."""
+    try:
+        return session.scalar(select(clock_now()))
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+        return None
+
+
+def get_completed_run_metrics(session: Session, ended_since: datetime) -> list[dict] | None:
+    """
+    Per-run OEE results for runs that ended at or after ended_since.
+    Returns list of dicts with run_id, machine_id, actual_end_time, availability,
+    performance, quality, oee (None for runs that cannot be scored), or None on error.
+    """
+    metrics = _run_metrics_subquery(ended_since=ended_since)
+    statement = select(
+        metrics.c.run_id,
+        metrics.c.machine_id,
+        metrics.c.actual_end_time,
+        metrics.c.availability,
+        metrics.c.performance,
+        metrics.c.quality,
+        metrics.c.oee,
+    )
+
+    try:
+        return [dict(row) for row in session.execute(statement).mappings()]
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+        return None
+
+
+def count_open_downtime_by_reason(session: Session) -> list[dict] | None:
+    """
+    Number of downtime events currently open per reason code.
+    Returns list of dicts with reason_code, is_planned, count, or None on error.
+    """
+    statement = (
+        select(DowntimeEvent.reason_code, ReasonCode.is_planned, func.count().label("count"))
+        .join(ReasonCode, ReasonCode.code == DowntimeEvent.reason_code)
+        .where(DowntimeEvent.start_time != None, DowntimeEvent.end_time == None)
+        .group_by(DowntimeEvent.reason_code, ReasonCode.is_planned)
+        .order_by(DowntimeEvent.reason_code)
+    )
+
+    try:
+        return [dict(row) for row in session.execute(statement).mappings()]
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+        return None
+
+
+# ============================================================
+# MAINTENANCE
+# ============================================================
+
+def _batched_update(
+    session: Session,
+    model,
+    criteria: list,
+    values: dict,
+    returning: list,
+    batch_size: int,
+) -> list:
+    """
+    Apply an UPDATE to the rows matching criteria in batches of batch_size, committing
+    after each batch so locks are held briefly. Candidate rows are locked with
+    FOR UPDATE SKIP LOCKED, so rows an operator is writing right now are left for
+    the next run, and criteria are checked again in the UPDATE itself.
+    Batches walk the ids in order until no candidate is left; a batch that changed
+    fewer rows (skipped or changed meanwhile) does not end the sweep early.
+    Returns the RETURNING rows of every batch.
+    """
+    changed = []
+    last_id = None
+
+    while True:
+        batch = (
+            select(model.id)
+            .where(*criteria)
+            .order_by(model.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        if last_id is not None:
+            batch = batch.where(model.id > last_id)
+
+        ids = session.scalars(batch).all()
+        if not ids:
+            session.commit()
+            return changed
+        last_id = ids[-1]
+
+        statement = (
+            update(model)
+            .where(model.id.in_(ids), *criteria)
+            .values(values)
+            .returning(*returning)
+            .execution_options(synchronize_session=False)
+        )
+
+        rows = session.execute(statement).all()
+        session.commit()
+        changed.extend(rows)
+
+
+def sweep_stale_downtime(
+    session: Session,
+    max_open_minutes: float,
+    batch_size: int = 500,
+    dry_run: bool = False,
+) -> list[dict] | None:
+    """
+    Close downtime events left open.
+    Events whose production run has ended are closed at the run's end time.
+    Events of runs still going that are open longer than max_open_minutes are
+    closed at start + max_open_minutes.
+    Returns list of dicts with id, production_run_id, reason_code, start_time, end_time, rule.
+    dry_run returns what would change without updating.
+    """
+    run_end = (
+        select(ProductionRun.actual_end_time)
+        .where(ProductionRun.id == DowntimeEvent.production_run_id)
+        .scalar_subquery()
+    )
+    max_open = timedelta(minutes=max_open_minutes)
+    is_open = [DowntimeEvent.start_time != None, DowntimeEvent.end_time == None]
+
+    rules = [
+        (
+            "run ended",
+            [*is_open, run_end != None],
+            case((run_end < DowntimeEvent.start_time, DowntimeEvent.start_time), else_=run_end),
+        ),
+        (
+            f"open > {max_open_minutes:g} min",
+            [*is_open, run_end == None, DowntimeEvent.start_time < _add_interval(clock_now(), -max_open)],
+            _add_interval(DowntimeEvent.start_time, max_open),
+        ),
+    ]
+
+    returning = [
+        DowntimeEvent.id,
+        DowntimeEvent.production_run_id,
+        DowntimeEvent.reason_code,
+        DowntimeEvent.start_time,
+        DowntimeEvent.end_time,
+    ]
+
+    try:
+        swept = []
+
+        for rule, criteria, end_time in rules:
+            if dry_run:
+                rows = session.execute(
+                    select(*returning[:-1], end_time.label("end_time")).where(*criteria).order_by(DowntimeEvent.id)
+                ).all()
+            else:
+                rows = _batched_update(
+                    session, DowntimeEvent, criteria, {"end_time": end_time}, returning, batch_size
+                )
+
+            for row in rows:
+                swept.append({**row._asdict(), "rule": rule})
+
+        return swept
+
+    except SQLAlchemyError as e:
+        session.rollback()
+        print(f"Database error: {e}")
+        return None
+
+
+def sweep_overdue_runs(
+    session: Session,
+    margin_minutes: float,
+    auto_close: bool = False,
+    batch_size: int = 500,
+    dry_run: bool = False,
+) -> list[dict] | None:
+    """
+    Find running production runs more than margin_minutes past planned_end_time.
+    With auto_close they are stopped at planned_end_time, or at actual_start_time
+    for runs started after their planned end (part counts are left empty, so the
+    run is skipped by OEE until counts are entered).
+    Returns list of dicts with id, machine_id, planned_end_time, actual_start_time,
+    actual_end_time, closed.
+    """
+    criteria = [
+        ProductionRun.actual_start_time != None,
+        ProductionRun.actual_end_time == None,
+        ProductionRun.planned_end_time < _add_interval(clock_now(), -timedelta(minutes=margin_minutes)),
+    ]
+    returning = [
+        ProductionRun.id,
+        ProductionRun.machine_id,
+        ProductionRun.planned_end_time,
+        ProductionRun.actual_start_time,
+        ProductionRun.actual_end_time,
+    ]
+
+    try:
+        if auto_close and not dry_run:
+            rows = _batched_update(
+                session,
+                ProductionRun,
+                criteria,
+                {"actual_end_time": greatest(ProductionRun.planned_end_time, ProductionRun.actual_start_time)},
+                returning,
+                batch_size,
+            )
+        else:
+            rows = session.execute(select(*returning).where(*criteria).order_by(ProductionRun.id)).all()
+
+        return [{**row._asdict(), "closed": auto_close and not dry_run} for row in rows]
+
+    except SQLAlchemyError as e:
+        session.rollback()
+        print(f"Database error: {e}")
+        return None
+
+
+def archive_production_runs(
+    session: Session,
+    before: datetime,
+    batch_size: int = 1000,
+    dry_run: bool = False,
+) -> dict | None:
+    """
+    Move production runs that ended before the given time, with their downtime events,
+    into the archive tables. Each batch of batch_size runs is copied and deleted in
+    its own transaction with set-based INSERT ... SELECT and DELETE statements.
+    The deleted_rows entries the deletes write are removed again, so change exports
+    do not send archived rows as deletes.
+    Returns dict with runs and downtime_events counts (to be moved if dry_run).
+    """
+    criteria = [ProductionRun.actual_end_time != None, ProductionRun.actual_end_time < before]
+    run_columns = [column.name for column in ProductionRun.__table__.columns]
+    event_columns = [column.name for column in DowntimeEvent.__table__.columns]
+
+    try:
+        if dry_run:
+            runs = select(ProductionRun.id).where(*criteria).subquery()
+            return {
+                "runs": session.scalar(select(func.count()).select_from(runs)),
+                "downtime_events": session.scalar(
+                    select(func.count(DowntimeEvent.id))
+                    .join(runs, DowntimeEvent.production_run_id == runs.c.id)
+                ),
+            }
+
+        moved = {"runs": 0, "downtime_events": 0}
+
+        while True:
+            run_ids = session.scalars(
+                select(ProductionRun.id)
+                .where(*criteria)
+                .order_by(ProductionRun.id)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            ).all()
+
+            if not run_ids:
+                return moved
+
+            session.execute(
+                insert(ProductionRunArchive).from_select(
+                    run_columns,
+                    select(*[ProductionRun.__table__.c[name] for name in run_columns])
+                    .where(ProductionRun.id.in_(run_ids)),
+                )
+            )
+            session.execute(
+                insert(DowntimeEventArchive).from_select(
+                    event_columns,
+                    select(*[DowntimeEvent.__table__.c[name] for name in event_columns])
+                    .where(DowntimeEvent.production_run_id.in_(run_ids)),
+                )
+            )
+            # The runs are locked, so any entry for their keys written from here on
+            # comes from the deletes below, not from an earlier deleted row
+            deletes_started = session.scalar(select(clock_now()))
+            events = session.execute(
+                delete(DowntimeEvent)
+                .where(DowntimeEvent.production_run_id.in_(run_ids))
+                .execution_options(synchronize_session=False)
+            )
+            session.execute(
+                delete(ProductionRun)
+                .where(ProductionRun.id.in_(run_ids))
+                .execution_options(synchronize_session=False)
+            )
+            archived_events = (
+                select(cast(DowntimeEventArchive.id, String))
+                .where(DowntimeEventArchive.production_run_id.in_(run_ids))
+            )
+            session.execute(
+                delete(DeletedRow)
+                .where(
+                    DeletedRow.deleted_at >= deletes_started,
+                    or_(
+                        and_(DeletedRow.table_name == "production_runs", DeletedRow.row_key.in_([str(run_id) for run_id in run_ids])),
+                        and_(DeletedRow.table_name == "downtime_events", DeletedRow.row_key.in_(archived_events)),
+                    ),
+                )
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
+
+            moved["runs"] += len(run_ids)
+            moved["downtime_events"] += events.rowcount
+
+            if len(run_ids) < batch_size:
+                return moved
+
+    except SQLAlchemyError as e:
+        session.rollback()
+        print(f"Database error: {e}")
+        return None
+
+
+# ============================================================
+# OFFLINE JOURNAL
+# ============================================================
+
+def _journal_event_id(session: Session, local_id: str) -> int:
+    """
+    Database id of the downtime event created by a replayed journal entry, from the
+    entry id or its start (a local id without the J). Raises LookupError if that
+    entry was not replayed (yet) or the start is ambiguous.
+    """
+    event_ids = session.scalars(
+        select(JournalApplied.result_id)
+        .where(JournalApplied.op == "downtime_create", JournalApplied.entry_id.startswith(local_id))
+        .limit(2)
+    ).all()
+
+    if len(event_ids) != 1 or event_ids[0] is None:
+        raise LookupError(f"No replayed downtime event with local id J{local_id[:8]}")
+    return event_ids[0]
+
+
+def resolve_local_event_id(session: Session, local_id: str) -> int | None:
+    """
+    Database id of a downtime event created offline, from its local id (e.g.
+    J3f9a1c2e), once `oee sync` has replayed it. Returns None if it was not.
+    """
+    try:
+        return _journal_event_id(session, local_id[1:])
+    except LookupError as e:
+        print(f"Error: {e}")
+        return None
+    except SQLAlchemyError as e:
+        print(f"Database error: {e}")
+        return None
+
+
+def _apply_journal_entry(session: Session, entry: dict) -> tuple[str, int | None]:
+    """
+    Apply one journal entry (without committing) at its recorded time.
+    Returns a short description and the id of the downtime event a downtime_create
+    made (None for other entries). Raises LookupError if the run or event does not
+    exist and StateConflict if it is not in the state the entry expects.
+    """
+    at = datetime.fromisoformat(entry["at"])
+    op = entry["op"]
+
+    if op == "run_start":
+        _start_run(session, entry["run_id"], at)
+        return f"run {entry['run_id']} started at {at}", None
+
+    if op == "run_stop":
+        _stop_run(session, entry["run_id"], entry["good_parts"], entry["rejected_parts"], at)
+        return f"run {entry['run_id']} stopped at {at}", None
+
+    if op == "downtime_create":
+        missing = _missing_dimension(session, reason_code=entry["reason_code"])
+        if missing:
+            raise LookupError(missing)
+        event = _create_downtime_event(session, entry["run_id"], entry["reason_code"], at, None)
+        session.flush()
+        return f"downtime event {event.id} ({entry['reason_code']}) started at {at}", event.id
+
+    if op == "downtime_stop":
+        # event_ref: the entry id of a downtime_create replayed before this entry
+        event_id = entry.get("event_id")
+        if event_id is None:
+            event_id = _journal_event_id(session, entry["event_ref"])
+        _stop_downtime(session, event_id, at)
+        return f"downtime event {event_id} stopped at {at}", None
+
+    raise LookupError(f"Unknown journal operation '{op}'")
+
+
+def apply_journal_entries(session: Session, entries: list[dict]) -> dict | None:
+    """
+    Replay a batch of offline journal entries in one transaction.
+    Entries already in journal_applied are skipped, so replaying twice changes nothing.
+    Each entry runs in a savepoint; one that fails (e.g. unknown run) is rolled back
+    alone and reported, the rest of the batch is still committed.
+    Returns dict with applied (list of (entry, description)), skipped (entries) and
+    failed (list of (entry, error)). None if the batch could not be committed.
+    """
+    result = {"applied": [], "skipped": [], "failed": []}
+
+    try:
+        done = set(session.scalars(
+            select(JournalApplied.entry_id).where(JournalApplied.entry_id.in_([e["id"] for e in entries]))
+        ))
+
+        for entry in entries:
+            if entry["id"] in done:
+                result["skipped"].append(entry)
+                continue
+
+            try:
+                with session.begin_nested():
+                    description, result_id = _apply_journal_entry(session, entry)
+                    session.add(JournalApplied(
+                        entry_id=entry["id"], op=entry["op"], applied_at=clock_now(), result_id=result_id
+                    ))
+            except (LookupError, StateConflict) as e:
+                result["failed"].append((entry, str(e)))
+                continue
+            except IntegrityError as e:
+                result["failed"].append((entry, str(e.orig)))
+                continue
+
+            done.add(entry["id"])
+            result["applied"].append((entry, description))
+
+        session.commit()
+        return result
+
     except SQLAlchemyError as e:
+        session.rollback()
         print(f"Database error: {e}")
-        return []
\ No newline at end of file
+        return None
+
+
+# ============================================================
+# CHANGE EXPORT
+# ============================================================
+
+# Tables `oee export changes` can export, in foreign key order, so a warehouse that
+# loads them in this order always has the referenced rows
+CHANGE_TABLES = {
+    "machines": Machine,
+    "shifts": Shift,
+    "operators": Operator,
+    "reason_codes": ReasonCode,
+    "production_runs": ProductionRun,
+    "downtime_events": DowntimeEvent,
+}
+
+
+def get_change_horizon(session: Session, lag_seconds: float = 0) -> datetime:
+    """
+    The database clock minus lag_seconds: the upper bound of a change export.
+    Rows are stamped when written but only visible once committed, so the lag must
+    cover the longest write transaction or a late commit could fall behind a
+    watermark already exported. Database errors are raised, not printed.
+    """
+    return session.scalar(select(add_seconds(clock_now(), -lag_seconds)))
+
+
+def get_export_watermark(session: Session, name: str, table: str) -> ExportWatermark | None:
+    """
+    The last recorded export of table with this name, or None if there was none.
+    Database errors are raised, not printed.
+    """
+    return session.get(ExportWatermark, (name, table))
+
+
+def iter_changed_rows(
+    session: Session,
+    table: str,
+    since: datetime | None,
+    until: datetime,
+    batch_size: int = 1000,
+) -> Iterator[dict]:
+    """
+    Stream rows of one of CHANGE_TABLES whose updated_at is after since (all rows if
+    since is None) and not after until, oldest change first, batch_size rows at a
+    time. Database errors are raised, not printed, so a failed export is never taken
+    for a complete one and its watermark never recorded.
+    """
+    model = CHANGE_TABLES[table]
+    if since is None:
+        # Rows never stamped (databases created without the migrations) only go out here
+        criteria = [or_(model.updated_at == None, model.updated_at <= until)]
+    else:
+        criteria = [model.updated_at > since, model.updated_at <= until]
+
+    statement = (
+        select(model.__table__)
+        .where(*criteria)
+        .order_by(model.updated_at, *model.__table__.primary_key.columns)
+        .execution_options(yield_per=batch_size)
+    )
+    yield from session.execute(statement).mappings()
+
+
+def iter_deleted_rows(
+    session: Session,
+    table: str,
+    since: datetime,
+    until: datetime,
+    batch_size: int = 1000,
+) -> Iterator[dict]:
+    """
+    Stream the rows of one of CHANGE_TABLES deleted after since and not after until,
+    oldest first, as recorded by the deleted_rows triggers. Each has the table's
+    columns, all None except the primary key and updated_at, which is the time of
+    the delete. Database errors are raised, not printed.
+    """
+    columns = CHANGE_TABLES[table].__table__.columns
+    key = next(column for column in columns if column.primary_key)
+    statement = (
+        select(DeletedRow.row_key, DeletedRow.deleted_at)
+        .where(DeletedRow.table_name == table, DeletedRow.deleted_at > since, DeletedRow.deleted_at <= until)
+        .order_by(DeletedRow.deleted_at, DeletedRow.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for row_key, deleted_at in session.execute(statement):
+        row = dict.fromkeys(columns.keys())
+        row[key.name] = key.type.python_type(row_key)
+        row["updated_at"] = deleted_at
+        yield row
+
+
+def record_export_watermark(session: Session, name: str, watermark: datetime, rows: dict[str, int]) -> bool:
+    """
+    Record that the export name sent every change up to watermark of the tables in
+    rows (table name -> rows sent), in one transaction. Other tables keep their
+    watermark. Returns True on success.
+    """
+    try:
+        exported_at = clock_now()
+        for table, count in rows.items():
+            session.merge(ExportWatermark(
+                name=name, table_name=table, watermark=watermark, exported_at=exported_at, rows=count
+            ))
+        session.commit()
+        return True
+    except SQLAlchemyError as e:
+        session.rollback()
+        print(f"Database error: {e}")
+        return False
@@ -1,6 +1,12 @@
 import os
+import math
+import sqlite3
+from contextlib import contextmanager
+from typing import Iterator
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.engine import Connection
 from sqlalchemy.orm import sessionmaker, Session
 
 load_dotenv()
@@ -9,10 +15,197 @@ DATABASE_URL = os.environ.get("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is required")
 
-engine = create_engine(DATABASE_URL, echo=False)
+# Optional read replica for reports and lists; writes always use DATABASE_URL
+REPORTING_DATABASE_URL = os.environ.get("REPORTING_DATABASE_URL") or DATABASE_URL
+
+
+def _env_int(name: str) -> int | None:
+    """Read an integer environment variable, None if unset."""
+    value = os.environ.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, got '{value}'")
+
+
+def _env_bool(name: str) -> bool | None:
+    """Read a boolean environment variable (1/true/yes or 0/false/no), None if unset."""
+    value = os.environ.get(name)
+    if not value:
+        return None
+    if value.lower() in ("1", "true", "yes"):
+        return True
+    if value.lower() in ("0", "false", "no"):
+        return False
+    raise ValueError(f"{name} must be true or false, got '{value}'")
+
+
+def _engine_options(url: str) -> dict:
+    """
+    create_engine options from the environment:
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_RECYCLE (seconds),
+    DB_STATEMENT_TIMEOUT (milliseconds, PostgreSQL) and DB_APPLICATION_NAME (PostgreSQL).
+    Unset variables keep the SQLAlchemy defaults.
+    """
+    options = {
+        "pool_size": _env_int("DB_POOL_SIZE"),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW"),
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING"),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE"),
+    }
+    options = {key: value for key, value in options.items() if value is not None}
+
+    if url.startswith("postgresql"):
+        connect_args = {}
+        statement_timeout = _env_int("DB_STATEMENT_TIMEOUT")
+        if statement_timeout is not None:
+            connect_args["options"] = f"-c statement_timeout={statement_timeout}"
+        connect_args["application_name"] = os.environ.get("DB_APPLICATION_NAME") or "oee-tracker"
+        options["connect_args"] = connect_args
+
+    return options
+
+
+def _configure_sqlite(engine, read_only: bool = False):
+    """
+    Set up every SQLite connection: WAL so readers do not block the writer, enforced
+    foreign keys (for ON DELETE CASCADE), a busy timeout instead of immediate
+    "database is locked" errors, and ln/floor for SQLite builds without math functions.
+    read_only sets query_only, the SQLite counterpart of a read-only transaction.
+    The driver's own transaction handling is switched off and BEGIN is emitted
+    explicitly, so SAVEPOINTs nest inside the outer transaction.
+    """
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        try:
+            cursor.execute("SELECT ln(1), floor(1)")
+        except sqlite3.OperationalError:
+            dbapi_connection.create_function("ln", 1, math.log, deterministic=True)
+            dbapi_connection.create_function("floor", 1, math.floor, deterministic=True)
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def on_begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+
+engine = create_engine(DATABASE_URL, echo=False, **_engine_options(DATABASE_URL))
 SessionLocal = sessionmaker(bind=engine)
 
+if engine.dialect.name == "sqlite":
+    _configure_sqlite(engine)
+
+
+def create_reporting_engine(url: str, connect_timeout: int | None = None):
+    """
+    Read-only engine for url, configured like the main engine.
+    connect_timeout (seconds, PostgreSQL) gives up on an unreachable server.
+    """
+    options = _engine_options(url)
+    if connect_timeout is not None and url.startswith("postgresql"):
+        options["connect_args"]["connect_timeout"] = connect_timeout
+
+    reporting = create_engine(url, echo=False, **options)
+    if reporting.dialect.name == "sqlite":
+        _configure_sqlite(reporting, read_only=True)
+    if reporting.dialect.name == "postgresql":
+        reporting = reporting.execution_options(postgresql_readonly=True)
+    return reporting
+
+
+# Own engine (and pool) even without a replica, so read-only connections never serve writes
+reporting_engine = create_reporting_engine(REPORTING_DATABASE_URL)
+ReportingSessionLocal = sessionmaker(bind=reporting_engine)
+
+
+def set_statement_timeout(session: Session, timeout: float):
+    """
+    Cancel any statement of this session that runs longer than timeout seconds.
+    Applied with SET LOCAL at the start of each transaction, so it never outlives
+    the session on a pooled connection. PostgreSQL only; ignored elsewhere.
+    """
+    if session.get_bind().dialect.name != "postgresql":
+        return
+
+    @event.listens_for(session, "after_begin")
+    def apply_timeout(session, transaction, connection):
+        connection.execute(text(f"SET LOCAL statement_timeout = {int(timeout * 1000)}"))
+
+
+# Set by shared_connection() while a batch of commands runs
+_shared_connection: Connection | None = None
+
+
+@contextmanager
+def shared_connection(atomic: bool = False) -> Iterator[Connection]:
+    """
+    Run several commands on one connection: while active, get_session() and
+    get_reporting_session() return sessions bound to it with expire_on_commit off.
+    With atomic, everything runs in one transaction. Each session commit only
+    releases a savepoint, and the transaction is committed when the block exits
+    cleanly (rolled back on an exception).
+    """
+    global _shared_connection
+
+    with engine.connect() as connection:
+        transaction = connection.begin() if atomic else None
+        _shared_connection = connection
+        try:
+            yield connection
+            if transaction is not None:
+                transaction.commit()
+        finally:
+            _shared_connection = None
+            if transaction is not None and transaction.is_active:
+                transaction.rollback()
+
+
+def _shared_session() -> Session:
+    """Session on the shared connection, joining its transaction through a savepoint."""
+    return Session(
+        bind=_shared_connection,
+        join_transaction_mode="create_savepoint",
+        expire_on_commit=False,
+    )
+
 
 def get_session() -> Session:
     """Get a new database session."""
-    return SessionLocal()
\ No newline at end of file
+    if _shared_connection is not None:
+        return _shared_session()
+    return SessionLocal()
+
+
+def is_reachable(session: Session) -> bool:
+    """True if the session can get a connection to its database."""
+    try:
+        session.connection()
+        return True
+    except OperationalError:
+        session.rollback()
+        return False
+
+
+def get_reporting_session(timeout: float | None = None) -> Session:
+    """
+    Get a new read-only session for reports and lists (replica if REPORTING_DATABASE_URL is set).
+    timeout cancels statements running longer than that many seconds.
+    """
+    if _shared_connection is not None:
+        # Inside a batch, reads must see the batch's own uncommitted writes
+        session = _shared_session()
+    else:
+        session = ReportingSessionLocal()
+    if timeout is not None:
+        set_statement_timeout(session, timeout)
+    return session
@@ -0,0 +1,141 @@
+"""
+In-process cache of the dimension tables: machines, shifts, operators and reason codes.
+
+These tables are small and rarely change, so all four are loaded together in one query
+and reused for DIMENSION_CACHE_TTL seconds (default 300) by reports and ingest paths.
+Writes through crud call invalidate(), which bumps a version counter so the next lookup
+reloads. Changes made by other processes are picked up when the TTL runs out, or at once
+when a lookup misses.
+"""
+
+import os
+import time
+
+from sqlalchemy import select, union_all, literal, cast, String, Float, Boolean
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+
+from oee_tracker.models import Machine, Shift, Operator, ReasonCode
+
+TTL = float(os.environ.get("DIMENSION_CACHE_TTL") or 300)
+
+KINDS = ("machine", "shift", "operator", "reason_code")
+
+# Bumped by invalidate(); a snapshot loaded at an older version is stale
+_version = 0
+_snapshot: "DimensionSnapshot | None" = None
+
+
+class DimensionSnapshot:
+    """All dimension rows as plain dicts keyed by kind, then id (or code for reason codes)."""
+
+    def __init__(self, version: int):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.rows: dict[str, dict] = {kind: {} for kind in KINDS}
+
+    def is_fresh(self) -> bool:
+        """True if no write invalidated it and the TTL has not run out."""
+        return self.version == _version and time.monotonic() - self.loaded_at < TTL
+
+
+def _load(session: Session) -> DimensionSnapshot:
+    """Read all four tables in a single UNION ALL query."""
+    no_cycle_time = literal(None, Float)
+    no_location = literal(None, String)
+    no_planned = literal(None, Boolean)
+
+    statement = union_all(
+        select(literal("machine"), cast(Machine.id, String), Machine.name, Machine.ideal_cycle_time, Machine.location, no_planned),
+        select(literal("shift"), cast(Shift.id, String), Shift.name, no_cycle_time, no_location, no_planned),
+        select(literal("operator"), cast(Operator.id, String), Operator.name, no_cycle_time, no_location, no_planned),
+        select(literal("reason_code"), ReasonCode.code, ReasonCode.description, no_cycle_time, no_location, ReasonCode.is_planned),
+    )
+
+    snapshot = DimensionSnapshot(_version)
+    for kind, key, name, ideal_cycle_time, location, is_planned in session.execute(statement):
+        if kind == "machine":
+            row = {"id": int(key), "name": name, "ideal_cycle_time": ideal_cycle_time, "location": location}
+        elif kind == "reason_code":
+            row = {"code": key, "description": name, "is_planned": bool(is_planned)}
+        else:
+            row = {"id": int(key), "name": name}
+        snapshot.rows[kind][row.get("id", key)] = row
+
+    return snapshot
+
+
+def invalidate():
+    """Mark the cache stale; called by crud after any dimension write."""
+    global _version
+    _version += 1
+
+
+def get_dimensions(session: Session, refresh: bool = False) -> DimensionSnapshot | None:
+    """The current snapshot, reloaded if stale or refresh is set. None on a database error."""
+    global _snapshot
+
+    if refresh or _snapshot is None or not _snapshot.is_fresh():
+        try:
+            _snapshot = _load(session)
+        except SQLAlchemyError as e:
+            session.rollback()
+            print(f"Database error: {e}")
+            return None
+
+    return _snapshot
+
+
+def lookup(session: Session, kind: str, key) -> dict | None:
+    """
+    One dimension row as a dict, e.g. lookup(session, "machine", 3).
+    A miss reloads once in case the row was added by another process.
+    Returns None if it does not exist.
+    """
+    cached = _snapshot
+    snapshot = get_dimensions(session)
+    if snapshot is None:
+        return None
+
+    row = snapshot.rows[kind].get(key)
+    # Only reload if this snapshot was not just loaded
+    if row is None and snapshot is cached:
+        snapshot = get_dimensions(session, refresh=True)
+        row = snapshot.rows[kind].get(key) if snapshot else None
+    return row
+
+
+def exists(session: Session, kind: str, key) -> bool | None:
+    """
+    Whether a dimension row exists, reloading once on a miss like lookup().
+    None if the cache could not be loaded, so it is unknown.
+    """
+    cached = _snapshot
+    snapshot = get_dimensions(session)
+    if snapshot is None:
+        return None
+
+    if key in snapshot.rows[kind]:
+        return True
+    if snapshot is not cached:
+        return False
+    snapshot = get_dimensions(session, refresh=True)
+    return key in snapshot.rows[kind] if snapshot else None
+
+
+def names(session: Session, kind: str) -> dict:
+    """Display names of one kind keyed by id (descriptions for reason codes)."""
+    snapshot = get_dimensions(session)
+    if snapshot is None:
+        return {}
+
+    label = "description" if kind == "reason_code" else "name"
+    return {key: row[label] for key, row in snapshot.rows[kind].items()}
+
+
+def name(session: Session, kind: str, key) -> str:
+    """Display name of one row, or a placeholder like 'Machine 3' if unknown."""
+    row = lookup(session, kind, key)
+    if row is None:
+        return f"{kind.replace('_', ' ').capitalize()} {key}"
+    return row["description"] if kind == "reason_code" else row["name"]
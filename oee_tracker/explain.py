@@ -0,0 +1,191 @@
+"""
+Capture the SQL a command runs and explain it.
+
+capture_statements() records every SELECT sent to the database while it is active.
+explain_statement() then runs each one again under EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)
+on PostgreSQL, or EXPLAIN QUERY PLAN on SQLite. summarize() picks out the nodes worth a
+look: sequential scans, row estimates off by ESTIMATE_MISS_RATIO or more, and the nodes
+that spend the most time themselves (excluding their children).
+"""
+
+import json
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+
+# Actual vs estimated rows differing by this factor count as an estimate miss
+ESTIMATE_MISS_RATIO = 10
+
+
+def _is_select(statement: str) -> bool:
+    """True for SELECT and WITH ... SELECT statements."""
+    words = statement.lstrip("( \n").split(None, 1)
+    return bool(words) and words[0].upper() in ("SELECT", "WITH")
+
+
+@contextmanager
+def capture_statements() -> Iterator[list[dict]]:
+    """
+    Record the SELECT statements executed on any engine inside the block, as dicts
+    with sql, parameters (as sent to the driver), dialect and duration_ms.
+    """
+    statements = []
+
+    def before(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault("explain_start", []).append(time.perf_counter())
+
+    def after(connection, cursor, statement, parameters, context, executemany):
+        started = connection.info["explain_start"].pop()
+        if executemany or not _is_select(statement):
+            return
+        statements.append({
+            "sql": statement,
+            "parameters": parameters,
+            "dialect": connection.dialect.name,
+            "duration_ms": (time.perf_counter() - started) * 1000,
+        })
+
+    event.listen(Engine, "before_cursor_execute", before)
+    event.listen(Engine, "after_cursor_execute", after)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "before_cursor_execute", before)
+        event.remove(Engine, "after_cursor_execute", after)
+
+
+def explain_statement(connection: Connection, statement: dict) -> dict:
+    """
+    Explain a captured statement on connection. Returns the plan: the PostgreSQL JSON
+    plan (with Execution Time), or {"Nodes": [...]} of EXPLAIN QUERY PLAN rows on SQLite.
+    EXPLAIN ANALYZE executes the query, so only use it on SELECTs.
+    """
+    dialect = connection.dialect.name
+
+    if dialect == "postgresql":
+        plan = connection.exec_driver_sql(
+            "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement["sql"], statement["parameters"]
+        ).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]
+
+    if dialect == "sqlite":
+        rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement["sql"], statement["parameters"])
+        return {"Nodes": [{"id": row[0], "parent": row[1], "detail": row[3]} for row in rows]}
+
+    raise ValueError(f"EXPLAIN is not supported for {dialect}")
+
+
+def _plan_nodes(node: dict, depth: int = 0) -> Iterator[tuple[int, dict]]:
+    """Walk a PostgreSQL plan tree depth first."""
+    yield depth, node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child, depth + 1)
+
+
+def _node_total_ms(node: dict) -> float:
+    """Time spent in a node and its children over all loops."""
+    return node.get("Actual Total Time", 0.0) * node.get("Actual Loops", 0)
+
+
+def _node_label(node: dict) -> str:
+    """Node type with the relation or index it reads, e.g. 'Seq Scan on downtime_events'."""
+    label = node["Node Type"]
+    if "Relation Name" in node:
+        label += f" on {node['Relation Name']}"
+    if "Index Name" in node:
+        label += f" using {node['Index Name']}"
+    return label
+
+
+def _summarize_postgresql(index: int, plan: dict, summary: dict):
+    """Add one PostgreSQL plan's statement line, scans, misses and node times to summary."""
+    root = plan["Plan"]
+    summary["statements"][-1].update({
+        "planning_ms": plan.get("Planning Time"),
+        "execution_ms": plan.get("Execution Time"),
+        "shared_hit_blocks": root.get("Shared Hit Blocks"),
+        "shared_read_blocks": root.get("Shared Read Blocks"),
+    })
+
+    for _, node in _plan_nodes(root):
+        loops = node.get("Actual Loops", 0)
+        total_ms = _node_total_ms(node)
+        self_ms = max(total_ms - sum(_node_total_ms(child) for child in node.get("Plans", [])), 0.0)
+        actual_rows = node.get("Actual Rows", 0)
+        plan_rows = node.get("Plan Rows", 0)
+
+        summary["nodes"].append({
+            "statement": index,
+            "node": _node_label(node),
+            "self_ms": self_ms,
+            "total_ms": total_ms,
+        })
+
+        if node["Node Type"] == "Seq Scan":
+            summary["seq_scans"].append({
+                "statement": index,
+                "relation": node.get("Relation Name"),
+                "rows": actual_rows * loops,
+                "removed_by_filter": node.get("Rows Removed by Filter", 0) * loops,
+                "filter": node.get("Filter"),
+            })
+
+        # Per-loop rows; a never-executed node has nothing to compare
+        if loops:
+            ratio = max(actual_rows, plan_rows, 1) / max(min(actual_rows, plan_rows), 1)
+            if ratio >= ESTIMATE_MISS_RATIO:
+                summary["estimate_misses"].append({
+                    "statement": index,
+                    "node": _node_label(node),
+                    "plan_rows": plan_rows,
+                    "actual_rows": actual_rows,
+                    "ratio": ratio,
+                })
+
+
+def _summarize_sqlite(index: int, plan: dict, summary: dict, tables: set[str]):
+    """Add one SQLite query plan's full table scans to summary."""
+    for node in plan["Nodes"]:
+        words = node["detail"].split()
+        # "SCAN downtime_events" is a full table scan; "SCAN x USING INDEX" walks an index
+        if words[0] == "SCAN" and len(words) > 1 and words[1] in tables and "USING" not in words:
+            summary["seq_scans"].append({
+                "statement": index,
+                "relation": words[1],
+                "rows": None,
+                "removed_by_filter": None,
+                "filter": None,
+            })
+
+
+def summarize(statements: list[dict], plans: list[dict | None], tables: set[str], top: int = 5) -> dict:
+    """
+    Aggregate the plans of captured statements (None where EXPLAIN failed).
+    tables are the table names, used to tell table scans from subquery scans on SQLite.
+    Returns dict with statements, seq_scans, estimate_misses and slowest (top nodes by own time).
+    """
+    summary = {"statements": [], "seq_scans": [], "estimate_misses": [], "nodes": []}
+
+    for index, (statement, plan) in enumerate(zip(statements, plans), start=1):
+        summary["statements"].append({
+            "statement": index,
+            "sql": " ".join(statement["sql"].split()),
+            "duration_ms": statement["duration_ms"],
+            "explained": plan is not None,
+        })
+        if plan is None:
+            continue
+        if "Plan" in plan:
+            _summarize_postgresql(index, plan, summary)
+        else:
+            _summarize_sqlite(index, plan, summary, tables)
+
+    nodes = summary.pop("nodes")
+    summary["slowest"] = sorted(nodes, key=lambda node: node["self_ms"], reverse=True)[:top]
+    summary["estimate_misses"].sort(key=lambda miss: miss["ratio"], reverse=True)
+    return summary
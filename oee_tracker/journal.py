@@ -0,0 +1,124 @@
+"""
+Offline journal for writes made while the database is unreachable.
+
+Entries are appended as compact JSON lines and fsync'd before the command returns,
+so a queued write survives a crash or power loss. `oee sync` claims the journal by
+renaming it and replays it; new offline writes keep going to a fresh journal file in
+the meantime. Entries a sync could not replay yet stay claimed, so the next sync
+replays them before anything written since and the original order is kept.
+
+A downtime event created offline has no id until it is replayed, so it gets a local
+id (J followed by the start of its entry id) that `oee downtime stop` accepts.
+"""
+
+import json
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+JOURNAL_PATH = Path(os.environ.get("OEE_JOURNAL_PATH") or Path.home() / ".oee" / "journal.jsonl")
+SYNCING_PATH = JOURNAL_PATH.with_name(JOURNAL_PATH.name + ".syncing")
+REJECTED_PATH = JOURNAL_PATH.with_name(JOURNAL_PATH.name + ".rejected")
+
+OPS = ("run_start", "run_stop", "downtime_create", "downtime_stop")
+
+LOCAL_ID_PREFIX = "J"
+
+
+def _append_lines(path: Path, entries: list[dict]):
+    """Append entries to a journal file and fsync it."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _replace_lines(path: Path, entries: list[dict]):
+    """Replace a journal file's entries through a temporary file, so a crash keeps the old or new file whole."""
+    temporary = path.with_name(path.name + ".tmp")
+    with open(temporary, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+def _read_lines(path: Path) -> list[dict]:
+    """Read journal entries, skipping a torn last line from an interrupted write."""
+    if not path.exists():
+        return []
+
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return entries
+
+
+def append(op: str, at: datetime | None = None, **fields) -> dict:
+    """
+    Record a write in the journal with its time (default now) and a unique id.
+    Returns the entry.
+    """
+    if op not in OPS:
+        raise ValueError(f"Unknown journal operation '{op}'")
+
+    entry = {"id": uuid.uuid4().hex, "op": op, "at": (at or datetime.now()).isoformat(), **fields}
+    _append_lines(JOURNAL_PATH, [entry])
+    return entry
+
+
+def pending() -> list[dict]:
+    """Entries waiting to be synced (including a claimed but unfinished sync)."""
+    return _read_lines(SYNCING_PATH) + _read_lines(JOURNAL_PATH)
+
+
+def claim() -> list[dict]:
+    """
+    Take the journal for syncing by renaming it, so new offline writes go to a fresh
+    file. If an earlier sync was interrupted, its claimed entries are returned instead
+    (replay is idempotent) and the current journal waits for the next claim.
+    """
+    if not SYNCING_PATH.exists() and JOURNAL_PATH.exists():
+        os.replace(JOURNAL_PATH, SYNCING_PATH)
+    return _read_lines(SYNCING_PATH)
+
+
+def release(remaining: list[dict], rejected: list[dict] | None = None):
+    """
+    Finish a sync: move entries that can never be replayed to the rejected file.
+    Entries that still need replaying stay claimed, ahead of the journal written
+    since (claim() returns them first); without any the claim is dropped.
+    """
+    if rejected:
+        _append_lines(REJECTED_PATH, rejected)
+    if remaining:
+        _replace_lines(SYNCING_PATH, remaining)
+    else:
+        SYNCING_PATH.unlink(missing_ok=True)
+
+
+def local_id(entry: dict) -> str:
+    """Local id of a journaled downtime_create, e.g. J3f9a1c2e."""
+    return LOCAL_ID_PREFIX + entry["id"][:8]
+
+
+def is_local_id(value: str) -> bool:
+    """True if value looks like a local id rather than a database id."""
+    return value.startswith(LOCAL_ID_PREFIX) and len(value) > len(LOCAL_ID_PREFIX)
+
+
+def find_local(value: str) -> dict | None:
+    """The pending (not yet replayed) downtime_create with this local id, or None."""
+    prefix = value[len(LOCAL_ID_PREFIX):]
+    for entry in pending():
+        if entry["op"] == "downtime_create" and entry["id"].startswith(prefix):
+            return entry
+    return None
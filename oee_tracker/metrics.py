@@ -0,0 +1,232 @@
+"""
+Prometheus metrics for a long-running exporter.
+
+MetricsState keeps per-run OEE results for a rolling window in memory and is refreshed
+on a timer. A refresh only reads runs that ended since the newest end time it has seen,
+plus the open downtime counts. Every FULL_RELOAD_EVERY refreshes it reloads the whole
+window instead, which picks up runs stopped with a backdated time (e.g. by `oee sync`).
+A scrape only renders the current state; it never queries the database.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import oee_tracker.crud as crud
+from oee_tracker import dimensions
+
+FULL_RELOAD_EVERY = 20
+
+# Seconds; Prometheus-style cumulative buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+MACHINE_GAUGES = (
+    ("availability", "Average availability of runs completed in the window"),
+    ("performance", "Average performance of runs completed in the window"),
+    ("quality", "Average quality of runs completed in the window"),
+    ("oee", "Average OEE of runs completed in the window"),
+)
+
+
+def _label_value(value) -> str:
+    """Escape a label value for the text exposition format."""
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    """Render labels as {name="value",...}."""
+    return "{" + ",".join(f'{name}="{_label_value(value)}"' for name, value in labels.items()) + "}"
+
+
+class Histogram:
+    """Latency histogram with one series per label value (e.g. per function)."""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self.series: dict[str, list] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_value: str, seconds: float):
+        """Record one observation."""
+        with self.lock:
+            # [bucket counts, sum, count]
+            series = self.series.setdefault(label_value, [[0] * len(self.buckets), 0.0, 0])
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        """Exposition lines for all series."""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for label_value, (counts, total, count) in sorted(self.series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_labels(**{self.label: label_value, 'le': bound})} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_labels(**{self.label: label_value, 'le': '+Inf'})} {count}")
+                lines.append(f"{self.name}_sum{_labels(**{self.label: label_value})} {total}")
+                lines.append(f"{self.name}_count{_labels(**{self.label: label_value})} {count}")
+        return lines
+
+
+class MetricsState:
+    """Rolling-window OEE state, open downtime counts and latency histograms."""
+
+    def __init__(self, window: timedelta):
+        self.window = window
+        self.runs: dict[int, dict] = {}
+        self.open_downtime: list[dict] = []
+        self.machine_names: dict[int, str] = {}
+        self.newest_end: datetime | None = None
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.last_refresh: float | None = None
+        self.last_refresh_seconds: float | None = None
+        self.lock = threading.Lock()
+
+        self.crud_latency = Histogram("oee_crud_duration_seconds", "Time spent in crud functions", "function")
+        self.sql_latency = Histogram("oee_sql_duration_seconds", "Time spent executing SQL statements", "statement")
+
+    @contextmanager
+    def timed(self, function: str):
+        """Record the time of a crud call in the crud histogram."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.crud_latency.observe(function, time.perf_counter() - started)
+
+    def instrument_sql(self):
+        """Time every statement run by this process, labelled by its first keyword."""
+
+        @event.listens_for(Engine, "before_cursor_execute")
+        def before(connection, cursor, statement, parameters, context, executemany):
+            connection.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+        @event.listens_for(Engine, "after_cursor_execute")
+        def after(connection, cursor, statement, parameters, context, executemany):
+            started = connection.info["metrics_start"].pop()
+            keyword = statement.lstrip("( \n").split(None, 1)[0].lower() if statement.strip() else "other"
+            self.sql_latency.observe(keyword, time.perf_counter() - started)
+
+    def refresh(self, session: Session) -> bool:
+        """
+        Read what changed since the last refresh and update the state.
+        Returns False (keeping the previous state) on a database error.
+        """
+        started = time.perf_counter()
+        # The database clock, like the stored end times, not this host's
+        now = crud.get_database_time(session)
+        if now is None:
+            with self.lock:
+                self.refresh_errors += 1
+            return False
+        window_start = now - self.window
+        full = self.newest_end is None or self.refreshes % FULL_RELOAD_EVERY == 0
+        since = window_start if full else max(self.newest_end, window_start)
+
+        with self.timed("get_completed_run_metrics"):
+            runs = crud.get_completed_run_metrics(session, since)
+        with self.timed("count_open_downtime_by_reason"):
+            open_downtime = crud.count_open_downtime_by_reason(session)
+        machine_names = dimensions.names(session, "machine")
+
+        if runs is None or open_downtime is None:
+            with self.lock:
+                self.refresh_errors += 1
+            return False
+
+        with self.lock:
+            if full:
+                self.runs = {}
+            for run in runs:
+                self.runs[run["run_id"]] = run
+            self.runs = {
+                run_id: run for run_id, run in self.runs.items()
+                if run["actual_end_time"] >= window_start
+            }
+            if self.runs:
+                self.newest_end = max(run["actual_end_time"] for run in self.runs.values())
+            elif self.newest_end is None:
+                self.newest_end = window_start
+            self.open_downtime = open_downtime
+            self.machine_names = machine_names or self.machine_names
+            self.refreshes += 1
+            self.last_refresh = time.time()
+            self.last_refresh_seconds = time.perf_counter() - started
+
+        return True
+
+    def machine_averages(self) -> dict[int, dict]:
+        """Per-machine averages over scored runs, like the OEE reports."""
+        totals = {}
+        for run in self.runs.values():
+            if run["oee"] is None:
+                continue
+            machine = totals.setdefault(run["machine_id"], {"runs": 0, **{name: 0.0 for name, _ in MACHINE_GAUGES}})
+            machine["runs"] += 1
+            for name, _ in MACHINE_GAUGES:
+                machine[name] += run[name]
+
+        return {
+            machine_id: {"runs": machine["runs"], **{name: machine[name] / machine["runs"] for name, _ in MACHINE_GAUGES}}
+            for machine_id, machine in totals.items()
+        }
+
+    def render(self) -> str:
+        """The full text exposition."""
+        lines = []
+
+        with self.lock:
+            averages = self.machine_averages()
+            names = dict(self.machine_names)
+            open_downtime = list(self.open_downtime)
+            window_hours = self.window.total_seconds() / 3600
+
+            for name, help_text in MACHINE_GAUGES:
+                metric = f"oee_machine_{name}"
+                lines.append(f"# HELP {metric} {help_text} (last {window_hours:g} hours)")
+                lines.append(f"# TYPE {metric} gauge")
+                for machine_id, machine in sorted(averages.items()):
+                    labels = _labels(machine_id=machine_id, machine=names.get(machine_id, machine_id))
+                    lines.append(f"{metric}{labels} {machine[name]}")
+
+            lines.append("# HELP oee_machine_runs Scored runs completed in the window")
+            lines.append("# TYPE oee_machine_runs gauge")
+            for machine_id, machine in sorted(averages.items()):
+                labels = _labels(machine_id=machine_id, machine=names.get(machine_id, machine_id))
+                lines.append(f"oee_machine_runs{labels} {machine['runs']}")
+
+            lines.append("# HELP oee_open_downtime_events Downtime events currently open")
+            lines.append("# TYPE oee_open_downtime_events gauge")
+            for row in open_downtime:
+                labels = _labels(reason_code=row["reason_code"], planned=str(bool(row["is_planned"])).lower())
+                lines.append(f"oee_open_downtime_events{labels} {row['count']}")
+
+            lines.append("# HELP oee_metrics_refreshes_total Successful state refreshes")
+            lines.append("# TYPE oee_metrics_refreshes_total counter")
+            lines.append(f"oee_metrics_refreshes_total {self.refreshes}")
+            lines.append("# HELP oee_metrics_refresh_errors_total Refreshes that failed with a database error")
+            lines.append("# TYPE oee_metrics_refresh_errors_total counter")
+            lines.append(f"oee_metrics_refresh_errors_total {self.refresh_errors}")
+            if self.last_refresh is not None:
+                lines.append("# HELP oee_metrics_last_refresh_timestamp_seconds Unix time of the last successful refresh")
+                lines.append("# TYPE oee_metrics_last_refresh_timestamp_seconds gauge")
+                lines.append(f"oee_metrics_last_refresh_timestamp_seconds {self.last_refresh}")
+                lines.append("# HELP oee_metrics_last_refresh_duration_seconds Time the last refresh took")
+                lines.append("# TYPE oee_metrics_last_refresh_duration_seconds gauge")
+                lines.append(f"oee_metrics_last_refresh_duration_seconds {self.last_refresh_seconds}")
+
+        lines += self.crud_latency.render()
+        lines += self.sql_latency.render()
+        return "\n".join(lines) + "\n"
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import String, Integer, Float, Boolean, ForeignKey, DateTime
+from sqlalchemy import String, Integer, Float, Boolean, ForeignKey, DateTime, FetchedValue
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -14,6 +14,9 @@ class Machine(Base):
     name: Mapped[str] = mapped_column(String, nullable=False)
     ideal_cycle_time: Mapped[float] = mapped_column(Float, nullable=False)
     location: Mapped[str | None] = mapped_column(String)
+    updated_at: Mapped[datetime | None] = mapped_column(
+        DateTime, server_default=FetchedValue(), server_onupdate=FetchedValue(), index=True
+    )
 
     production_runs: Mapped[list["ProductionRun"]] = relationship(back_populates="machine")
 
@@ -23,6 +26,9 @@ class Shift(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String, nullable=False)
+    updated_at: Mapped[datetime | None] = mapped_column(
+        DateTime, server_default=FetchedValue(), server_onupdate=FetchedValue(), index=True
+    )
 
     production_runs: Mapped[list["ProductionRun"]] = relationship(back_populates="shift")
 
@@ -32,6 +38,9 @@ class Operator(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String, nullable=False)
+    updated_at: Mapped[datetime | None] = mapped_column(
+        DateTime, server_default=FetchedValue(), server_onupdate=FetchedValue(), index=True
+    )
 
     production_runs: Mapped[list["ProductionRun"]] = relationship(back_populates="operator")
 
@@ -42,6 +51,9 @@ class ReasonCode(Base):
     code: Mapped[str] = mapped_column(String, primary_key=True)
     description: Mapped[str] = mapped_column(String, nullable=False)
     is_planned: Mapped[bool] = mapped_column(Boolean, default=False)
+    updated_at: Mapped[datetime | None] = mapped_column(
+        DateTime, server_default=FetchedValue(), server_onupdate=FetchedValue(), index=True
+    )
 
     downtime_events: Mapped[list["DowntimeEvent"]] = relationship(back_populates="reason")
 
@@ -59,6 +71,9 @@ class ProductionRun(Base):
     actual_end_time: Mapped[datetime | None] = mapped_column(DateTime)
     good_parts_count: Mapped[int | None] = mapped_column(Integer)
     rejected_parts_count: Mapped[int | None] = mapped_column(Integer)
+    updated_at: Mapped[datetime | None] = mapped_column(
+        DateTime, server_default=FetchedValue(), server_onupdate=FetchedValue(), index=True
+    )
 
     machine: Mapped["Machine"] = relationship(back_populates="production_runs")
     shift: Mapped["Shift"] = relationship(back_populates="production_runs")
@@ -74,6 +89,72 @@ class DowntimeEvent(Base):
     reason_code: Mapped[str] = mapped_column(ForeignKey("reason_codes.code", ondelete="CASCADE"))
     start_time: Mapped[datetime | None] = mapped_column(DateTime)
     end_time: Mapped[datetime | None] = mapped_column(DateTime)
+    updated_at: Mapped[datetime | None] = mapped_column(
+        DateTime, server_default=FetchedValue(), server_onupdate=FetchedValue(), index=True
+    )
 
     production_run: Mapped["ProductionRun"] = relationship(back_populates="downtime_events")
-    reason: Mapped["ReasonCode"] = relationship(back_populates="downtime_events")
\ No newline at end of file
+    reason: Mapped["ReasonCode"] = relationship(back_populates="downtime_events")
+
+class ProductionRunArchive(Base):
+    """Completed production runs moved out of production_runs by `oee maintenance archive`."""
+    __tablename__ = "production_runs_archive"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    machine_id: Mapped[int] = mapped_column(ForeignKey("machines.id", ondelete="CASCADE"))
+    shift_id: Mapped[int] = mapped_column(ForeignKey("shifts.id", ondelete="CASCADE"))
+    operator_id: Mapped[int] = mapped_column(ForeignKey("operators.id", ondelete="CASCADE"))
+    planned_start_time: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    planned_end_time: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    actual_start_time: Mapped[datetime | None] = mapped_column(DateTime, index=True)
+    actual_end_time: Mapped[datetime | None] = mapped_column(DateTime)
+    good_parts_count: Mapped[int | None] = mapped_column(Integer)
+    rejected_parts_count: Mapped[int | None] = mapped_column(Integer)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+
+class DowntimeEventArchive(Base):
+    """Downtime events of archived production runs."""
+    __tablename__ = "downtime_events_archive"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    production_run_id: Mapped[int] = mapped_column(
+        ForeignKey("production_runs_archive.id", ondelete="CASCADE"), index=True
+    )
+    reason_code: Mapped[str] = mapped_column(ForeignKey("reason_codes.code", ondelete="CASCADE"))
+    start_time: Mapped[datetime | None] = mapped_column(DateTime)
+    end_time: Mapped[datetime | None] = mapped_column(DateTime)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+
+class JournalApplied(Base):
+    """Offline journal entries already replayed by `oee sync`, so replays are idempotent."""
+    __tablename__ = "journal_applied"
+
+    entry_id: Mapped[str] = mapped_column(String, primary_key=True)
+    op: Mapped[str] = mapped_column(String, nullable=False)
+    applied_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    # Id of the downtime event a downtime_create made, for stops that refer to its local id
+    result_id: Mapped[int | None] = mapped_column(Integer)
+
+
+class ExportWatermark(Base):
+    """Where the last `oee export changes` of each named export stopped, per table."""
+    __tablename__ = "export_watermarks"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    table_name: Mapped[str] = mapped_column(String, primary_key=True)
+    watermark: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    exported_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    rows: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class DeletedRow(Base):
+    """Key of a row deleted from a table `oee export changes` exports, written by a trigger."""
+    __tablename__ = "deleted_rows"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    table_name: Mapped[str] = mapped_column(String, nullable=False)
+    # The primary key as text (reason_codes.code, the id of the other tables)
+    row_key: Mapped[str] = mapped_column(String, nullable=False)
+    deleted_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
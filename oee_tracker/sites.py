@@ -0,0 +1,192 @@
+"""
+Reports across several plant databases, one per site, listed in a TOML file:
+
+    timeout = 30                          # seconds per site (default 30)
+
+    [sites.detroit]
+    url = "postgresql+psycopg2://oee@db-detroit/oee"
+
+    [sites.monterrey]
+    url_env = "MONTERREY_DATABASE_URL"    # take the URL from the environment
+    timeout = 60
+
+query_sites() queries every site in its own thread with its own read-only engine. A
+site that has not answered within its timeout is left out and reported, so one slow
+plant never holds up the others; on PostgreSQL its statements are also cancelled by a
+statement timeout. Sites return sums and counts, which are merged before any average
+is taken, so a plant weighs in with its number of runs rather than as one average.
+"""
+
+import os
+import threading
+import time
+import tomllib
+
+from sqlalchemy.orm import Session
+
+import oee_tracker.db as db
+
+DEFAULT_TIMEOUT = 30.0
+
+OEE_SUMS = ("availability", "performance", "quality", "oee")
+
+
+class Site:
+    """One plant database."""
+
+    def __init__(self, name: str, url: str, timeout: float):
+        self.name = name
+        self.url = url
+        self.timeout = timeout
+
+
+class SiteResult:
+    """Rows returned by one site, or why there are none."""
+
+    def __init__(self, site: str, rows: list[dict] | None = None, error: str | None = None, seconds: float | None = None):
+        self.site = site
+        self.rows = rows
+        self.error = error
+        self.seconds = seconds
+
+
+def load_sites(path: str, timeout: float | None = None) -> list[Site]:
+    """
+    Read the sites file. timeout overrides the timeouts in the file.
+    Raises ValueError for a file that cannot be used.
+    """
+    try:
+        with open(path, "rb") as f:
+            config = tomllib.load(f)
+    except OSError as e:
+        raise ValueError(f"Cannot read {path}: {e.strerror}")
+    except tomllib.TOMLDecodeError as e:
+        raise ValueError(f"Invalid TOML in {path}: {e}")
+
+    default_timeout = float(config.get("timeout", DEFAULT_TIMEOUT))
+    sites = []
+    for name, settings in config.get("sites", {}).items():
+        url = settings.get("url")
+        if url is None and "url_env" in settings:
+            url = os.environ.get(settings["url_env"])
+            if not url:
+                raise ValueError(f"Site '{name}': environment variable {settings['url_env']} is not set")
+        if not url:
+            raise ValueError(f"Site '{name}' needs url or url_env")
+        site_timeout = timeout if timeout is not None else float(settings.get("timeout", default_timeout))
+        sites.append(Site(name, url, site_timeout))
+
+    if not sites:
+        raise ValueError(f"No [sites.<name>] tables in {path}")
+    return sites
+
+
+def _query_site(site: Site, query, outcomes: dict):
+    """Run query(session) against one site and store (rows, error, seconds) in outcomes."""
+    started = time.monotonic()
+    engine = None
+    try:
+        engine = db.create_reporting_engine(site.url, connect_timeout=max(int(site.timeout), 1))
+        session = Session(bind=engine)
+        db.set_statement_timeout(session, site.timeout)
+        try:
+            rows = query(session)
+        finally:
+            session.close()
+        error = None if rows is not None else "database error"
+    except Exception as e:
+        # A bad URL or missing driver only takes out this site
+        rows, error = None, str(e)
+    finally:
+        if engine is not None:
+            engine.dispose()
+    outcomes[site.name] = (rows, error, time.monotonic() - started)
+
+
+def query_sites(sites: list[Site], query) -> list[SiteResult]:
+    """
+    Run query(session) against every site concurrently; query returns a list of row
+    dicts, or None on a database error (like the crud functions). Each site is waited
+    for at most its timeout, counted from the start. Results are in the sites' order.
+    """
+    outcomes = {}
+    started = time.monotonic()
+    threads = []
+    for site in sites:
+        # Daemon threads, so a site that never answers cannot keep the process alive
+        thread = threading.Thread(target=_query_site, args=(site, query, outcomes), daemon=True)
+        thread.start()
+        threads.append((site, thread))
+
+    results = []
+    for site, thread in threads:
+        thread.join(max(site.timeout - (time.monotonic() - started), 0))
+        if thread.is_alive():
+            results.append(SiteResult(site.name, error=f"timed out after {site.timeout:g}s", seconds=site.timeout))
+        else:
+            rows, error, seconds = outcomes[site.name]
+            results.append(SiteResult(site.name, rows, error, seconds))
+    return results
+
+
+def merge_oee_totals(results: list[SiteResult], by: tuple[str, ...]) -> list[dict]:
+    """
+    Merge per-site rows of crud.get_oee_totals, grouped by the fields in by: "site"
+    and/or "name" (e.g. ("site", "name") for machines, ("name",) for shifts of the
+    same name across plants, () for one total). Averages are taken from the merged
+    sums and counts. Sorted by avg_oee, best first; groups without a scored run are
+    left out.
+    """
+    merged = {}
+    for result in results:
+        for row in result.rows or []:
+            fields = {"site": result.site, "name": row["name"]}
+            group = tuple(fields[field] for field in by)
+            entry = merged.setdefault(group, {
+                **{field: fields[field] for field in by},
+                "sites": set(), "runs_total": 0, "runs_included": 0,
+                **{f"sum_{name}": 0.0 for name in OEE_SUMS},
+            })
+            entry["sites"].add(result.site)
+            entry["runs_total"] += row["runs_total"]
+            entry["runs_included"] += row["runs_included"]
+            for name in OEE_SUMS:
+                entry[f"sum_{name}"] += row[f"sum_{name}"] or 0.0
+
+    rows = []
+    for entry in merged.values():
+        runs = entry["runs_included"]
+        if not runs:
+            continue
+        sums = {name: entry.pop(f"sum_{name}") for name in OEE_SUMS}
+        entry["sites"] = len(entry["sites"])
+        rows.append({**entry, **{f"avg_{name}": sums[name] / runs for name in OEE_SUMS}})
+
+    return sorted(rows, key=lambda row: row["avg_oee"], reverse=True)
+
+
+def merge_downtime_totals(results: list[SiteResult], limit: int | None = None) -> list[dict]:
+    """
+    Merge per-site rows of crud.get_downtime_reason_totals by reason code, summing
+    minutes and events. Every site returns all its reasons, so the top limit is taken
+    over the merged totals. Sorted by total_duration_minutes, largest first.
+    """
+    merged = {}
+    for result in results:
+        for row in result.rows or []:
+            entry = merged.setdefault(row["reason_code"], {
+                "reason_code": row["reason_code"],
+                "description": row["description"],
+                "is_planned": row["is_planned"],
+                "sites": set(),
+                "events": 0,
+                "total_duration_minutes": 0.0,
+            })
+            entry["sites"].add(result.site)
+            entry["events"] += row["events"]
+            entry["total_duration_minutes"] += row["total_duration_minutes"] or 0.0
+
+    rows = sorted(merged.values(), key=lambda row: row["total_duration_minutes"], reverse=True)
+    for row in rows:
+        row["sites"] = len(row["sites"])
+    return rows[:limit] if limit is not None else rows
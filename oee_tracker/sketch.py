@@ -0,0 +1,157 @@
+"""
+Mergeable histogram sketch for approximate percentiles.
+
+Values are counted into fixed bins (linear or logarithmic), so the bin index can be
+computed in SQL and only one row per occupied bin leaves the database. Each bin also
+keeps the sum of its values, so a bin stands for the mean of its values rather than
+its midpoint. Sketches with the same bin layout merge by adding counts and sums.
+"""
+
+import math
+
+from sqlalchemy import func, cast, Integer
+
+from oee_tracker.sqlcompat import greatest
+
+
+class HistogramSketch:
+    """Fixed-bin histogram with count, sum and sum of squares."""
+
+    def __init__(self, bin_width: float, log_scale: bool = False, log_offset: float = 1.0):
+        """
+        bin_width is in value units for linear bins, or in natural-log units of
+        value + log_offset for log bins. Log bins are for values >= 0: they are about
+        bin_width * log_offset wide near 0 and widen in proportion to larger values.
+        """
+        self.bin_width = bin_width
+        self.log_scale = log_scale
+        self.log_offset = log_offset
+        self.bins: dict[int, int] = {}
+        self.bin_totals: dict[int, float] = {}
+        self.count = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+
+    def bin_index(self, value: float) -> int:
+        """Bin index for a value."""
+        if self.log_scale:
+            return math.floor(math.log(max(value, 0.0) + self.log_offset) / self.bin_width)
+        return math.floor(value / self.bin_width)
+
+    def sql_bin_index(self, column):
+        """SQL expression for the bin index of a column, matching bin_index."""
+        if self.log_scale:
+            return cast(func.floor(func.ln(greatest(column, 0.0) + self.log_offset) / self.bin_width), Integer)
+        return cast(func.floor(column / self.bin_width), Integer)
+
+    def bin_bounds(self, index: int) -> tuple[float, float]:
+        """Lower and upper value of a bin."""
+        if self.log_scale:
+            return (
+                math.exp(index * self.bin_width) - self.log_offset,
+                math.exp((index + 1) * self.bin_width) - self.log_offset,
+            )
+        return index * self.bin_width, (index + 1) * self.bin_width
+
+    def add(self, value: float, count: int = 1):
+        """Add a value."""
+        self.add_bin(self.bin_index(value), count, value * count, value * value * count)
+
+    def add_bin(self, index: int, count: int, total: float, total_squares: float):
+        """Add a pre-aggregated bin (e.g. a row from a GROUP BY bin query)."""
+        self.bins[index] = self.bins.get(index, 0) + count
+        self.bin_totals[index] = self.bin_totals.get(index, 0.0) + total
+        self.count += count
+        self.total += total
+        self.total_squares += total_squares
+
+    def merge(self, other: "HistogramSketch"):
+        """Merge another sketch with the same bin layout into this one."""
+        if (other.bin_width, other.log_scale, other.log_offset) != (self.bin_width, self.log_scale, self.log_offset):
+            raise ValueError("Cannot merge sketches with different bins")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+            self.bin_totals[index] = self.bin_totals.get(index, 0.0) + other.bin_totals.get(index, 0.0)
+        self.count += other.count
+        self.total += other.total
+        self.total_squares += other.total_squares
+
+    def mean(self) -> float | None:
+        """Mean of all values."""
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+    def stddev(self) -> float | None:
+        """Sample standard deviation of all values."""
+        return stddev_from_sums(self.count, self.total, self.total_squares)
+
+    def bin_value(self, index: int) -> float:
+        """The value a bin stands for: the mean of its values, kept inside the bin."""
+        lower, upper = self.bin_bounds(index)
+        return min(max(self.bin_totals[index] / self.bins[index], lower), upper)
+
+    def value_at(self, position: int) -> float:
+        """Approximate value at a position (0-based) in the sorted values."""
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > position:
+                return self.bin_value(index)
+        return self.bin_value(max(self.bins))
+
+    def quantile(self, q: float) -> float | None:
+        """
+        Approximate quantile, interpolated between the values at the ranks on either
+        side like percentile_cont, with each value taken as its bin's mean.
+        """
+        if self.count == 0:
+            return None
+
+        rank = q * (self.count - 1)
+        lower = math.floor(rank)
+        upper = min(lower + 1, self.count - 1)
+        lower_value = self.value_at(lower)
+        return lower_value + (self.value_at(upper) - lower_value) * (rank - lower)
+
+    def to_dict(self) -> dict:
+        """Serialize for storage or transfer."""
+        return {
+            "bin_width": self.bin_width,
+            "log_scale": self.log_scale,
+            "log_offset": self.log_offset,
+            "bins": {str(index): count for index, count in self.bins.items()},
+            "bin_totals": {str(index): total for index, total in self.bin_totals.items()},
+            "count": self.count,
+            "total": self.total,
+            "total_squares": self.total_squares,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HistogramSketch":
+        """Rebuild a sketch from to_dict output."""
+        sketch = cls(data["bin_width"], data["log_scale"], data["log_offset"])
+        sketch.bins = {int(index): count for index, count in data["bins"].items()}
+        sketch.bin_totals = {int(index): total for index, total in data["bin_totals"].items()}
+        sketch.count = data["count"]
+        sketch.total = data["total"]
+        sketch.total_squares = data["total_squares"]
+        return sketch
+
+
+def stddev_from_sums(count: int, total: float, total_squares: float) -> float | None:
+    """Sample standard deviation from count, sum and sum of squares."""
+    if count < 2:
+        return None
+    variance = (total_squares - total * total / count) / (count - 1)
+    return math.sqrt(max(variance, 0.0))
+
+
+def percentile_cont(sorted_values: list[float], q: float) -> float | None:
+    """Percentile of sorted values with linear interpolation, like SQL percentile_cont."""
+    if not sorted_values:
+        return None
+    rank = q * (len(sorted_values) - 1)
+    lower = math.floor(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
@@ -0,0 +1,178 @@
+"""
+Dialect-portable SQL expressions.
+
+PostgreSQL is the primary backend; SQLite is supported for single-machine installs and
+quick local runs. Each construct compiles to the native PostgreSQL function and to an
+equivalent SQLite expression. SQLite stores DateTime columns as
+'YYYY-MM-DD HH:MM:SS.ffffff' text, so timestamps built here use the same format and
+still compare correctly as strings.
+"""
+
+from sqlalchemy import Float, DateTime, Boolean
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import FunctionElement
+
+# strftime format matching SQLAlchemy's SQLite DateTime storage (%f gives SS.SSS)
+SQLITE_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%f"
+
+SQLITE_TRUNC_FORMATS = {
+    "hour": ("%Y-%m-%d %H:00:00.000000", ()),
+    "day": ("%Y-%m-%d 00:00:00.000000", ()),
+    # Monday on or before the date, like PostgreSQL date_trunc('week')
+    "week": ("%Y-%m-%d 00:00:00.000000", ("-6 days", "weekday 1")),
+}
+
+
+def is_postgresql(session: Session) -> bool:
+    """True if the session is bound to PostgreSQL."""
+    return session.get_bind().dialect.name == "postgresql"
+
+
+class seconds_between(FunctionElement):
+    """Seconds from start to end (float)."""
+    type = Float()
+    inherit_cache = True
+    name = "seconds_between"
+
+
+@compiles(seconds_between)
+def _seconds_between(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return f"EXTRACT(EPOCH FROM ({compiler.process(end, **kw)} - {compiler.process(start, **kw)}))"
+
+
+@compiles(seconds_between, "sqlite")
+def _seconds_between_sqlite(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return (
+        f"((julianday({compiler.process(end, **kw)}) - julianday({compiler.process(start, **kw)})) * 86400.0)"
+    )
+
+
+class add_seconds(FunctionElement):
+    """Timestamp plus a number of seconds (may be negative)."""
+    type = DateTime()
+    inherit_cache = True
+    name = "add_seconds"
+
+
+@compiles(add_seconds)
+def _add_seconds(element, compiler, **kw):
+    timestamp, seconds = list(element.clauses)
+    return f"({compiler.process(timestamp, **kw)} + make_interval(secs => {compiler.process(seconds, **kw)}))"
+
+
+@compiles(add_seconds, "sqlite")
+def _add_seconds_sqlite(element, compiler, **kw):
+    timestamp, seconds = list(element.clauses)
+    modifier = f"printf('%+f seconds', {compiler.process(seconds, **kw)})"
+    return (
+        f"(strftime('{SQLITE_DATETIME_FORMAT}', {compiler.process(timestamp, **kw)}, {modifier}) || '000')"
+    )
+
+
+class date_trunc(FunctionElement):
+    """Truncate a timestamp to the start of its hour, day or week."""
+    type = DateTime()
+    # unit is not a clause, so statements using this are not cached
+    inherit_cache = False
+    name = "date_trunc"
+
+    def __init__(self, unit: str, timestamp):
+        if unit not in SQLITE_TRUNC_FORMATS:
+            raise ValueError(f"Unsupported date_trunc unit '{unit}'")
+        self.unit = unit
+        super().__init__(timestamp)
+
+
+@compiles(date_trunc)
+def _date_trunc(element, compiler, **kw):
+    (timestamp,) = list(element.clauses)
+    return f"date_trunc('{element.unit}', {compiler.process(timestamp, **kw)})"
+
+
+@compiles(date_trunc, "sqlite")
+def _date_trunc_sqlite(element, compiler, **kw):
+    (timestamp,) = list(element.clauses)
+    trunc_format, modifiers = SQLITE_TRUNC_FORMATS[element.unit]
+    arguments = "".join(f", '{modifier}'" for modifier in modifiers)
+    return f"strftime('{trunc_format}', {compiler.process(timestamp, **kw)}{arguments})"
+
+
+class greatest(FunctionElement):
+    """Largest of the arguments."""
+    inherit_cache = True
+    name = "greatest"
+
+
+@compiles(greatest)
+def _greatest(element, compiler, **kw):
+    return f"greatest({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(greatest, "sqlite")
+def _greatest_sqlite(element, compiler, **kw):
+    # Multi-argument max() is SQLite's scalar greatest
+    return f"max({compiler.process(element.clauses, **kw)})"
+
+
+class least(FunctionElement):
+    """Smallest of the arguments."""
+    inherit_cache = True
+    name = "least"
+
+
+@compiles(least)
+def _least(element, compiler, **kw):
+    return f"least({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(least, "sqlite")
+def _least_sqlite(element, compiler, **kw):
+    # Multi-argument min() is SQLite's scalar least
+    return f"min({compiler.process(element.clauses, **kw)})"
+
+
+class prefer_postgresql(FunctionElement):
+    """
+    A condition with a PostgreSQL-specific form and a portable equivalent, e.g. a
+    range && operator that can use a GiST index, and plain comparisons elsewhere.
+    """
+    type = Boolean()
+    inherit_cache = True
+    name = "prefer_postgresql"
+    # Already a condition: no "= 1" on databases without a native boolean
+    _is_implicitly_boolean = True
+
+
+@compiles(prefer_postgresql)
+def _prefer_postgresql(element, compiler, **kw):
+    _, portable = list(element.clauses)
+    return compiler.process(portable, **kw)
+
+
+@compiles(prefer_postgresql, "postgresql")
+def _prefer_postgresql_postgresql(element, compiler, **kw):
+    postgresql, _ = list(element.clauses)
+    return compiler.process(postgresql, **kw)
+
+
+class clock_now(FunctionElement):
+    """
+    The database's current wall-clock time, as a timestamp without time zone.
+    Unlike now() on PostgreSQL it is not frozen at the start of the transaction.
+    """
+    type = DateTime()
+    inherit_cache = True
+    name = "clock_now"
+
+
+@compiles(clock_now)
+def _clock_now(element, compiler, **kw):
+    return "CAST(clock_timestamp() AS TIMESTAMP)"
+
+
+@compiles(clock_now, "sqlite")
+def _clock_now_sqlite(element, compiler, **kw):
+    return f"(strftime('{SQLITE_DATETIME_FORMAT}', 'now', 'localtime') || '000')"
@@ -0,0 +1,138 @@
+"""
+Machine state timelines built with a sweep line.
+
+crud.iter_timeline_spans streams the runs and downtime events of every machine in
+one scan ordered by machine and start time. build_timeline() walks one machine's
+spans once, keeping the spans open at the sweep position in a heap by end time. At
+each span start or end the highest-priority open span sets the state: unplanned
+downtime over planned downtime over running, and idle when nothing is open.
+Adjacent pieces in the same state are merged, so a timeline is a gapless list of
+intervals covering the whole range.
+"""
+
+import heapq
+from datetime import datetime
+from itertools import groupby
+from typing import Iterable, Iterator
+
+STATES = ("running", "planned", "unplanned", "idle")
+
+# Which state shows when spans overlap, e.g. downtime during a run
+PRIORITY = {"running": 1, "planned": 2, "unplanned": 3}
+
+BAR_SYMBOLS = {"running": "█", "planned": "▒", "unplanned": "×", "idle": "·"}
+
+
+def build_timeline(spans: Iterable, start: datetime, end: datetime) -> list[dict]:
+    """
+    Intervals of one machine from start to end, from spans (dicts or row mappings with
+    state, reason_code, start_time and end_time) sorted by start_time. Returns dicts
+    with state, reason_code (downtime only), start and end. Of overlapping spans with
+    the same priority, the one that started first wins.
+    """
+    intervals = []
+    active = []  # heap of (end_time, order, span)
+    order = 0
+    spans = iter(spans)
+    upcoming = next(spans, None)
+    position = start
+
+    while position < end:
+        while upcoming is not None and upcoming["start_time"] <= position:
+            if upcoming["end_time"] > position:
+                heapq.heappush(active, (upcoming["end_time"], order, upcoming))
+                order += 1
+            upcoming = next(spans, None)
+
+        while active and active[0][0] <= position:
+            heapq.heappop(active)
+
+        boundary = end
+        if active:
+            boundary = min(boundary, active[0][0])
+        if upcoming is not None:
+            boundary = min(boundary, upcoming["start_time"])
+
+        if active:
+            # Only a few spans are ever open at once, so a scan beats a second heap
+            _, _, span = max(active, key=lambda entry: (PRIORITY[entry[2]["state"]], -entry[1]))
+            state, reason_code = span["state"], span["reason_code"]
+        else:
+            state, reason_code = "idle", None
+
+        last = intervals[-1] if intervals else None
+        if last and last["state"] == state and last["reason_code"] == reason_code:
+            last["end"] = boundary
+        else:
+            intervals.append({"state": state, "reason_code": reason_code, "start": position, "end": boundary})
+        position = boundary
+
+    return intervals
+
+
+def build_timelines(
+    spans: Iterable,
+    machine_ids: list[int],
+    start: datetime,
+    end: datetime,
+) -> Iterator[tuple[int, list[dict]]]:
+    """
+    (machine_id, intervals) for each of machine_ids, in that order, from spans of all
+    machines sorted by machine_id and start_time. Machines without spans are idle
+    throughout.
+    """
+    timelines = {
+        machine_id: build_timeline(machine_spans, start, end)
+        for machine_id, machine_spans in groupby(spans, key=lambda span: span["machine_id"])
+    }
+    for machine_id in machine_ids:
+        yield machine_id, timelines.get(machine_id) or build_timeline([], start, end)
+
+
+def summarize(intervals: list[dict]) -> dict:
+    """Minutes per state, and per reason code for unplanned downtime (largest first)."""
+    minutes = {state: 0.0 for state in STATES}
+    reasons = {}
+    for interval in intervals:
+        length = (interval["end"] - interval["start"]).total_seconds() / 60
+        minutes[interval["state"]] += length
+        if interval["state"] == "unplanned":
+            reasons[interval["reason_code"]] = reasons.get(interval["reason_code"], 0.0) + length
+    return {
+        "minutes": minutes,
+        "unplanned_reasons": dict(sorted(reasons.items(), key=lambda item: item[1], reverse=True)),
+    }
+
+
+def render_bar(intervals: list[dict], start: datetime, end: datetime, width: int) -> str:
+    """
+    The timeline as width characters, each showing the state that fills most of its
+    slice of the range (see BAR_SYMBOLS).
+    """
+    pieces = [
+        ((interval["start"] - start).total_seconds(), (interval["end"] - start).total_seconds(), interval["state"])
+        for interval in intervals
+    ]
+    slice_seconds = (end - start).total_seconds() / width
+    bar = []
+    index = 0
+
+    for column in range(width):
+        column_start = column * slice_seconds
+        column_end = column_start + slice_seconds
+        seconds = {}
+
+        # Pieces are sorted and gapless: skip those ending before this slice, then
+        # sum the ones overlapping it without consuming the last, which may continue
+        while index < len(pieces) and pieces[index][1] <= column_start:
+            index += 1
+        covering = index
+        while covering < len(pieces) and pieces[covering][0] < column_end:
+            piece_start, piece_end, state = pieces[covering]
+            seconds[state] = seconds.get(state, 0.0) + min(piece_end, column_end) - max(piece_start, column_start)
+            covering += 1
+
+        state = max(seconds, key=seconds.get) if seconds else "idle"
+        bar.append(BAR_SYMBOLS[state])
+
+    return "".join(bar)
@@ -0,0 +1,261 @@
+"""
+Tracing of crud calls as nested spans.
+
+enable() swaps every public function of the modules in TRACED_MODULES for a wrapper
+that records a span: function, a short summary of its arguments, the SQL statements it
+ran itself, its duration and its parent span. crud calls its own functions through
+module globals, so nested calls become child spans. Finished spans go to a sink: a
+JSON-lines file or an in-memory ring buffer. While tracing is disabled the original
+functions are in place, so it costs nothing.
+
+Spans of generator functions (iter_*) stay open until the iteration finishes.
+"""
+
+import functools
+import importlib
+import inspect
+import itertools
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from datetime import date, datetime
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+TRACED_MODULES = ("oee_tracker.crud", "oee_tracker.dimensions")
+
+# Longest argument value and SQL statement kept in a span
+ARGUMENT_WIDTH = 40
+STATEMENT_WIDTH = 200
+
+_current: ContextVar[dict | None] = ContextVar("oee_tracing_span", default=None)
+_span_ids = itertools.count(1)
+# Keeps span ids unique when several processes append to one trace file
+_process_id = uuid.uuid4().hex[:8]
+_sink = None
+# (module, name) -> original function, while enabled
+_originals: dict[tuple, object] = {}
+
+
+class JsonLinesSink:
+    """Append finished spans to a JSON-lines file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+
+    def write(self, span: dict):
+        line = json.dumps(span, separators=(",", ":"), default=str)
+        with self.lock:
+            self.file.write(line + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class RingBuffer:
+    """Keep the last size finished spans in memory."""
+
+    def __init__(self, size: int = 10000):
+        self.spans = deque(maxlen=size)
+
+    def write(self, span: dict):
+        self.spans.append(span)
+
+    def close(self):
+        pass
+
+
+def _summarize_arguments(signature: inspect.Signature, args: tuple, kwargs: dict) -> str:
+    """Arguments as 'name=value, ...', leaving out the session and cutting long values."""
+    try:
+        bound = signature.bind(*args, **kwargs)
+    except TypeError:
+        return ""
+
+    parts = []
+    for name, value in bound.arguments.items():
+        if isinstance(value, Session):
+            continue
+        text = str(value) if isinstance(value, (datetime, date)) else repr(value)
+        if len(text) > ARGUMENT_WIDTH:
+            text = text[:ARGUMENT_WIDTH - 3] + "..."
+        parts.append(f"{name}={text}")
+    return ", ".join(parts)
+
+
+def _start_span(name: str, arguments: str) -> dict:
+    """A new span, child of the current one."""
+    parent = _current.get()
+    span_id = f"{_process_id}-{next(_span_ids)}"
+    return {
+        "trace": parent["trace"] if parent else span_id,
+        "span": span_id,
+        "parent": parent["span"] if parent else None,
+        "depth": parent["depth"] + 1 if parent else 0,
+        "name": name,
+        "args": arguments,
+        "start": datetime.now().isoformat(),
+        "started": time.perf_counter(),
+        "duration_ms": None,
+        "sql": [],
+        "error": None,
+    }
+
+
+def _finish_span(span: dict):
+    """Set the duration and hand the span to the sink."""
+    span["duration_ms"] = (time.perf_counter() - span.pop("started")) * 1000
+    span["sql_count"] = len(span["sql"])
+    span["sql_ms"] = sum(statement["ms"] for statement in span["sql"])
+    sink = _sink
+    if sink is not None:
+        sink.write(span)
+
+
+def _wrap(function):
+    """Traced version of a function (or generator function)."""
+    signature = inspect.signature(function)
+    name = f"{function.__module__.rsplit('.', 1)[-1]}.{function.__name__}"
+
+    if inspect.isgeneratorfunction(function):
+        @functools.wraps(function)
+        def traced_generator(*args, **kwargs):
+            span = _start_span(name, _summarize_arguments(signature, args, kwargs))
+            generator = function(*args, **kwargs)
+            try:
+                while True:
+                    # Current only while the generator runs, not while the caller consumes
+                    token = _current.set(span)
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        break
+                    finally:
+                        _current.reset(token)
+                    yield item
+            except BaseException as e:
+                span["error"] = type(e).__name__
+                raise
+            finally:
+                generator.close()
+                _finish_span(span)
+
+        return traced_generator
+
+    @functools.wraps(function)
+    def traced(*args, **kwargs):
+        span = _start_span(name, _summarize_arguments(signature, args, kwargs))
+        token = _current.set(span)
+        try:
+            return function(*args, **kwargs)
+        except BaseException as e:
+            span["error"] = type(e).__name__
+            raise
+        finally:
+            _current.reset(token)
+            _finish_span(span)
+
+    return traced
+
+
+def _before_execute(connection, cursor, statement, parameters, context, executemany):
+    connection.info.setdefault("tracing_start", []).append(time.perf_counter())
+
+
+def _after_execute(connection, cursor, statement, parameters, context, executemany):
+    started = connection.info["tracing_start"].pop()
+    span = _current.get()
+    if span is not None:
+        span["sql"].append({
+            "statement": " ".join(statement.split())[:STATEMENT_WIDTH],
+            "ms": (time.perf_counter() - started) * 1000,
+        })
+
+
+def is_enabled() -> bool:
+    """True while tracing is on."""
+    return _sink is not None
+
+
+def enable(sink):
+    """Start tracing into sink (a JsonLinesSink or RingBuffer)."""
+    global _sink
+
+    if _sink is not None:
+        disable()
+
+    for module_name in TRACED_MODULES:
+        module = importlib.import_module(module_name)
+        for name, function in list(vars(module).items()):
+            if name.startswith("_") or not inspect.isfunction(function) or function.__module__ != module_name:
+                continue
+            _originals[(module, name)] = function
+            setattr(module, name, _wrap(function))
+
+    event.listen(Engine, "before_cursor_execute", _before_execute)
+    event.listen(Engine, "after_cursor_execute", _after_execute)
+    _sink = sink
+
+
+def disable():
+    """Stop tracing, put the original functions back and close the sink."""
+    global _sink
+
+    if _sink is None:
+        return
+
+    for (module, name), function in _originals.items():
+        setattr(module, name, function)
+    _originals.clear()
+
+    event.remove(Engine, "before_cursor_execute", _before_execute)
+    event.remove(Engine, "after_cursor_execute", _after_execute)
+    sink, _sink = _sink, None
+    sink.close()
+
+
+def read_spans(path: str) -> list[dict]:
+    """Read spans from a JSON-lines trace file, skipping a torn last line."""
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                spans.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return spans
+
+
+def summarize_spans(spans: list[dict]) -> list[dict]:
+    """
+    Per-function totals: calls, total and own time (excluding child spans), SQL
+    statements and SQL time. Sorted by own time, largest first.
+    """
+    child_ms = {}
+    for span in spans:
+        if span["parent"] is not None:
+            key = (span["trace"], span["parent"])
+            child_ms[key] = child_ms.get(key, 0.0) + span["duration_ms"]
+
+    functions = {}
+    for span in spans:
+        function = functions.setdefault(span["name"], {
+            "name": span["name"], "calls": 0, "total_ms": 0.0, "self_ms": 0.0,
+            "sql_count": 0, "sql_ms": 0.0, "max_depth": 0, "errors": 0,
+        })
+        function["calls"] += 1
+        function["total_ms"] += span["duration_ms"]
+        function["self_ms"] += max(span["duration_ms"] - child_ms.get((span["trace"], span["span"]), 0.0), 0.0)
+        function["sql_count"] += span["sql_count"]
+        function["sql_ms"] += span["sql_ms"]
+        function["max_depth"] = max(function["max_depth"], span["depth"])
+        function["errors"] += span["error"] is not None
+
+    return sorted(functions.values(), key=lambda function: function["self_ms"], reverse=True)
@@ -110,14 +110,16 @@ def main():
 
         session.commit()
 
-        # Reset sequences after loading sample data with explicit IDs
-        session.execute(text("SELECT setval('machines_id_seq', (SELECT MAX(id) FROM machines))"))
-        session.execute(text("SELECT setval('shifts_id_seq', (SELECT MAX(id) FROM shifts))"))
-        session.execute(text("SELECT setval('operators_id_seq', (SELECT MAX(id) FROM operators))"))
-        session.execute(text("SELECT setval('production_runs_id_seq', (SELECT MAX(id) FROM production_runs))"))
-        session.execute(text("SELECT setval('downtime_events_id_seq', (SELECT MAX(id) FROM downtime_events))"))
-        session.commit()
-        print("Reset ID sequences")
+        # Reset sequences after loading sample data with explicit IDs.
+        # SQLite needs nothing: new rows get MAX(id) + 1.
+        if session.get_bind().dialect.name == "postgresql":
+            for model in (Machine, Shift, Operator, ProductionRun, DowntimeEvent):
+                table = model.__tablename__
+                session.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"
+                ))
+            session.commit()
+            print("Reset ID sequences")
 
         print("Done!")
 